@@ -1,46 +1,144 @@
-from flask import Flask, render_template, request, Response, stream_with_context
-from ebay_api import get_ebay_listings, get_ebay_oauth_token, process_listing
+from flask import Flask, render_template, request, Response, stream_with_context, jsonify
+from ebay_api import get_ebay_listings, get_ebay_oauth_token, process_listing, FAIR_VALUE_TABLE, compute_fair_value
 from dummy_deals import dummy_deals
 import mysql.connector
-from mysql.connector import Error
-import json
+from mysql.connector import Error, pooling
+from db import DB_CONFIG, NET_PROFIT_SQL, LISTINGS_CREATED_COLUMN
+import os
 import time
 import concurrent.futures
+import atexit
+import logging
+import threading
+import multiprocessing
 from datetime import datetime, timezone
 from ebay_api import get_ebay_listings_stream
-import jsonify
-from ebay_api import async_get_ebay_listings
+from async_pricing import async_get_ebay_listings, shutdown_pricing_loop
+from process_pricing import PRICING_PROCESSES, get_ebay_listings_multiprocess, shutdown_process_pool
+from browser_pool import shutdown_browser_pool
+from price_cache import close_price_caches
+from http_client import close_sessions
+from deal_store import DealStore, DEFAULT_SORT, parse_filters
+from deal_stream import CONTENT_TYPES, encode_stream, negotiate_format, negotiate_encoding
+from deal_poller import DealPoller
+from stream_hub import StreamHub
+from fair_value import FairValueWarmer
+from deal_scoring import score_listings
+from metrics import render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from log_config import configure_logging, set_log_level, get_log_levels
+
+log = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# With DEAL_POLLER=1 a background poller prices new listings once, as they are
+# listed, and the deal endpoints serve them from DEAL_STORE. Without it, deals
+# streamed by /api/deals/stream are added to DEAL_STORE, so /api/deals can
+# sort, filter and page through them without another upstream run.
+DEAL_STORE = DealStore()
+DEAL_POLLER = DealPoller(DEAL_STORE, keyword=os.getenv("DEAL_POLLER_KEYWORD", ""))
+
+# With FAIR_VALUE_WARMER=1 a background thread keeps FAIR_VALUE_TABLE priced for
+# every recently seen model, so listings are priced without waiting on a scrape.
+FAIR_VALUE_WARMER = FairValueWarmer(FAIR_VALUE_TABLE, compute_fair_value)
+
+def start_background_services():
+    """
+    Configures logging, registers the shutdown hooks and starts the poller
+    and warmer when enabled. Only the server process runs this: importing app
+    must stay free of side effects, since spawned pricing workers re-import
+    the main script.
+    """
+    if multiprocessing.parent_process() is not None:
+        return
+    configure_logging()
+    # Close the pooled Playwright contexts, HTTP connections, price cache, async pricing loop and worker processes when the server process exits.
+    atexit.register(shutdown_browser_pool)
+    atexit.register(close_price_caches)
+    atexit.register(close_sessions)
+    atexit.register(shutdown_pricing_loop)
+    atexit.register(shutdown_process_pool)
+    atexit.register(FAIR_VALUE_TABLE.close)
+    if os.getenv("DEAL_POLLER") == "1":
+        DEAL_POLLER.start()
+        atexit.register(DEAL_POLLER.stop)
+    if os.getenv("FAIR_VALUE_WARMER") == "1":
+        FAIR_VALUE_WARMER.start()
+        atexit.register(FAIR_VALUE_WARMER.stop)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+
+# Rows pulled from the server per fetch while streaming the listings table
+DB_FETCH_CHUNK_SIZE = 5000
+
+_DB_POOL = None
+_DB_POOL_LOCK = threading.Lock()
+
+def get_db_pool():
+    global _DB_POOL
+    with _DB_POOL_LOCK:
+        if _DB_POOL is None:
+            _DB_POOL = pooling.MySQLConnectionPool(pool_name="listings", pool_size=DB_POOL_SIZE, **DB_CONFIG)
+        return _DB_POOL
+
 def get_db_connection():
+    # Connections come from a shared pool; close() hands them back.
     try:
-        connection = mysql.connector.connect(
-            host='127.0.0.1',
-            port=3306,
-            user='root',
-            password='root',
-            database='computer_parts_db'
-        )
-        return connection
+        return get_db_pool().get_connection()
     except Error as e:
-        print("Error connecting to MySQL:", e)
+        log.error("Error connecting to MySQL: %s", e)
     return None
 
-def get_listings_from_db():
+def build_listings_query(min_profit=None, categories=None, max_age_seconds=None):
+    clauses = []
+    params = []
+    if min_profit is not None:
+        clauses.append(f"{NET_PROFIT_SQL} >= %s")
+        params.append(min_profit)
+    if categories:
+        clauses.append(f"category IN ({', '.join(['%s'] * len(categories))})")
+        params.extend(categories)
+    if max_age_seconds is not None:
+        clauses.append(f"{LISTINGS_CREATED_COLUMN} >= NOW() - INTERVAL %s SECOND")
+        params.append(int(max_age_seconds))
+    query = "SELECT * FROM listings"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return query, params
+
+def iter_listings_from_db(min_profit=None, categories=None, max_age_seconds=None, chunk_size=DB_FETCH_CHUNK_SIZE):
+    """
+    Yields lists of up to chunk_size listing rows. Filters run in MySQL and the
+    unbuffered cursor streams the result, so memory stays flat as the table grows.
+    """
     connection = get_db_connection()
     if not connection:
-        return []
-    listings = []
+        return
+    cursor = None
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM listings")
-        listings = cursor.fetchall()
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        query, params = build_listings_query(min_profit, categories, max_age_seconds)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
     except Error as e:
-        print("Error fetching listings:", e)
+        log.error("Error fetching listings: %s", e)
     finally:
-        cursor.close()
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                # Closing early leaves unread rows; the pool resets the session anyway.
+                pass
         connection.close()
+
+def get_listings_from_db(min_profit=None, categories=None, max_age_seconds=None):
+    listings = []
+    for rows in iter_listings_from_db(min_profit, categories, max_age_seconds):
+        listings.extend(rows)
     return listings
 
 def calculate_net_profit(purchase_price, shipping_cost, tax_estimate=0.0, resale_price_assumption=0.0, platform_fee_rate=0.10):
@@ -50,20 +148,12 @@ def calculate_net_profit(purchase_price, shipping_cost, tax_estimate=0.0, resale
     net_profit = resale_price_assumption - (purchase_price + shipping_cost + tax_estimate + platform_fees)
     return net_profit
 
-def find_good_deals():
-    listings = get_listings_from_db()
+def find_good_deals(min_profit=30, categories=None, max_age_seconds=None):
+    # MySQL drops rows below the threshold; each streamed chunk is then scored as
+    # whole columns by deal_scoring, with the same math as calculate_net_profit.
     good_deals = []
-    for item in listings:
-        try:
-            purchase_price = float(item["price"])
-            shipping_cost = float(item["shipping_cost"])
-            tax_estimate = float(item["tax_estimate"])
-        except (ValueError, KeyError):
-            continue
-        net_profit = calculate_net_profit(purchase_price, shipping_cost, tax_estimate)
-        if net_profit >= 30:
-            item["net_profit"] = round(net_profit, 2)
-            good_deals.append(item)
+    for rows in iter_listings_from_db(min_profit, categories, max_age_seconds):
+        good_deals.extend(score_listings(rows, min_profit=min_profit))
     return good_deals
 
 @app.route('/', methods=['GET'])
@@ -71,20 +161,98 @@ def index():
     # Render the main page; deals will be loaded dynamically via JavaScript.
     return render_template('index.html')
 
+# Upstream scans behind /api/deals/stream, one per (keyword, limit) being watched
+STREAM_HUB = StreamHub()
+
+def scan_deals(keyword, limit, cancel=None):
+    # Yields each deal as it is priced, until the `cancel` event is set. With
+    # PRICING_PROCESSES set, decoding, extraction and classification run in
+    # worker processes.
+    listings = get_ebay_listings_multiprocess if PRICING_PROCESSES > 0 else get_ebay_listings_stream
+    for deal in listings(keyword=keyword, limit=limit, cancel=cancel):
+        DEAL_STORE.add(deal)
+        yield deal
+
 @app.route('/api/deals/stream', methods=['GET'])
 def api_deals_stream():
-    keyword = request.args.get('keyword', 'computer parts')
-    def generate():
-        # Yield each processed deal as a JSON line.
-        for deal in get_ebay_listings_stream(keyword=keyword, limit=50):
-            yield json.dumps(deal) + "\n"
-    return Response(stream_with_context(generate()), mimetype='application/json')
+    keyword = request.args.get('keyword', '')
+    limit = request.args.get('limit', 50, type=int)
+    # NDJSON by default; ?format=msgpack (or an Accept header) for MessagePack.
+    try:
+        fmt = negotiate_format(request.args.get('format'), request.accept_mimetypes)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 406
+    encoding = negotiate_encoding(request.accept_encodings)
+    if DEAL_POLLER.running:
+        # Deals are already priced by the poller; no upstream calls needed.
+        deals, on_close = DEAL_STORE.snapshot(), None
+    else:
+        # Concurrent requests for the same keyword and limit share one scan.
+        # Cancelling on disconnect frees the subscriber without waiting for the next deal.
+        subscription = STREAM_HUB.subscribe((keyword, limit), lambda cancel: scan_deals(keyword, limit, cancel))
+        deals, on_close = subscription, subscription.cancel
+    body = encode_stream((deal.to_dict() for deal in deals), fmt, encoding, on_close=on_close)
+    response = Response(stream_with_context(body), content_type=CONTENT_TYPES[fmt])
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# Largest page /api/deals returns
+DEAL_QUERY_MAX_LIMIT = 500
+
+@app.route('/api/deals', methods=['GET'])
+def api_deals():
+    # One page of stored deals, e.g. ?sort=net_profit&filter=deal_type:great,good;category:CPU&limit=50.
+    # Pass next_cursor back as ?cursor= for the next page.
+    sort = request.args.get('sort', DEFAULT_SORT)
+    limit = max(1, min(request.args.get('limit', 50, type=int), DEAL_QUERY_MAX_LIMIT))
+    try:
+        filters = parse_filters(request.args.getlist('filter'))
+        deals, next_cursor, total = DEAL_STORE.query(sort, filters, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"deals": [deal.to_dict() for deal in deals], "next_cursor": next_cursor, "total": total})
+
+@app.route('/api/deals/latest', methods=['GET'])
+def api_deals_latest():
+    # Deals the poller added after sequence number `since`; clients pass back last_seq.
+    since = request.args.get('since', 0, type=int)
+    entries = DEAL_STORE.since(since)
+    return jsonify({
+        "deals": [deal.to_dict() for _, deal in entries],
+        "last_seq": entries[-1][0] if entries else max(since, 0)
+    })
 
 @app.route('/api/deals/async', methods=['GET'])
 async def api_deals_async():
-    keyword = request.args.get('keyword', 'computer parts')
-    listings = await async_get_ebay_listings(keyword=keyword, limit=20)
-    return jsonify(listings)
+    keyword = request.args.get('keyword', '')
+    limit = request.args.get('limit', 20, type=int)
+    listings = await async_get_ebay_listings(keyword=keyword, limit=limit)
+    return jsonify([listing.to_dict() for listing in listings])
 
-if __name__ == '__main__':
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus scrape target: per-stage latency histograms plus cache, retry and scrape-failure counters.
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/log-levels', methods=['GET', 'POST'])
+def api_log_levels():
+    # POST ?logger=ebay_api&level=DEBUG changes one module's level without a restart.
+    if request.method == 'POST':
+        try:
+            set_log_level(request.args.get('logger', ''), request.args.get('level', 'INFO'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(get_log_levels())
+
+def main():
+    # debug=True runs the Werkzeug reloader: this process only watches the
+    # source and re-runs the script in a child (WERKZEUG_RUN_MAIN=true) that
+    # serves requests, so the poller and warmer start there and not twice.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
     app.run(debug=True)
+
+if __name__ == '__main__':
+    main()
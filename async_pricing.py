@@ -0,0 +1,489 @@
+"""
+Native asyncio pricing pipeline behind /api/deals/async.
+
+Everything here runs on one long-lived background event loop, so the aiohttp
+connection pool, the async Playwright context and the in-flight lookup table
+survive between requests. Each stage (Browse fetch, extraction, sold-data
+scrape, active-listing fallback, classification) is an awaitable with its own
+concurrency limit, which lets a single worker keep hundreds of lookups in flight.
+"""
+import os
+import asyncio
+import time
+import logging
+import functools
+import threading
+from datetime import datetime, timezone
+
+from playwright.async_api import async_playwright
+
+from ebay_api import (
+    TOKEN_MANAGER,
+    USER_DATA_DIR,
+    BROWSE_SEARCH_URL,
+    SCRAPED_PRICE_CACHE,
+    SOLD_DATA_CACHE,
+    SCRAPE_FAILURE_CACHE,
+    ACTIVE_PRICE_CACHE,
+    FAIR_VALUE_TABLE,
+    REVALIDATIONS,
+    async_request_with_retry,
+    build_seller_hub_url,
+    parse_metric_text,
+    scrape_query_for_model,
+    active_listing_query,
+    active_price_key,
+    summarize_active_prices,
+    prepare_listing,
+    classify_listing,
+    browse_search_params,
+    plan_browse_pages,
+    page_items,
+    recent_sales_median,
+)
+from terapeak_parser import parse_research_page
+from http_client import close_async_session
+from browser_pool import get_browser_pool, async_profile_dir
+from price_cache import mark_stale
+from rate_limit import get_limiter, parse_retry_after, CircuitOpenError, ThrottledError, THROTTLE_STATUSES
+from metrics import STAGE_SECONDS, PIPELINE_SECONDS, SCRAPE_FAILURES
+
+log = logging.getLogger(__name__)
+
+# Listings being priced at once per pipeline run
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "200"))
+
+# Concurrent Browse API calls (search pages and active-listing fallbacks)
+BROWSE_CONCURRENCY = int(os.getenv("BROWSE_CONCURRENCY", "10"))
+
+# Seller Hub tabs open at once in the async browser context
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+
+# Chromium locks a profile to one process, so the async context runs on a copy
+# of the logged-in USER_DATA_DIR profile, cloned by the browser pool together
+# with its slot profiles (see BrowserPool.clone_profiles)
+ASYNC_USER_DATA_DIR = async_profile_dir(USER_DATA_DIR)
+
+# Tabs open at once while batch-scraping sold data (e.g. pre-warming the top models)
+BATCH_SCRAPE_CONCURRENCY = int(os.getenv("BATCH_SCRAPE_CONCURRENCY", "8"))
+
+SCRAPE_TIMEOUT_MS = 40000
+
+# Extra wait for the sold table once the metric has rendered
+TABLE_TIMEOUT_MS = 5000
+
+_LOOP = None
+_LOOP_THREAD = None
+_LOOP_LOCK = threading.Lock()
+
+# Fire-and-forget tasks on the pricing loop (stale price refreshes)
+_BACKGROUND_TASKS = set()
+
+
+class AsyncPricingState:
+    """
+    Per-loop resources: stage semaphores, the shared browser context and the
+    table of in-flight lookups used to coalesce duplicate keys.
+    """
+
+    def __init__(self):
+        self.browse_semaphore = asyncio.Semaphore(BROWSE_CONCURRENCY)
+        self.scrape_semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+        self.browser_lock = asyncio.Lock()
+        self.in_flight = {}
+        self.playwright = None
+        self.context = None
+
+    async def get_context(self, headless=False):
+        async with self.browser_lock:
+            if self.context is None:
+                # A no-op once the pool has started, since it cloned this profile then.
+                # Copying is blocking file I/O; keep it off the pricing loop.
+                await asyncio.to_thread(get_browser_pool(USER_DATA_DIR).clone_profiles)
+                self.playwright = await async_playwright().start()
+                self.context = await self.playwright.chromium.launch_persistent_context(ASYNC_USER_DATA_DIR, headless=headless)
+                self.context.on("close", lambda _: self._forget_context())
+                log.info("Launched async browser context for profile %s", ASYNC_USER_DATA_DIR)
+            return self.context
+
+    def _forget_context(self):
+        self.context = None
+
+    async def close(self):
+        if self.context is not None:
+            try:
+                await self.context.close()
+            except Exception as e:
+                log.debug("Error closing async context (ignored): %s", e)
+            self.context = None
+        if self.playwright is not None:
+            try:
+                await self.playwright.stop()
+            except Exception as e:
+                log.debug("Error stopping async Playwright (ignored): %s", e)
+            self.playwright = None
+        await close_async_session()
+
+
+_STATE = None
+
+
+def _state():
+    global _STATE
+    if _STATE is None:
+        _STATE = AsyncPricingState()
+    return _STATE
+
+
+def get_pricing_loop():
+    global _LOOP, _LOOP_THREAD
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            _LOOP_THREAD = threading.Thread(target=_LOOP.run_forever, name="async-pricing", daemon=True)
+            _LOOP_THREAD.start()
+        return _LOOP
+
+
+def run_on_pricing_loop(coro):
+    """
+    Schedules a coroutine on the pricing loop and returns a concurrent.futures.Future.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_pricing_loop())
+
+
+def shutdown_pricing_loop(timeout=10):
+    global _LOOP, _LOOP_THREAD, _STATE
+    with _LOOP_LOCK:
+        loop, thread = _LOOP, _LOOP_THREAD
+        _LOOP, _LOOP_THREAD = None, None
+    if loop is None:
+        return
+    if _STATE is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(_STATE.close(), loop).result(timeout)
+        except Exception as e:
+            log.debug("Error closing async pricing resources (ignored): %s", e)
+        _STATE = None
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    loop.close()
+
+
+async def coalesce(key, coro_fn):
+    """
+    Awaits coro_fn() once per key; concurrent callers with the same key share its result.
+    """
+    in_flight = _state().in_flight
+    future = in_flight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    future = asyncio.get_running_loop().create_future()
+    in_flight[key] = future
+    try:
+        result = await coro_fn()
+    except BaseException as e:
+        future.set_exception(e)
+        # Mark the exception retrieved so an unobserved failure is not logged.
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        in_flight.pop(key, None)
+
+
+async def async_get_ebay_oauth_token():
+    return await TOKEN_MANAGER.get_async()
+
+
+async def browse_search(params=None, url=BROWSE_SEARCH_URL, stage="browse_search"):
+    token = await async_get_ebay_oauth_token()
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    async with _state().browse_semaphore:
+        with STAGE_SECONDS.time(stage=stage):
+            return await async_request_with_retry("GET", url, headers=headers, params=params)
+
+
+async def async_iter_browse_pages(keyword="", limit=50):
+    """
+    Async generator over Browse API result pages. After the first page, the
+    remaining offsets are requested together (bounded by BROWSE_CONCURRENCY)
+    and yielded in arrival order; without a total we follow `next` links.
+    """
+    page_size, max_pages = plan_browse_pages(limit)
+    first_page, status = await browse_search(browse_search_params(keyword, page_size))
+    if status != 200 or not first_page:
+        log.error("Error fetching listings: status %s", status)
+        return
+    yield first_page
+    total = first_page.get("total")
+    if total is not None:
+        last_offset = min(int(total), page_size * max_pages)
+        tasks = [
+            asyncio.ensure_future(browse_search(browse_search_params(keyword, page_size, offset)))
+            for offset in range(page_size, last_offset, page_size)
+        ]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                page, status = await next_page
+                if status == 200 and page:
+                    yield page
+                else:
+                    log.warning("Error fetching listings page: status %s", status)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return
+    next_url = first_page.get("next")
+    pages_fetched = 1
+    while next_url and pages_fetched < max_pages:
+        page, status = await browse_search(url=next_url)
+        if status != 200 or not page:
+            return
+        yield page
+        pages_fetched += 1
+        next_url = page.get("next")
+
+
+async def with_research_page(query, day_range, headless, read):
+    """
+    Opens the Seller Hub research page for query in a new tab of the shared
+    context, waits for the aggregated metric and returns await read(page).
+    Callers hold a scrape semaphore. Each page load takes a token from the
+    seller_hub limiter; CircuitOpenError is raised without opening a tab.
+    """
+    url = build_seller_hub_url(query, day_range=day_range)
+    limiter = get_limiter("seller_hub")
+    try:
+        await limiter.acquire_async()
+    except CircuitOpenError:
+        SCRAPE_FAILURES.inc(reason="circuit_open")
+        raise
+    context = await _state().get_context(headless=headless)
+    page = await context.new_page()
+    status = None
+    try:
+        with STAGE_SECONDS.time(stage="scrape"):
+            response = await page.goto(url)
+            status = response.status if response is not None else 200
+            if status in THROTTLE_STATUSES:
+                limiter.record(status, retry_after=parse_retry_after(response.headers.get("retry-after")))
+                SCRAPE_FAILURES.inc(reason="throttled")
+                raise ThrottledError("seller_hub", status)
+            await page.wait_for_selector("div.metric-value", timeout=SCRAPE_TIMEOUT_MS)
+            result = await read(page)
+    except Exception:
+        # Counted here rather than by callers so coalesced waiters don't count it again.
+        if status not in THROTTLE_STATUSES:
+            limiter.record(error=True)
+            SCRAPE_FAILURES.inc(reason="error")
+        raise
+    finally:
+        await page.close()
+    limiter.record(status)
+    return result
+
+
+async def async_scrape_sold_metric(query, headless=False, day_range=30):
+    # The price caches read through to and commit to SQLite; every call into
+    # them runs on a thread so disk I/O never stalls the other coroutines.
+    cache_key = SOLD_DATA_CACHE.make_key(query, day_range=day_range)
+    cached_value = await asyncio.to_thread(SOLD_DATA_CACHE.get, cache_key)
+    if cached_value is not None:
+        return cached_value
+    if await asyncio.to_thread(SCRAPE_FAILURE_CACHE.backing_off, cache_key):
+        return None
+
+    async def scrape():
+        try:
+            async with _state().scrape_semaphore:
+                text_val = await with_research_page(query, day_range, headless, lambda page: page.inner_text("div.metric-value"))
+        except (CircuitOpenError, ThrottledError):
+            # Seller Hub as a whole is unavailable; that says nothing about this query.
+            raise
+        except Exception:
+            await asyncio.to_thread(SCRAPE_FAILURE_CACHE.record_failure, cache_key)
+            raise
+        metric_value = parse_metric_text(text_val)
+        if metric_value is not None:
+            await asyncio.to_thread(SOLD_DATA_CACHE.set, cache_key, metric_value)
+            await asyncio.to_thread(SCRAPE_FAILURE_CACHE.record_success, cache_key)
+        else:
+            SCRAPE_FAILURES.inc(reason="no_value")
+            await asyncio.to_thread(SCRAPE_FAILURE_CACHE.record_failure, cache_key)
+        return metric_value
+
+    try:
+        return await coalesce(("sold",) + cache_key, scrape)
+    except Exception as e:
+        log.error("Error in async Playwright scraping for '%s': %s", query, e)
+        return None
+
+
+async def read_research_html(page):
+    try:
+        await page.wait_for_selector("table.terapeak-table tbody tr", timeout=TABLE_TIMEOUT_MS)
+    except Exception:
+        # Queries without recent sales have no table; the metric is still usable.
+        pass
+    return await page.content()
+
+
+def summarize_research_html(html, query, num_sales):
+    page = parse_research_page(html)
+    return {
+        "query": query,
+        "median": recent_sales_median(page, query, num_sales),
+        "metric": parse_metric_text(page.metric_text) if page.metric_text else None,
+    }
+
+
+async def async_scrape_sold_data(models, headless=False, day_range=30, num_sales=5, concurrency=BATCH_SCRAPE_CONCURRENCY):
+    """
+    Scrapes Seller Hub sold data for several CPU models in tabs of one browser
+    context, at most `concurrency` at a time. Returns {model: {"query",
+    "median" (of the num_sales most recent sales), "metric" (the aggregated
+    average), "error"}}. Aggregated metrics are written to SOLD_DATA_CACHE.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    queries = {model: scrape_query_for_model(model) for model in models}
+
+    async def scrape(query):
+        async with semaphore:
+            html = await with_research_page(query, day_range, headless, read_research_html)
+        # Parsing a 1-2 MB page would stall every other tab on this loop.
+        data = await asyncio.to_thread(summarize_research_html, html, query, num_sales)
+        if data["metric"] is not None:
+            await asyncio.to_thread(SOLD_DATA_CACHE.set, SOLD_DATA_CACHE.make_key(query, day_range=day_range), data["metric"])
+        else:
+            SCRAPE_FAILURES.inc(reason="no_value")
+        return data
+
+    unique_queries = list(dict.fromkeys(queries.values()))
+    results = await asyncio.gather(
+        *(coalesce(("sold_data", query, day_range, num_sales), functools.partial(scrape, query)) for query in unique_queries),
+        return_exceptions=True
+    )
+    by_query = {}
+    for query, result in zip(unique_queries, results):
+        if isinstance(result, Exception):
+            log.warning("Sold data scrape for '%s' failed: %s", query, result)
+            by_query[query] = {"query": query, "median": None, "metric": None, "error": str(result)}
+        else:
+            by_query[query] = dict(result, error=None)
+    return {model: by_query[query] for model, query in queries.items()}
+
+
+def scrape_sold_data_batch(models, headless=False, day_range=30, num_sales=5, concurrency=BATCH_SCRAPE_CONCURRENCY, timeout=None):
+    """
+    Blocking wrapper around async_scrape_sold_data for threads and scripts.
+    """
+    return run_on_pricing_loop(async_scrape_sold_data(models, headless, day_range, num_sales, concurrency)).result(timeout)
+
+
+async def async_active_listing_value(cpu_model, condition):
+    cache_key = active_price_key(cpu_model, condition)
+    cached = await asyncio.to_thread(ACTIVE_PRICE_CACHE.get, cache_key)
+    if cached is not None:
+        return tuple(cached)
+
+    async def search():
+        short_model, params = active_listing_query(cpu_model, condition)
+        try:
+            payload, status = await browse_search(params, stage="browse_fallback")
+        except Exception as e:
+            log.warning("Exception fetching prices for '%s': %s", short_model, e)
+            return None, False, None
+        if status != 200 or not payload:
+            log.warning("Error fetching listings for '%s': %s", short_model, status)
+            return None, False, None
+        result = summarize_active_prices(cpu_model, condition, payload)
+        await asyncio.to_thread(ACTIVE_PRICE_CACHE.set, cache_key, result)
+        return result
+
+    return await coalesce(("active",) + cache_key, search)
+
+
+async def async_get_fair_market_value(cpu_model, condition="Used"):
+    fair_value = FAIR_VALUE_TABLE.lookup(cpu_model, condition)
+    if fair_value is not None:
+        return fair_value.pricing(stale=FAIR_VALUE_TABLE.is_stale(fair_value))
+    cache_key = SCRAPED_PRICE_CACHE.make_key(cpu_model, condition)
+    cached, stale = await asyncio.to_thread(SCRAPED_PRICE_CACHE.lookup, cache_key)
+
+    async def lookup():
+        sold_value = await async_scrape_sold_metric(scrape_query_for_model(cpu_model))
+        if sold_value is not None:
+            await asyncio.to_thread(SCRAPED_PRICE_CACHE.set, cache_key, (sold_value, False, "(Sold Listings)"))
+            return sold_value, False, "(Sold Listings)"
+        return await async_active_listing_value(cpu_model, condition)
+
+    if cached is not None:
+        cached_value, cached_flag, cached_source = cached
+        if stale:
+            # Serve the stale price now; a failed refresh leaves it in place.
+            if REVALIDATIONS.claim(cache_key):
+                start_background(revalidate(cache_key, coalesce(("fair",) + cache_key, lookup)))
+            return cached_value, cached_flag, mark_stale(cached_source)
+        return cached_value, cached_flag, cached_source
+    return await coalesce(("fair",) + cache_key, lookup)
+
+
+async def revalidate(cache_key, refresh):
+    refreshed = False
+    try:
+        await refresh
+        refreshed = await asyncio.to_thread(SCRAPED_PRICE_CACHE.get, cache_key) is not None
+    except Exception as e:
+        log.warning("Error refreshing stale price for %s: %s", cache_key[0], e)
+    finally:
+        REVALIDATIONS.release(cache_key, refreshed)
+
+
+def start_background(coro):
+    # The loop only keeps weak references to tasks; hold one until it finishes.
+    task = asyncio.get_running_loop().create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+    return task
+
+
+async def price_item(item, cache_expiry, now, semaphore):
+    async with semaphore:
+        prepared = prepare_listing(item, cache_expiry, now)
+        if prepared is None:
+            return None
+        listing, multiplier = prepared
+        cpu_value, low_sales_flag, pricing_source = await async_get_fair_market_value(listing.cpu_model, condition=listing.condition)
+        with STAGE_SECONDS.time(stage="classify"):
+            return classify_listing(listing, multiplier, cpu_value, low_sales_flag, pricing_source)
+
+
+async def _run_pipeline(keyword, limit, cache_expiry):
+    start_time = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    semaphore = asyncio.Semaphore(PIPELINE_CONCURRENCY)
+    # Start pricing each page's items as soon as the page arrives.
+    tasks = []
+    async for page in async_iter_browse_pages(keyword=keyword, limit=limit):
+        for item in page_items(page, limit)[:limit - len(tasks)]:
+            tasks.append(asyncio.create_task(price_item(item, cache_expiry, now, semaphore)))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    listings = []
+    for result in results:
+        if isinstance(result, Exception):
+            log.error("Error pricing listing: %s", result)
+        elif result is not None:
+            listings.append(result)
+    PIPELINE_SECONDS.observe(time.perf_counter() - start_time, entry_point="async")
+    return listings
+
+
+async def async_get_ebay_listings(keyword="", limit=20, cache_expiry=14400):
+    """
+    Fetches and prices listings on the pricing loop. Safe to await from any
+    event loop (e.g. the short-lived one Flask creates for an async view).
+    """
+    return await asyncio.wrap_future(run_on_pricing_loop(_run_pipeline(keyword, limit, cache_expiry)))
@@ -0,0 +1,61 @@
+"""
+Checks extract_cpu_model against the golden corpus of real listing titles in
+bench/cpu_titles.json, then measures titles/sec with and without the memo cache.
+
+    python -m bench.bench_extract --repeat 200
+
+Exits non-zero if any title extracts differently from its recorded model.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import ebay_api
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cpu_titles.json")
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_golden(corpus):
+    mismatches = []
+    for entry in corpus:
+        got = ebay_api.extract_cpu_model(entry["title"])
+        if got != entry["model"]:
+            mismatches.append((entry["title"], entry["model"], got))
+    return mismatches
+
+
+def throughput(fn, titles):
+    start = time.perf_counter()
+    for title in titles:
+        fn(title)
+    return len(titles) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the corpus for the timing runs")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    mismatches = check_golden(corpus)
+    for title, expected, got in mismatches:
+        print(f"MISMATCH {title!r}: expected {expected!r}, got {got!r}")
+    print(f"golden: {len(corpus) - len(mismatches)}/{len(corpus)} titles match")
+
+    titles = [entry["title"] for entry in corpus] * args.repeat
+    uncached = ebay_api._extract_cpu_model.__wrapped__
+    print(f"uncached: {throughput(uncached, titles):,.0f} titles/sec")
+    ebay_api._extract_cpu_model.cache_clear()
+    print(f"memoized: {throughput(ebay_api.extract_cpu_model, titles):,.0f} titles/sec")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
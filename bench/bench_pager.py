@@ -0,0 +1,46 @@
+"""
+Benchmarks Browse API paging against the local stand-in.
+
+    python -m bench.bench_pager --items 5000 --latency 0.05
+"""
+import os
+import time
+import argparse
+
+from bench.mock_ebay import MockEbayServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=5000, help="listings served by the stand-in")
+    parser.add_argument("--limit", type=int, default=5000, help="listings to scan")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="page fetch concurrency levels to compare")
+    args = parser.parse_args()
+
+    with MockEbayServer(total_items=args.items, latency=args.latency) as server:
+        os.environ["EBAY_API_BASE"] = server.base_url
+        os.environ.setdefault("EBAY_CLIENT_ID", "mock")
+        os.environ.setdefault("EBAY_CLIENT_SECRET", "mock")
+        # Measure paging, not the production request budgets.
+        for endpoint in ("OAUTH", "BROWSE"):
+            os.environ.setdefault(f"RATE_LIMIT_{endpoint}", "100000")
+        import ebay_api
+
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            first_item_at = None
+            count = 0
+            for _ in ebay_api.iter_browse_items(limit=args.limit, concurrency=concurrency):
+                if first_item_at is None:
+                    first_item_at = time.perf_counter() - start
+                count += 1
+            elapsed = time.perf_counter() - start
+            print(
+                f"concurrency={concurrency:<3} items={count:<6} total={elapsed:.2f}s "
+                f"first_item={first_item_at or 0:.3f}s items/sec={count / elapsed:.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+End-to-end benchmark of the listing pipeline against the local stand-in.
+
+    python -m bench.bench_pipeline --items 2000 --limit 1000 --models 40 --latency 0.02
+    python -m bench.bench_pipeline --error-rate 0.02 --retry-delay 0.05
+    python -m bench.bench_pipeline --save bench_baseline.json
+    python -m bench.bench_pipeline --baseline bench_baseline.json --tolerance 0.15
+
+Runs the sync (get_ebay_listings), stream (get_ebay_listings_stream) and async
+(async_get_ebay_listings) entry points, each from a cold price cache and a
+fresh OAuth token. For each path it reports deals/sec, time to first deal (as
+the caller sees it) and p50/p95/p99 latency per stage. With --baseline it exits
+non-zero when a path is slower than the saved run by more than --tolerance.
+
+Seller Hub pages are fetched over plain HTTP by default, so no browser is
+needed. Pass --browser to drive the real Playwright pool against the stand-in.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import concurrent.futures
+from collections import defaultdict
+
+from bs4 import BeautifulSoup
+
+from bench.mock_ebay import MockEbayServer
+from http_client import get_session, get_async_session, default_timeout
+from log_config import configure_logging
+
+PATHS = ["sync", "stream", "async", "process"]
+PERCENTILES = [50, 95, 99]
+
+
+class StageTimings:
+    """
+    Thread-safe latency samples per pipeline stage.
+    """
+
+    def __init__(self):
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        summary = {}
+        for stage, values in sorted(samples.items()):
+            summary[stage] = {"count": len(values)}
+            for pct in PERCENTILES:
+                # Nearest-rank percentile, in milliseconds
+                rank = max(0, min(len(values) - 1, -(-pct * len(values) // 100) - 1))
+                summary[stage][f"p{pct}"] = values[rank] * 1000
+        return summary
+
+
+STAGES = StageTimings()
+
+
+class HttpPage:
+    """
+    Just enough of a Playwright page for the Seller Hub scrape, over plain HTTP.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.soup = None
+
+    def goto(self, url):
+        response = self.session.get(url, timeout=default_timeout())
+        self.soup = BeautifulSoup(response.text, "html.parser") if response.status_code == 200 else None
+
+    def wait_for_selector(self, selector, timeout=None):
+        if self.soup is None or self.soup.select_one(selector) is None:
+            raise TimeoutError(f"Timeout {timeout}ms exceeded waiting for {selector}")
+
+    def inner_text(self, selector):
+        return self.soup.select_one(selector).get_text()
+
+
+class HttpPagePool:
+    def run(self, fn, timeout=None):
+        return fn(HttpPage(get_session()))
+
+
+class AsyncHttpPage:
+    def __init__(self):
+        self.soup = None
+        self.html = ""
+
+    async def goto(self, url):
+        async with get_async_session().get(url) as response:
+            self.html = await response.text()
+            self.soup = BeautifulSoup(self.html, "html.parser") if response.status == 200 else None
+
+    async def wait_for_selector(self, selector, timeout=None):
+        HttpPage.wait_for_selector(self, selector, timeout)
+
+    async def inner_text(self, selector):
+        return self.soup.select_one(selector).get_text()
+
+    async def content(self):
+        return self.html
+
+    async def close(self):
+        pass
+
+
+class AsyncHttpContext:
+    async def new_page(self):
+        return AsyncHttpPage()
+
+
+class TimedPool:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def run(self, fn, timeout=None):
+        with STAGES.time("sold_scrape"):
+            return self.pool.run(fn, timeout=timeout)
+
+
+class TimedAsyncContext:
+    def __init__(self, context):
+        self.context = context
+
+    async def new_page(self):
+        return TimedAsyncPage(await self.context.new_page())
+
+
+class TimedAsyncPage:
+    # A scrape is timed from opening its tab to closing it.
+    def __init__(self, page):
+        self._page = page
+        self._start = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self._page, name)
+
+    async def close(self):
+        try:
+            await self._page.close()
+        finally:
+            STAGES.record("sold_scrape", time.perf_counter() - self._start)
+
+
+def request_stage(ebay_api, url, params):
+    if url == ebay_api.OAUTH_TOKEN_URL:
+        return "oauth"
+    if params and params.get("sort") == "price":
+        return "active_listing"
+    return "browse_page"
+
+
+def instrument(ebay_api, async_pricing, browser=False, retry_delay=None):
+    """
+    Wraps the pipeline's stage functions with timers. Everything is patched at
+    module level, the same names the entry points look up at call time.
+    """
+    retry_kwargs = {} if retry_delay is None else {"delay": retry_delay}
+
+    request_with_retry = ebay_api.request_with_retry
+    def timed_request(method, url, headers=None, params=None, data=None, **kwargs):
+        with STAGES.time(request_stage(ebay_api, url, params)):
+            return request_with_retry(method, url, headers=headers, params=params, data=data, **{**retry_kwargs, **kwargs})
+    ebay_api.request_with_retry = timed_request
+
+    process_listing = ebay_api.process_listing
+    def timed_process_listing(item, cache_expiry, now):
+        with STAGES.time("price_item"):
+            return process_listing(item, cache_expiry, now)
+    ebay_api.process_listing = timed_process_listing
+
+    async_request = async_pricing.async_request_with_retry
+    async def timed_async_request(method, url, headers=None, params=None, data=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await async_request(method, url, headers=headers, params=params, data=data, **{**retry_kwargs, **kwargs})
+        finally:
+            STAGES.record(request_stage(ebay_api, url, params), time.perf_counter() - start)
+    async_pricing.async_request_with_retry = timed_async_request
+
+    price_item = async_pricing.price_item
+    async def timed_price_item(item, cache_expiry, now, semaphore):
+        # Timed once the semaphore is held, to match a worker thread picking the item up.
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                return await price_item(item, cache_expiry, now, contextlib.nullcontext())
+            finally:
+                STAGES.record("price_item", time.perf_counter() - start)
+    async_pricing.price_item = timed_price_item
+
+    get_browser_pool = ebay_api.get_browser_pool
+    if browser:
+        ebay_api.get_browser_pool = lambda user_data_dir, headless=False: TimedPool(get_browser_pool(user_data_dir, headless=headless))
+    else:
+        ebay_api.get_browser_pool = lambda user_data_dir, headless=False: TimedPool(HttpPagePool())
+
+    get_context = async_pricing.AsyncPricingState.get_context
+    async def timed_get_context(self, headless=False):
+        context = await get_context(self, headless=headless) if browser else AsyncHttpContext()
+        return TimedAsyncContext(context)
+    async_pricing.AsyncPricingState.get_context = timed_get_context
+
+
+def run_path(path, ebay_api, async_pricing, process_pricing, keyword, limit):
+    """
+    Returns (deals, seconds to the first deal the caller sees, total seconds).
+    """
+    start = time.perf_counter()
+    first_deal = None
+    deals = 0
+    if path in ("stream", "process"):
+        listings = ebay_api.get_ebay_listings_stream if path == "stream" else process_pricing.get_ebay_listings_multiprocess
+        for _ in listings(keyword=keyword, limit=limit):
+            if first_deal is None:
+                first_deal = time.perf_counter() - start
+            deals += 1
+    else:
+        if path == "sync":
+            listings = ebay_api.get_ebay_listings(keyword=keyword, limit=limit)
+        else:
+            listings = asyncio.run(async_pricing.async_get_ebay_listings(keyword=keyword, limit=limit))
+        deals = len(listings)
+        if deals:
+            first_deal = time.perf_counter() - start
+    return deals, first_deal, time.perf_counter() - start
+
+
+def check_baseline(results, baseline, tolerance):
+    failures = []
+    for path, result in results.items():
+        base = baseline.get("paths", {}).get(path)
+        if not base:
+            continue
+        if result["deals_per_sec"] < base["deals_per_sec"] * (1 - tolerance):
+            failures.append(f"{path}: {result['deals_per_sec']:.1f} deals/sec vs baseline {base['deals_per_sec']:.1f}")
+        if base["first_deal"] is not None and result["first_deal"] is not None \
+                and result["first_deal"] > base["first_deal"] * (1 + tolerance):
+            failures.append(f"{path}: first deal at {result['first_deal']:.3f}s vs baseline {base['first_deal']:.3f}s")
+    return failures
+
+
+def print_report(path, result):
+    first = f"{result['first_deal']:.3f}s" if result["first_deal"] is not None else "-"
+    print(
+        f"{path:<7} deals={result['deals']:<6} total={result['elapsed']:.2f}s "
+        f"deals/sec={result['deals_per_sec']:.1f} first_deal={first}"
+    )
+    for stage, stats in result["stages"].items():
+        print(
+            f"    {stage:<15} n={stats['count']:<6} "
+            + " ".join(f"p{pct}={stats[f'p{pct}']:.1f}ms" for pct in PERCENTILES)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000, help="listings served by the stand-in")
+    parser.add_argument("--limit", type=int, default=1000, help="listings each path prices")
+    parser.add_argument("--models", type=int, default=40, help="distinct CPU models in the catalogue")
+    parser.add_argument("--keyword", default="", help="search keyword")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every API response")
+    parser.add_argument("--page-latency", type=float, default=0.2, help="seconds added to every Seller Hub page")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses replaced by a 503")
+    parser.add_argument("--seed", type=int, default=0, help="seed for 503 injection")
+    parser.add_argument("--retry-delay", type=float, default=None, help="override the initial retry backoff in seconds")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=PATHS, help="entry points to run")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes for the process path (default: CPU count)")
+    parser.add_argument("--browser", action="store_true", help="scrape Seller Hub pages with the Playwright pool")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression against --baseline")
+    parser.add_argument("--verbose", action="store_true", help="log the pipeline at DEBUG level to stderr")
+    args = parser.parse_args()
+
+    with MockEbayServer(total_items=args.items, latency=args.latency, model_count=args.models,
+                        page_latency=args.page_latency, error_rate=args.error_rate, seed=args.seed) as server, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        os.environ["EBAY_API_BASE"] = server.base_url
+        os.environ["EBAY_WEB_BASE"] = server.base_url
+        os.environ["PRICE_CACHE_PATH"] = os.path.join(cache_dir, "price_cache.sqlite3")
+        os.environ.setdefault("EBAY_CLIENT_ID", "mock")
+        os.environ.setdefault("EBAY_CLIENT_SECRET", "mock")
+        # Measure the pipeline, not the production request budgets.
+        for endpoint in ("OAUTH", "BROWSE", "SELLER_HUB"):
+            os.environ.setdefault(f"RATE_LIMIT_{endpoint}", "100000")
+        configure_logging(level="DEBUG" if args.verbose else "WARNING", stream=sys.stderr)
+        import ebay_api
+        import async_pricing
+        import process_pricing
+        from browser_pool import shutdown_browser_pool
+        from price_cache import close_price_caches
+        instrument(ebay_api, async_pricing, browser=args.browser, retry_delay=args.retry_delay)
+
+        results = {}
+        try:
+            if "process" in args.paths:
+                # Spawn and import the workers before the clock starts.
+                pool = process_pricing.get_process_pool(args.processes)
+                concurrent.futures.wait([pool.submit(os.getpid) for _ in range(process_pricing.process_pool_size(args.processes))])
+            for path in args.paths:
+                ebay_api.SCRAPED_PRICE_CACHE.clear()
+                ebay_api.SOLD_DATA_CACHE.clear()
+                ebay_api.FAIR_VALUE_TABLE.clear()
+                ebay_api.ACTIVE_PRICE_CACHE.clear()
+                ebay_api.SCRAPE_FAILURE_CACHE.clear()
+                ebay_api.TOKEN_MANAGER.clear()
+                STAGES.reset()
+                deals, first_deal, elapsed = run_path(path, ebay_api, async_pricing, process_pricing, args.keyword, args.limit)
+                results[path] = {
+                    "deals": deals,
+                    "elapsed": elapsed,
+                    "deals_per_sec": deals / elapsed if elapsed else 0.0,
+                    "first_deal": first_deal,
+                    "stages": STAGES.summary(),
+                }
+                print_report(path, results[path])
+        finally:
+            async_pricing.shutdown_pricing_loop()
+            process_pricing.shutdown_process_pool()
+            shutdown_browser_pool()
+            close_price_caches()
+        print(f"stand-in requests: {dict(sorted(server.requests.items()))}")
+
+    if args.save:
+        config = {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "verbose")}
+        with open(args.save, "w") as f:
+            json.dump({"config": config, "paths": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_baseline(results, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
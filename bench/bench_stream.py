@@ -0,0 +1,108 @@
+"""
+Compares the /api/deals/stream wire encodings on a synthetic scan.
+
+    python -m bench.bench_stream --deals 5000 --repeat 5
+
+Builds priced Listings from the titles in bench/cpu_titles.json and runs them
+through the old per-deal json.dumps path and each deal_stream configuration.
+For each it reports bytes on the wire, writes (chunks handed to the server)
+and CPU time per deal, including Listing.to_dict() and compression.
+"""
+import json
+import time
+import random
+import argparse
+
+import deal_stream
+from deal_stream import NDJSON, MSGPACK, encode_stream
+from listing import Listing, DealType
+from bench.bench_extract import load_corpus
+
+CONDITIONS = ["Used", "New", "Open box", "For parts or not working"]
+
+# name -> (format, JSON backend, compression); None is the pre-batching path
+CONFIGS = {
+    "baseline": None,
+    "json": (NDJSON, "json", None),
+    "orjson": (NDJSON, "orjson", None),
+    "orjson+gzip": (NDJSON, "orjson", "gzip"),
+    "orjson+br": (NDJSON, "orjson", "br"),
+    "msgpack": (MSGPACK, None, None),
+    "msgpack+gzip": (MSGPACK, None, "gzip"),
+}
+
+
+def make_deals(count, seed=0):
+    rng = random.Random(seed)
+    corpus = load_corpus()
+    now = int(time.time())
+    deals = []
+    for i in range(count):
+        entry = corpus[i % len(corpus)]
+        listing = Listing(
+            title=entry["title"],
+            price=round(rng.uniform(20, 400), 2),
+            condition=rng.choice(CONDITIONS),
+            category="Computers/Tablets & Networking|Computer Components & Parts|CPUs/Processors",
+            listing_url=f"https://www.ebay.com/itm/{3000000000 + i}",
+            item_id=f"v1|{3000000000 + i}|0",
+            created_at=now - rng.randint(0, 14400),
+            cpu_model=entry["model"],
+        )
+        listing.estimated_sale_price = round(listing.price * rng.uniform(0.8, 1.6), 2)
+        listing.low_sales_data = rng.random() < 0.2
+        listing.estimated_sale_source = "(Active Listings)" if listing.low_sales_data else "(Sold Listings)"
+        listing.net_profit = round(listing.estimated_sale_price - listing.price, 2)
+        listing.deal_type = DealType.for_profit(listing.net_profit)
+        deals.append(listing)
+    return deals
+
+
+def baseline_stream(deals):
+    # What api_deals_stream wrote before: one json.dumps line per deal, uncompressed.
+    for deal in deals:
+        yield (json.dumps(deal.to_dict()) + "\n").encode()
+
+
+def configured_stream(deals, config):
+    fmt, backend, encoding = config
+    yield from encode_stream((deal.to_dict() for deal in deals), fmt, encoding, backend=backend or "auto")
+
+
+def measure(deals, config, repeat):
+    best_cpu = None
+    for _ in range(repeat):
+        start = time.process_time()
+        chunks = list(baseline_stream(deals) if config is None else configured_stream(deals, config))
+        cpu = time.process_time() - start
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    return sum(len(chunk) for chunk in chunks), len(chunks), best_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=5000, help="deals in the synthetic scan")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per configuration; the fastest is reported")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS), help="configurations to run")
+    args = parser.parse_args()
+
+    deals = make_deals(args.deals)
+    base_bytes = None
+    for name in args.configs:
+        config = CONFIGS[name]
+        if config is not None and (
+                (config[1] == "orjson" and deal_stream.orjson is None)
+                or (config[0] == MSGPACK and deal_stream.msgpack is None)
+                or (config[2] == "br" and deal_stream.brotli is None)):
+            print(f"{name:<13} skipped (optional package not installed)")
+            continue
+        wire_bytes, writes, cpu = measure(deals, config, args.repeat)
+        base_bytes = base_bytes or wire_bytes
+        print(
+            f"{name:<13} bytes={wire_bytes:<9} ({wire_bytes / base_bytes:6.1%}) writes={writes:<6} "
+            f"cpu/deal={cpu / len(deals) * 1e6:.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares the Terapeak research page parser backends.
+
+    python -m bench.bench_terapeak --size 1500000
+    python -m bench.bench_terapeak --pages saved/research-*.html
+
+By default it parses a stand-in research page padded with filler markup and
+script to roughly --size bytes, as live Seller Hub pages are. Every backend
+must return the same rows and metric as html.parser on each page (including
+pages with the table, tbody or rows missing), or the script exits non-zero.
+"""
+import sys
+import time
+import argparse
+
+from bench.mock_ebay import research_page
+from terapeak_parser import available_backends, BACKENDS, TABLE_CLASS
+
+
+def padded_page(size, rows=50):
+    page = research_page("Intel Core i7-8700K", rows=rows)
+    card = (
+        '<div class="srp-card"><div class="srp-card__header"><span class="title">Similar item</span>'
+        '<a href="https://www.ebay.com/itm/123456789012?hash=item1c" data-track="{&quot;eventFamily&quot;:&quot;LST&quot;}">View</a>'
+        '</div><ul class="srp-card__facts"><li>Sold 3</li><li>Avg $123.45</li><li>Free shipping</li></ul></div>'
+    )
+    script = '<script type="application/json">{"modules":{"RESEARCH":{"data":[' + ",".join(['{"k":"v","n":12345}'] * 200) + "]}}}</script>"
+    filler = []
+    length = len(page)
+    while length < size:
+        filler.append(card * 20 + script)
+        length += len(filler[-1])
+    head, body = page.split("<body>", 1)
+    half = len(filler) // 2
+    return f"{head}<body>{''.join(filler[:half])}{body.replace('</body>', ''.join(filler[half:]) + '</body>')}"
+
+
+def variant_pages(page):
+    # Degraded pages exercise each fallback branch.
+    return {
+        "full": page,
+        "no table": page.replace(TABLE_CLASS, "other-table"),
+        "no tbody": page.replace("<tbody>", "").replace("</tbody>", ""),
+        "no rows": page.replace("research-table-row_item-subtitle", "research-table-row_item-header"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="*", help="saved research page HTML files")
+    parser.add_argument("--size", type=int, default=1500000, help="approximate bytes of the generated page")
+    parser.add_argument("--repeat", type=int, default=5, help="parses per backend per page")
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = {}
+        for path in args.pages:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages[path] = f.read()
+    else:
+        pages = variant_pages(padded_page(args.size))
+
+    backends = available_backends()
+    mismatches = 0
+    for name, html in pages.items():
+        expected = BACKENDS["html.parser"](html)
+        for backend in backends:
+            result = BACKENDS[backend](html)
+            if result != expected:
+                mismatches += 1
+                print(f"MISMATCH {backend} on {name}: {result.missing} {result.metric_text} vs {expected.missing} {expected.metric_text}")
+
+    for name, html in pages.items():
+        print(f"{name} ({len(html) / 1e6:.2f} MB)")
+        for backend in backends:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                BACKENDS[backend](html)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"    {backend:<12} {elapsed * 1000:8.1f} ms/page")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Local stand-in for the eBay Browse and OAuth APIs and the Seller Hub research
+(Terapeak) pages, used to benchmark the listing pipeline offline.
+
+    with MockEbayServer(total_items=5000, latency=0.05, error_rate=0.01) as server:
+        os.environ["EBAY_API_BASE"] = server.base_url
+        os.environ["EBAY_WEB_BASE"] = server.base_url
+        import ebay_api  # picks up the stand-in URLs at import time
+
+ebay_api reads EBAY_API_BASE and EBAY_WEB_BASE when it is imported, so start
+the server and set the variables first.
+"""
+import json
+import time
+import zlib
+import random
+import threading
+import urllib.parse
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CPU_MODELS = [
+    "Intel Core i5-7500 3.4GHz",
+    "Intel Core i7-8700K 3.7GHz",
+    "Intel Core i3-10100",
+    "Intel Core i9-9900K",
+    "AMD Ryzen 5 3600",
+    "AMD Ryzen 7 5800X",
+    "AMD Ryzen 9 5900X",
+    "AMD Ryzen 5 5600G",
+]
+
+CONDITIONS = ["Used", "New", "Open box", "For parts or not working"]
+
+# Sold rows on each Seller Hub research page
+RESEARCH_ROWS = 10
+
+
+def catalogue_models(count):
+    """
+    CPU_MODELS followed by synthetic (but extractable) models, so a benchmark
+    can choose how many distinct fair-value lookups the catalogue needs.
+    """
+    models = CPU_MODELS[:count]
+    for extra in range(count - len(models)):
+        tier = (3, 5, 7, 9)[extra % 4]
+        if extra % 2:
+            models.append(f"AMD Ryzen {tier} {1100 + extra}")
+        else:
+            models.append(f"Intel Core i{tier}-{6100 + extra}")
+    return models
+
+
+def make_listing(index, now=None, models=CPU_MODELS):
+    now = now or datetime.now(timezone.utc)
+    model = models[index % len(models)]
+    created = now - timedelta(seconds=30 * index)
+    return {
+        "itemId": f"v1|{100000000000 + index}|0",
+        "title": f"{model} Desktop Processor CPU #{index}",
+        "price": {"value": f"{40 + (index * 7) % 160:.2f}", "currency": "USD"},
+        "condition": CONDITIONS[index % len(CONDITIONS)],
+        "categoryPath": "Computers/Tablets & Networking|Computer Components & Parts|CPUs/Processors",
+        "itemWebUrl": f"https://www.ebay.com/itm/{100000000000 + index}",
+        "itemCreationDate": created.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    }
+
+
+def sold_price(query):
+    # Stable per query, so repeated runs score the same deals.
+    return 60 + zlib.crc32(query.lower().encode()) % 240
+
+
+def research_page(query, now=None, rows=RESEARCH_ROWS):
+    """
+    Seller Hub research page for `query`: the aggregated div.metric-value plus
+    a Terapeak sold table, shaped like the markup the scrapers look for.
+    """
+    now = now or datetime.now(timezone.utc)
+    base = sold_price(query)
+    body = []
+    for row in range(rows):
+        sold_at = now - timedelta(days=2 * row)
+        price = base + (row * 13) % 21 - 10
+        body.append(
+            '<tr class="research-table-row_item research-table-row_item-subtitle">'
+            f'<td>${price:,.2f} / ea</td><td>{query}</td><td>1</td><td>${price:,.2f}</td>'
+            f'<td>{sold_at.strftime("%m/%d/%Y")}</td></tr>'
+        )
+    return (
+        "<!DOCTYPE html><html><head><title>Research | Seller Hub</title></head><body>"
+        '<div class="research-metrics"><div class="metric"><span>Avg sold price</span>'
+        f'<div class="metric-value">${base:,.2f}</div></div></div>'
+        '<table class="terapeak-table content static-table table-content-default">'
+        "<thead><tr><th>Price</th><th>Title</th><th>Qty</th><th>Total</th><th>Date sold</th></tr></thead>"
+        f"<tbody>{''.join(body)}</tbody></table></body></html>"
+    )
+
+
+class MockEbayHandler(BaseHTTPRequestHandler):
+    server_version = "MockEbay/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload, status=200):
+        self.send_body(json.dumps(payload).encode(), "application/json", status)
+
+    def send_unavailable(self):
+        self.send_json({"errors": [{"message": "Service Unavailable"}]}, status=503)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        mock = self.server.mock
+        mock.simulate_latency()
+        if mock.inject_error():
+            self.send_unavailable()
+        elif self.path.startswith("/identity/v1/oauth2/token"):
+            mock.count("oauth")
+            self.send_json({"access_token": "mock-token", "expires_in": 7200, "token_type": "Application Access Token"})
+        else:
+            self.send_json({"errors": [{"message": "not found"}]}, status=404)
+
+    def do_GET(self):
+        mock = self.server.mock
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        if parsed.path == "/sh/research":
+            mock.simulate_latency(mock.page_latency)
+        else:
+            mock.simulate_latency()
+        if mock.inject_error():
+            self.send_unavailable()
+        elif parsed.path == "/buy/browse/v1/item_summary/search":
+            mock.count("browse")
+            self.send_json(mock.search_page(query))
+        elif parsed.path == "/sh/research":
+            mock.count("research")
+            page = research_page(query.get("keywords", [""])[0], mock.now)
+            self.send_body(page.encode(), "text/html; charset=utf-8")
+        else:
+            self.send_json({"errors": [{"message": "not found"}]}, status=404)
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections (and stalls clients for a SYN
+    # retransmit) once the pipeline opens a few dozen sockets at once.
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class MockEbayServer:
+    """
+    Serves a deterministic catalogue of `total_items` CPU listings, newest
+    first, with Browse-style limit/offset paging and `next` links.
+
+    Every response waits `latency` seconds (`page_latency` for Seller Hub
+    pages, which are slower upstream), and a seeded `error_rate` fraction of
+    responses is replaced by a 503 to exercise the retry paths.
+    """
+
+    def __init__(self, total_items=1000, latency=0.0, host="127.0.0.1", port=0,
+                 model_count=len(CPU_MODELS), page_latency=None, error_rate=0.0, seed=0):
+        self.total_items = total_items
+        self.latency = latency
+        self.page_latency = latency if page_latency is None else page_latency
+        self.error_rate = error_rate
+        self.models = catalogue_models(model_count)
+        self.now = datetime.now(timezone.utc)
+        self._random = random.Random(seed)
+        self.requests = {}
+        self._lock = threading.Lock()
+        self.httpd = MockHTTPServer((host, port), MockEbayHandler)
+        self.httpd.mock = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def simulate_latency(self, seconds=None):
+        seconds = self.latency if seconds is None else seconds
+        if seconds:
+            time.sleep(seconds)
+
+    def inject_error(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            self.count("503")
+        return failed
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def listing(self, index):
+        return make_listing(index, self.now, self.models)
+
+    def search_page(self, query):
+        limit = min(int(query.get("limit", ["50"])[0]), 200)
+        offset = int(query.get("offset", ["0"])[0])
+        keyword = query.get("q", [""])[0].lower()
+        since = None
+        for clause in query.get("filter", [""])[0].split(","):
+            if clause.startswith("itemStartDate:["):
+                since = clause[len("itemStartDate:["):].split("..")[0]
+        indexes = range(self.total_items)
+        if keyword:
+            indexes = [i for i in indexes if keyword in self.listing(i)["title"].lower()]
+        if since:
+            indexes = [i for i in indexes if self.listing(i)["itemCreationDate"] >= since]
+        total = len(indexes)
+        items = [self.listing(i) for i in indexes[offset:offset + limit]]
+        href_params = {k: v[0] for k, v in query.items()}
+        page = {
+            "href": f"{self.base_url}/buy/browse/v1/item_summary/search?{urllib.parse.urlencode(href_params)}",
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "itemSummaries": items,
+        }
+        if offset + limit < total:
+            href_params["offset"] = offset + limit
+            page["next"] = f"{self.base_url}/buy/browse/v1/item_summary/search?{urllib.parse.urlencode(href_params)}"
+        return page
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="mock-ebay", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,273 @@
+import os
+import queue
+import shutil
+import logging
+import threading
+import concurrent.futures
+
+from playwright.sync_api import sync_playwright
+
+log = logging.getLogger(__name__)
+
+# Number of warm browser contexts kept alive for Seller Hub scraping
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+
+# A page is closed and replaced after this many scrapes
+PAGE_MAX_USES = int(os.getenv("BROWSER_PAGE_MAX_USES", "25"))
+
+# Seconds an idle slot waits for work before probing its context
+HEALTH_CHECK_INTERVAL = 60
+
+# Chromium's per-process lock files and caches, not copied when cloning a profile
+PROFILE_CLONE_IGNORE = shutil.ignore_patterns(
+    "SingletonLock", "SingletonCookie", "SingletonSocket", "lockfile",
+    "Cache", "Code Cache", "GPUCache", "ShaderCache", "GrShaderCache", "Crashpad"
+)
+
+
+# Written into a cloned profile; a slot directory without it was never cloned
+PROFILE_CLONE_MARKER = ".cloned-profile"
+
+# A directory in the way of a clone is renamed to this, never deleted
+PROFILE_ASIDE_SUFFIX = ".not-cloned"
+
+
+def async_profile_dir(user_data_dir):
+    # The async pricing context's own Chromium runs on this clone of the profile.
+    return f"{user_data_dir}-async"
+
+
+def clone_profile(source, target):
+    """
+    Copies the logged-in profile at `source` to `target`, so a second
+    Chromium process starts with the same eBay session. An existing clone is
+    kept. A directory that was never cloned (e.g. a signed-out slot profile
+    from an older version, or a real profile when USER_DATA_DIR points at the
+    wrong place) is renamed to `target` + PROFILE_ASIDE_SUFFIX first. Delete
+    the clones after signing in again to re-clone them.
+    """
+    if os.path.exists(os.path.join(target, PROFILE_CLONE_MARKER)):
+        return False
+    if not os.path.isdir(source):
+        if not os.path.exists(target):
+            os.makedirs(target)
+        log.warning("Profile %s does not exist; %s starts signed out", source, target)
+        return False
+    if os.path.exists(target):
+        aside = target + PROFILE_ASIDE_SUFFIX
+        n = 1
+        while os.path.exists(aside):
+            n += 1
+            aside = f"{target}{PROFILE_ASIDE_SUFFIX}-{n}"
+        log.warning("Moving browser profile %s, which was not cloned from %s, aside to %s", target, source, aside)
+        os.rename(target, aside)
+    shutil.copytree(source, target, ignore=PROFILE_CLONE_IGNORE)
+    with open(os.path.join(target, PROFILE_CLONE_MARKER), "w") as f:
+        f.write(source)
+    log.info("Cloned browser profile %s to %s", source, target)
+    return True
+
+
+class BrowserSlot:
+    """
+    One persistent Chromium context and the page currently handed out from it.
+    Playwright's sync API is bound to the thread that started it, so a slot is
+    only ever touched by the pool worker thread that owns it.
+    """
+
+    def __init__(self, profile_dir, headless=False, page_max_uses=PAGE_MAX_USES):
+        self.profile_dir = profile_dir
+        self.headless = headless
+        self.page_max_uses = page_max_uses
+        self.playwright = None
+        self.context = None
+        self.page = None
+        self.page_uses = 0
+
+    def launch(self):
+        if not os.path.exists(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        self.playwright = sync_playwright().start()
+        self.context = self.playwright.chromium.launch_persistent_context(self.profile_dir, headless=self.headless)
+        log.info("Launched browser context for profile %s", self.profile_dir)
+
+    def acquire_page(self):
+        if self.context is None:
+            self.launch()
+        if self.page is None or self.page.is_closed():
+            try:
+                self.page = self.context.new_page()
+            except Exception as e:
+                # The browser died underneath us; start over with a fresh context.
+                log.warning("Browser context for %s is unusable (%s), relaunching", self.profile_dir, e)
+                self.close()
+                self.launch()
+                self.page = self.context.new_page()
+            self.page_uses = 0
+        return self.page
+
+    def release_page(self):
+        self.page_uses += 1
+        if self.page_uses >= self.page_max_uses:
+            self.discard_page()
+
+    def discard_page(self):
+        if self.page is not None:
+            try:
+                self.page.close()
+            except Exception as e:
+                log.debug("Error closing page (ignored): %s", e)
+        self.page = None
+        self.page_uses = 0
+
+    def health_check(self):
+        if self.context is None:
+            return
+        try:
+            if self.page is not None and not self.page.is_closed():
+                self.page.evaluate("1")
+            else:
+                # Reading context.pages never touches the browser; opening a tab does.
+                self.context.new_page().close()
+        except Exception as e:
+            log.warning("Health check failed for %s (%s), closing context", self.profile_dir, e)
+            self.close()
+
+    def close(self):
+        self.page = None
+        self.page_uses = 0
+        if self.context is not None:
+            try:
+                self.context.close()
+            except Exception as e:
+                log.debug("Error closing context (ignored): %s", e)
+            self.context = None
+        if self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception as e:
+                log.debug("Error stopping Playwright (ignored): %s", e)
+            self.playwright = None
+
+
+class BrowserPool:
+    """
+    Fixed-size pool of warm browser contexts. Each slot is a worker thread that
+    owns one BrowserSlot; run() hands a function to the next free slot, which
+    calls it with a ready page and returns the result to the caller.
+    """
+
+    def __init__(self, user_data_dir, size=BROWSER_POOL_SIZE, headless=False, page_max_uses=PAGE_MAX_USES):
+        self.user_data_dir = user_data_dir
+        self.size = max(1, size)
+        self.headless = headless
+        self.page_max_uses = page_max_uses
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def profile_dir(self, slot_index):
+        # Chromium locks a profile directory to one process, so every slot after
+        # the first runs on a copy of the main profile next to it (see start()).
+        if slot_index == 0:
+            return self.user_data_dir
+        return f"{self.user_data_dir}-{slot_index}"
+
+    def clone_profiles(self):
+        """
+        Clones the logged-in profile for every slot after the first and for
+        the async pricing context. Slot 0's Chromium writes to the profile
+        while it runs, so this is only done before slot 0 launches; a copy
+        taken then could catch the Cookies database mid-write.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for target in [self.profile_dir(i) for i in range(1, self.size)] + [async_profile_dir(self.user_data_dir)]:
+                clone_profile(self.user_data_dir, target)
+
+    def start(self):
+        self.clone_profiles()
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.size):
+                slot = BrowserSlot(self.profile_dir(i), headless=self.headless, page_max_uses=self.page_max_uses)
+                thread = threading.Thread(target=self._worker, args=(slot,), name=f"browser-pool-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def run(self, fn, timeout=None):
+        """
+        Runs fn(page) on a pooled page and returns its result. Exceptions raised
+        by fn are re-raised in the caller's thread.
+        """
+        if self._closed:
+            raise RuntimeError("Browser pool has been shut down")
+        self.start()
+        future = concurrent.futures.Future()
+        self._jobs.put((fn, future))
+        return future.result(timeout=timeout)
+
+    def shutdown(self, timeout=10):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _worker(self, slot):
+        try:
+            while True:
+                try:
+                    job = self._jobs.get(timeout=HEALTH_CHECK_INTERVAL)
+                except queue.Empty:
+                    slot.health_check()
+                    continue
+                if job is None:
+                    break
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    page = slot.acquire_page()
+                    result = fn(page)
+                except Exception as e:
+                    # The page may be mid-navigation or crashed; never reuse it.
+                    slot.discard_page()
+                    future.set_exception(e)
+                else:
+                    slot.release_page()
+                    future.set_result(result)
+        finally:
+            slot.close()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_browser_pool(user_data_dir, headless=False):
+    """
+    Returns the process-wide pool, creating it on first use. The headless flag
+    only takes effect when the pool is first started.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BrowserPool(user_data_dir, headless=headless)
+        return _POOL
+
+
+def shutdown_browser_pool():
+    global _POOL
+    with _POOL_LOCK:
+        pool = _POOL
+        _POOL = None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,73 @@
+"""
+One-off migration adding the indexes the listings queries in app.py use:
+
+    python create_listing_indexes.py
+
+Run it once against the listings database, outside the web server: building
+an index on a large table can take minutes. Indexes that already exist are
+skipped, and the freshness index is skipped when the table has no
+LISTINGS_CREATED_COLUMN column.
+"""
+import sys
+import logging
+
+import mysql.connector
+from mysql.connector import Error
+
+from db import DB_CONFIG, NET_PROFIT_SQL, LISTINGS_CREATED_COLUMN
+
+log = logging.getLogger(__name__)
+
+# name -> (columns the index needs, CREATE INDEX statement)
+LISTING_INDEXES = {
+    "idx_listings_net_profit": (
+        ("price", "shipping_cost", "tax_estimate"),
+        f"CREATE INDEX idx_listings_net_profit ON listings (({NET_PROFIT_SQL}))",
+    ),
+    "idx_listings_category_created": (
+        ("category", LISTINGS_CREATED_COLUMN),
+        f"CREATE INDEX idx_listings_category_created ON listings (category, {LISTINGS_CREATED_COLUMN})",
+    ),
+}
+
+
+def listing_columns(cursor):
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'listings'",
+        (DB_CONFIG["database"],)
+    )
+    return {row[0].lower() for row in cursor.fetchall()}
+
+
+def create_listing_indexes():
+    """
+    Creates the missing indexes. Returns False if any could not be created.
+    """
+    connection = mysql.connector.connect(**DB_CONFIG)
+    cursor = connection.cursor()
+    ok = True
+    try:
+        columns = listing_columns(cursor)
+        for name, (needed, statement) in LISTING_INDEXES.items():
+            missing = [column for column in needed if column.lower() not in columns]
+            if missing:
+                log.warning("Skipping %s: listings has no column(s) %s", name, ", ".join(missing))
+                continue
+            try:
+                cursor.execute(statement)
+                log.info("Created %s", name)
+            except Error as e:
+                # 1061: the index already exists
+                if e.errno == 1061:
+                    log.info("%s already exists", name)
+                else:
+                    log.error("Error creating %s: %s", name, e)
+                    ok = False
+    finally:
+        cursor.close()
+        connection.close()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if create_listing_indexes() else 1)
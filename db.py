@@ -0,0 +1,26 @@
+"""
+Settings for the MySQL listings database, shared by app.py and the
+create_listing_indexes.py migration without either importing the other.
+"""
+import os
+import re
+
+# MySQL settings for the listings table
+DB_CONFIG = {
+    "host": '127.0.0.1',
+    "port": 3306,
+    "user": 'root',
+    "password": 'root',
+    "database": 'computer_parts_db'
+}
+
+# Column holding when a listing row was stored, used by the freshness filter.
+# It is interpolated into SQL, so only plain column names are accepted.
+LISTINGS_CREATED_COLUMN = os.getenv("LISTINGS_CREATED_COLUMN", "created_at")
+if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", LISTINGS_CREATED_COLUMN):
+    raise ValueError(f"LISTINGS_CREATED_COLUMN={LISTINGS_CREATED_COLUMN!r} is not a valid column name")
+
+# calculate_net_profit with its defaults (resale = price + 50, 10% platform fee),
+# written so MySQL can match it against the functional index that
+# create_listing_indexes.py adds.
+NET_PROFIT_SQL = "((price + 50) * 0.9 - price - shipping_cost - tax_estimate)"
@@ -0,0 +1,113 @@
+import os
+import logging
+import threading
+import concurrent.futures
+from datetime import datetime, timezone
+
+from ebay_api import iter_browse_items, process_listing
+
+log = logging.getLogger(__name__)
+
+# Seconds between polls of the Browse API
+DEAL_POLL_INTERVAL = float(os.getenv("DEAL_POLL_INTERVAL", "30"))
+
+# Listings scanned on the first poll, before a watermark exists
+DEAL_POLL_LIMIT = int(os.getenv("DEAL_POLL_LIMIT", "1000"))
+
+
+def parse_creation_date(creation_date_str):
+    try:
+        return datetime.fromisoformat(creation_date_str.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+class DealPoller:
+    """
+    Background poller that keeps a high-water mark on itemCreationDate (plus
+    the itemIds seen at that exact instant) and only prices listings that are
+    newer than it. Priced deals are appended to a DealStore that HTTP handlers
+    read from, so repeat page loads cost nothing upstream.
+    """
+
+    def __init__(self, store, keyword="", interval=DEAL_POLL_INTERVAL, limit=DEAL_POLL_LIMIT, cache_expiry=14400, max_workers=20):
+        self.store = store
+        self.keyword = keyword
+        self.interval = interval
+        self.limit = limit
+        self.cache_expiry = cache_expiry
+        self.max_workers = max_workers
+        self.watermark = None  # datetime of the newest listing seen
+        self.watermark_ids = set()  # itemIds created exactly at the watermark
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_new(self, item):
+        if self.watermark is None:
+            return True
+        created = parse_creation_date(item.get("itemCreationDate", ""))
+        if created is None:
+            return False
+        if created > self.watermark:
+            return True
+        return created == self.watermark and item.get("itemId") not in self.watermark_ids
+
+    def advance_watermark(self, items):
+        for item in items:
+            created = parse_creation_date(item.get("itemCreationDate", ""))
+            if created is None:
+                continue
+            if self.watermark is None or created > self.watermark:
+                self.watermark = created
+                self.watermark_ids = {item.get("itemId")}
+            elif created == self.watermark:
+                self.watermark_ids.add(item.get("itemId"))
+
+    def poll_once(self):
+        """
+        Fetches listings added since the last poll, prices them and stores the
+        deals. Returns the number of new listings seen.
+        """
+        since = self.watermark.strftime("%Y-%m-%dT%H:%M:%S.000Z") if self.watermark else None
+        new_items = [item for item in iter_browse_items(keyword=self.keyword, limit=self.limit, since=since) if self.is_new(item)]
+        if not new_items:
+            return 0
+        now = datetime.now(timezone.utc)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(process_listing, item, self.cache_expiry, now) for item in new_items]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    deal = future.result()
+                except Exception as e:
+                    log.error("Error pricing polled listing: %s", e)
+                    continue
+                if deal is not None:
+                    self.store.add(deal)
+        # Only move the watermark once the batch is priced, so a crash mid-batch re-polls it.
+        self.advance_watermark(new_items)
+        log.info("Polled %d new listings, watermark now %s", len(new_items), self.watermark)
+        return len(new_items)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                log.exception("Error polling eBay listings: %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="deal-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
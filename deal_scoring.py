@@ -0,0 +1,74 @@
+import numpy as np
+
+from listing import FAIR_DEAL_MAX, GOOD_DEAL_MAX
+
+# Deal type per net profit tier, as in DealType.for_profit
+DEAL_TYPES = np.array(["fair", "good", "great"])
+
+# Assumed markup when a listing has no resale estimate (see calculate_net_profit)
+DEFAULT_RESALE_MARKUP = 50.0
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def column_to_floats(values):
+    """
+    Converts a column of DB values (floats, Decimals, numeric strings) to a float
+    array in one C-level pass. Values that can't be converted become NaN.
+    """
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        return np.fromiter((_to_float(v) for v in values), dtype=float, count=len(values))
+
+
+def score_listing_columns(price, shipping_cost, tax_estimate, resale_price=None, platform_fee_rate=0.10):
+    """
+    Vectorized calculate_net_profit plus deal tiers. Takes equal-length float
+    arrays and returns (platform_fees, net_profit, deal_type_index).
+    """
+    if resale_price is None:
+        resale_price = price + DEFAULT_RESALE_MARKUP
+    else:
+        resale_price = np.where((resale_price == 0.0) | np.isnan(resale_price), price + DEFAULT_RESALE_MARKUP, resale_price)
+    platform_fees = resale_price * platform_fee_rate
+    net_profit = resale_price - (price + shipping_cost + tax_estimate + platform_fees)
+    deal_type_index = np.searchsorted([FAIR_DEAL_MAX, GOOD_DEAL_MAX], net_profit, side="right")
+    return platform_fees, net_profit, deal_type_index
+
+
+def score_listings(rows, min_profit=30, platform_fee_rate=0.10):
+    """
+    Batch version of the per-row loop in find_good_deals. Rows missing a price,
+    shipping cost or tax estimate (or holding non-numeric values) are skipped.
+    Returns the qualifying row dicts with net_profit, platform_fees and
+    deal_type filled in.
+    """
+    if not rows:
+        return []
+    price = column_to_floats([row.get("price") for row in rows])
+    shipping_cost = column_to_floats([row.get("shipping_cost") for row in rows])
+    tax_estimate = column_to_floats([row.get("tax_estimate") for row in rows])
+    # Like find_good_deals, which calls calculate_net_profit with its default
+    # resale assumption (price + 50), and like NET_PROFIT_SQL's pre-filter.
+    platform_fees, net_profit, deal_type_index = score_listing_columns(
+        price, shipping_cost, tax_estimate, platform_fee_rate=platform_fee_rate
+    )
+    qualifies = np.isfinite(price) & np.isfinite(shipping_cost) & np.isfinite(tax_estimate) & (net_profit >= min_profit)
+    selected = np.flatnonzero(qualifies)
+    net_profit = np.round(net_profit[selected], 2).tolist()
+    platform_fees = np.round(platform_fees[selected], 2).tolist()
+    deal_types = DEAL_TYPES[deal_type_index[selected]].tolist()
+    deals = []
+    for i, row_index in enumerate(selected.tolist()):
+        row = rows[row_index]
+        row["net_profit"] = net_profit[i]
+        row["platform_fees"] = platform_fees[i]
+        row["deal_type"] = deal_types[i]
+        deals.append(row)
+    return deals
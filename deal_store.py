@@ -0,0 +1,228 @@
+import json
+import base64
+import bisect
+import threading
+from collections import deque
+
+from listing import DealType
+
+# Deals kept in memory before the oldest are dropped
+DEAL_STORE_MAX_DEALS = 5000
+
+# /api/deals sort orders: name -> (index, descending). Names match the UI's sort select.
+SORT_ORDERS = {
+    "newest": ("created", True),
+    "net_profit": ("net_profit", True),
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+    "cpu": ("cpu_model", False),
+    "deal_type": ("deal_type", False),
+}
+DEFAULT_SORT = "newest"
+
+# Fields with a filter bitmap per (lowercased) value
+FILTER_FIELDS = ("category", "condition", "deal_type")
+
+
+def index_keys(deal):
+    # Sort key per index. Every key in one index has the same type so they compare.
+    return {
+        "created": deal.created_at,
+        "net_profit": deal.net_profit if deal.net_profit is not None else float("-inf"),
+        "price": deal.price,
+        "cpu_model": (deal.cpu_model or deal.title).lower(),
+        "deal_type": int(deal.deal_type) if deal.deal_type is not None else len(DealType),
+    }
+
+
+def filter_values(deal):
+    return {
+        "category": deal.category.lower(),
+        "condition": deal.condition.lower(),
+        "deal_type": deal.deal_type.label if deal.deal_type is not None else "",
+    }
+
+
+def parse_filters(clauses):
+    """
+    Parses filter strings like "deal_type:great,good;category:CPU" into
+    {field: [values]}. Values for one field are OR'ed, fields are AND'ed.
+    Raises ValueError for an unknown field.
+    """
+    filters = {}
+    for clause in clauses:
+        for part in clause.split(";"):
+            if not part.strip():
+                continue
+            field, _, values = part.partition(":")
+            field = field.strip()
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Unknown filter field '{field}'; expected one of {', '.join(FILTER_FIELDS)}")
+            filters.setdefault(field, []).extend(v.strip() for v in values.split(",") if v.strip())
+    return filters
+
+
+def encode_cursor(entry):
+    return base64.urlsafe_b64encode(json.dumps(entry).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        key, seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return key, int(seq)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class DealStore:
+    """
+    Bounded in-memory store of priced Listings in arrival order. Every deal gets
+    an increasing sequence number so a client can ask for just the deals added
+    since its last read.
+
+    For /api/deals the store also keeps one sorted list of (key, seq) per sort
+    index and, per filter field, an int bitmap per value with one bit per slot.
+    Deals are evicted in arrival order, so a deal's slot is its seq modulo
+    max_deals and a bitmap never grows past max_deals bits.
+    """
+
+    def __init__(self, max_deals=DEAL_STORE_MAX_DEALS):
+        self.max_deals = max_deals
+        self._deals = deque()  # (seq, deal)
+        self._by_seq = {}  # seq -> deal
+        self._item_ids = set()
+        self._indexes = {name: [] for name, _ in SORT_ORDERS.values()}  # index -> sorted [(key, seq)]
+        self._bitmaps = {field: {} for field in FILTER_FIELDS}  # field -> value -> bitmap of slots
+        self._last_seq = 0
+        self._cond = threading.Condition()
+
+    def add(self, deal):
+        """
+        Appends a deal and returns its sequence number, or None if a deal with
+        the same itemId is already stored.
+        """
+        item_id = deal.item_id
+        with self._cond:
+            if item_id and item_id in self._item_ids:
+                return None
+            # Evict first: the oldest deal's slot is the one the new deal takes over.
+            while len(self._deals) >= self.max_deals:
+                seq, dropped = self._deals.popleft()
+                self._item_ids.discard(dropped.item_id)
+                self._unindex_locked(seq, dropped)
+            self._last_seq += 1
+            self._deals.append((self._last_seq, deal))
+            if item_id:
+                self._item_ids.add(item_id)
+            self._index_locked(self._last_seq, deal)
+            self._cond.notify_all()
+            return self._last_seq
+
+    def _slot(self, seq):
+        return (seq - 1) % self.max_deals
+
+    def _index_locked(self, seq, deal):
+        self._by_seq[seq] = deal
+        for name, key in index_keys(deal).items():
+            bisect.insort(self._indexes[name], (key, seq))
+        bit = 1 << self._slot(seq)
+        for field, value in filter_values(deal).items():
+            bitmaps = self._bitmaps[field]
+            bitmaps[value] = bitmaps.get(value, 0) | bit
+
+    def _unindex_locked(self, seq, deal):
+        # Deals are never mutated after add(), so their keys are still the indexed ones.
+        self._by_seq.pop(seq, None)
+        for name, key in index_keys(deal).items():
+            index = self._indexes[name]
+            i = bisect.bisect_left(index, (key, seq))
+            if i < len(index) and index[i] == (key, seq):
+                del index[i]
+        bit = 1 << self._slot(seq)
+        for field, value in filter_values(deal).items():
+            bitmaps = self._bitmaps[field]
+            remaining = bitmaps.get(value, 0) & ~bit
+            if remaining:
+                bitmaps[value] = remaining
+            else:
+                bitmaps.pop(value, None)
+
+    def _filter_mask_locked(self, filters):
+        # None matches everything. Category values also match any category path
+        # containing them, so "CPU" selects "...|CPUs/Processors".
+        mask = None
+        for field, values in (filters or {}).items():
+            if not values:
+                continue
+            bitmaps = self._bitmaps[field]
+            field_mask = 0
+            for value in values:
+                value = value.lower()
+                if field == "category":
+                    for category, bitmap in bitmaps.items():
+                        if value in category:
+                            field_mask |= bitmap
+                else:
+                    field_mask |= bitmaps.get(value, 0)
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def query(self, sort=DEFAULT_SORT, filters=None, cursor=None, limit=50):
+        """
+        Returns (deals, next_cursor, total) for one page of the deals matching
+        `filters` ({field: [values]}, see parse_filters) in `sort` order.
+        Pass next_cursor back to get the following page; it is None on the
+        last one. Raises ValueError for an unknown sort or a bad cursor.
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort '{sort}'; expected one of {', '.join(SORT_ORDERS)}")
+        name, descending = SORT_ORDERS[sort]
+        after = decode_cursor(cursor) if cursor else None
+        with self._cond:
+            mask = self._filter_mask_locked(filters)
+            index = self._indexes[name]
+            try:
+                # Keyset pagination: resume just past the last entry of the previous page.
+                if descending:
+                    pos = len(index) - 1 if after is None else bisect.bisect_left(index, after) - 1
+                else:
+                    pos = 0 if after is None else bisect.bisect_right(index, after)
+            except TypeError as e:
+                raise ValueError(f"Invalid cursor for sort '{sort}': {cursor}") from e
+            step = -1 if descending else 1
+            page = []
+            while 0 <= pos < len(index) and len(page) < limit:
+                entry = index[pos]
+                if mask is None or mask >> self._slot(entry[1]) & 1:
+                    page.append(entry)
+                pos += step
+            total = len(self._deals) if mask is None else mask.bit_count()
+            deals = [self._by_seq[seq] for _, seq in page]
+        next_cursor = encode_cursor(list(page[-1])) if len(page) == limit and limit > 0 else None
+        return deals, next_cursor, total
+
+    def since(self, seq=0):
+        with self._cond:
+            return [(s, deal) for s, deal in self._deals if s > seq]
+
+    def snapshot(self):
+        with self._cond:
+            return [deal for _, deal in self._deals]
+
+    def wait_for(self, seq, timeout=None):
+        """
+        Blocks until a deal newer than `seq` arrives (or the timeout passes)
+        and returns the newer deals.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_seq > seq, timeout=timeout)
+        return self.since(seq)
+
+    @property
+    def last_seq(self):
+        with self._cond:
+            return self._last_seq
+
+    def __len__(self):
+        with self._cond:
+            return len(self._deals)
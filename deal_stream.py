@@ -0,0 +1,224 @@
+"""
+Wire encoding for /api/deals/stream.
+
+Deals are encoded as NDJSON (orjson when installed, else compact stdlib json)
+or, for clients that ask for it, as a stream of concatenated MessagePack
+maps. Encoded deals are micro-batched: the first deal is written at once so
+the page starts rendering, later ones are held until DEAL_STREAM_BATCH_BYTES
+have built up or DEAL_STREAM_FLUSH_MS have passed since the oldest held
+deal, whichever comes first. Each batch goes through a gzip or brotli
+compressor (negotiated from Accept-Encoding) that is flushed per batch, so
+a client can decode every batch as soon as it arrives.
+"""
+import os
+import json
+import time
+import zlib
+import queue
+import logging
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+# "auto" uses orjson when installed; "json" forces the standard library
+DEAL_STREAM_JSON = os.getenv("DEAL_STREAM_JSON", "auto")
+
+# Bytes of encoded deals held before a write, and the longest a deal is held
+DEAL_STREAM_BATCH_BYTES = int(os.getenv("DEAL_STREAM_BATCH_BYTES", "16384"))
+DEAL_STREAM_FLUSH_SECONDS = float(os.getenv("DEAL_STREAM_FLUSH_MS", "50")) / 1000
+
+# "auto" negotiates br or gzip from Accept-Encoding; "off" always sends identity
+DEAL_STREAM_COMPRESSION = os.getenv("DEAL_STREAM_COMPRESSION", "auto")
+DEAL_STREAM_GZIP_LEVEL = int(os.getenv("DEAL_STREAM_GZIP_LEVEL", "6"))
+DEAL_STREAM_BROTLI_QUALITY = int(os.getenv("DEAL_STREAM_BROTLI_QUALITY", "5"))
+
+NDJSON = "ndjson"
+MSGPACK = "msgpack"
+# The NDJSON stream keeps the content type it has always been served with.
+CONTENT_TYPES = {NDJSON: "application/json", MSGPACK: "application/x-msgpack"}
+MSGPACK_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+
+_DONE = object()
+
+
+def _dumps_orjson(obj):
+    return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _dumps_json(obj):
+    return json.dumps(obj, separators=(",", ":")).encode() + b"\n"
+
+
+def _packb(obj):
+    return msgpack.packb(obj)
+
+
+def get_encoder(fmt=NDJSON, backend=DEAL_STREAM_JSON):
+    """
+    Returns encode(obj) -> bytes for one deal in the given format.
+    """
+    if fmt == MSGPACK:
+        if msgpack is None:
+            raise ValueError("MessagePack output needs the msgpack package")
+        return _packb
+    if backend == "orjson" or (backend == "auto" and orjson is not None):
+        if orjson is None:
+            raise ValueError("DEAL_STREAM_JSON=orjson but orjson is not installed")
+        return _dumps_orjson
+    return _dumps_json
+
+
+def negotiate_format(requested, accept_mimetypes):
+    """
+    NDJSON unless the client asked for MessagePack with ?format=msgpack or an
+    Accept header. Raises ValueError for an unknown or unavailable format.
+    """
+    if requested:
+        if requested not in CONTENT_TYPES:
+            raise ValueError(f"Unknown format '{requested}'; expected one of {', '.join(CONTENT_TYPES)}")
+        fmt = requested
+    else:
+        best = accept_mimetypes.best_match(("application/json",) + MSGPACK_TYPES) if accept_mimetypes else None
+        fmt = MSGPACK if best in MSGPACK_TYPES else NDJSON
+    if fmt == MSGPACK and msgpack is None:
+        raise ValueError("MessagePack output needs the msgpack package")
+    return fmt
+
+
+def negotiate_encoding(accept_encodings, mode=DEAL_STREAM_COMPRESSION):
+    # "br" or "gzip" when the client accepts it, else None for identity.
+    if mode == "off" or not accept_encodings:
+        return None
+    if brotli is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+class StreamCompressor:
+    """
+    Incremental gzip or brotli compressor. compress() returns everything
+    needed to decode the data passed so far; finish() ends the stream.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=DEAL_STREAM_BROTLI_QUALITY)
+        elif encoding == "gzip":
+            self._compressor = zlib.compressobj(DEAL_STREAM_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            raise ValueError(f"Unsupported stream encoding '{encoding}'")
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def _pump(items, out, stop):
+    # Runs the (blocking) deal generator on its own thread so the writer can
+    # flush on a deadline while the pipeline is still pricing the next deal.
+    try:
+        for item in items:
+            if stop.is_set():
+                break
+            out.put(item)
+    except Exception as e:
+        out.put(e)
+    finally:
+        close = getattr(items, "close", None)
+        if close is not None:
+            close()
+        out.put(_DONE)
+
+
+def micro_batches(items, encode, max_bytes=DEAL_STREAM_BATCH_BYTES, max_delay=DEAL_STREAM_FLUSH_SECONDS, on_close=None):
+    """
+    Yields the encoded items joined into batches: the first item alone, then
+    up to max_bytes, with no item held longer than max_delay seconds. With
+    max_delay <= 0 every item is written as soon as it is encoded.
+
+    on_close() is called from the consumer's side when the batches are closed
+    (e.g. the client disconnected). A source that blocks waiting for its next
+    item should return from that wait when on_close() is called, so the pump
+    thread and the source end with the stream instead of at the next item.
+    """
+    if max_delay <= 0:
+        try:
+            for item in items:
+                yield encode(item)
+        finally:
+            if on_close is not None:
+                on_close()
+        return
+    out = queue.SimpleQueue()
+    stop = threading.Event()
+    threading.Thread(target=_pump, args=(items, out, stop), name="deal-stream", daemon=True).start()
+    batch = []
+    size = 0
+    deadline = None
+    first = True
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = out.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            else:
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                chunk = encode(item)
+                batch.append(chunk)
+                size += len(chunk)
+                if deadline is None:
+                    deadline = time.monotonic() + max_delay
+            if batch and (first or size >= max_bytes or time.monotonic() >= deadline):
+                yield b"".join(batch)
+                batch, size, deadline, first = [], 0, None, False
+        if batch:
+            yield b"".join(batch)
+    finally:
+        # Also reached when the client disconnects and the response is closed.
+        stop.set()
+        if on_close is not None:
+            on_close()
+
+
+def encode_stream(items, fmt=NDJSON, encoding=None, backend=DEAL_STREAM_JSON, max_bytes=DEAL_STREAM_BATCH_BYTES, max_delay=DEAL_STREAM_FLUSH_SECONDS, on_close=None):
+    """
+    Yields the response body for a stream of JSON-serializable deals. See
+    micro_batches for on_close.
+    """
+    batches = micro_batches(items, get_encoder(fmt, backend), max_bytes, max_delay, on_close)
+    if encoding is None:
+        yield from batches
+        return
+    compressor = StreamCompressor(encoding)
+    for batch in batches:
+        yield compressor.compress(batch)
+    yield compressor.finish()
@@ -1,92 +1,179 @@
 import os
+import json
 import base64
 import requests
 import re
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 import time
 import statistics
+import math
+import functools
 import concurrent.futures
 import urllib.parse
-from bs4 import BeautifulSoup
-import aiohttp
 import asyncio
+import logging
 
 # --- Playwright Imports ---
-from playwright.sync_api import sync_playwright
+from browser_pool import get_browser_pool
+from price_cache import PriceCache, FailureCache, Revalidator, mark_stale
+from singleflight import SingleFlight
+from http_client import get_session, get_async_session, default_timeout
+from metrics import STAGE_SECONDS, PIPELINE_SECONDS, UPSTREAM_RETRIES, UPSTREAM_503, SCRAPE_FAILURES
+from log_config import get_item_logger
+from terapeak_parser import parse_research_page
+from rate_limit import get_limiter, parse_retry_after, CircuitOpenError, THROTTLE_STATUSES
+from fair_value import FairValue, FairValueTable, LOW_SALES_SAMPLES
+from oauth_token import TokenManager
+from listing import Listing, DealType
 
-DEBUG = True
+log = logging.getLogger(__name__)
 
-# OAuth token cache for eBay API
-TOKEN_CACHE = {
-    "token": None,
-    "expires_at": None  # datetime when the token expires
-}
+# Messages logged once per listing; sampled (see LOG_SAMPLE_EVERY)
+item_log = get_item_logger(__name__)
+
+# eBay endpoints (EBAY_API_BASE and EBAY_WEB_BASE can point at a local stand-in for offline runs)
+EBAY_API_BASE = os.getenv("EBAY_API_BASE", "https://api.ebay.com").rstrip("/")
+OAUTH_TOKEN_URL = f"{EBAY_API_BASE}/identity/v1/oauth2/token"
+BROWSE_SEARCH_URL = f"{EBAY_API_BASE}/buy/browse/v1/item_summary/search"
+EBAY_WEB_BASE = os.getenv("EBAY_WEB_BASE", "https://www.ebay.com").rstrip("/")
+SELLER_HUB_RESEARCH_URL = f"{EBAY_WEB_BASE}/sh/research"
+
+# Browse API paging: items per page (API maximum is 200), deepest page scanned,
+# and how many pages are fetched at once after the first
+BROWSE_PAGE_SIZE = 200
+BROWSE_MAX_PAGES = int(os.getenv("BROWSE_MAX_PAGES", "50"))
+BROWSE_PAGE_CONCURRENCY = int(os.getenv("BROWSE_PAGE_CONCURRENCY", "4"))
 
-# Directory for persistent Playwright profile
+# Directory for persistent Playwright profile. Seller Hub needs a signed-in
+# session: sign in once with
+#     python -m playwright open --user-data-dir C:/temp/playwright-profile https://www.ebay.com/sh/research
+# and close the window. Extra browser pool slots (-1, -2, ...) and the async
+# context (-async) start from copies of this profile; delete them after signing
+# in again so they are re-cloned.
 USER_DATA_DIR = "C:/temp/playwright-profile"
 if not os.path.exists(USER_DATA_DIR):
     os.makedirs(USER_DATA_DIR)
 
-# Cache for scraped prices by CPU model
-SCRAPED_PRICE_CACHE = {}
+# Cache for scraped prices by (CPU model, condition, day range), persisted under cache/
+SCRAPED_PRICE_CACHE = PriceCache("scraped_price")
+
+# Global cache for sold data (Terapeak/Seller Hub scrape) results, keyed by query
+SOLD_DATA_CACHE = PriceCache("sold_data")
+
+# Seller Hub queries whose scrape failed, skipped for a backoff that doubles per failure
+SCRAPE_FAILURE_CACHE = FailureCache("scrape_failures")
+
+# Active-listing medians by (short model, condition id); short-lived since listings turn over
+ACTIVE_PRICE_CACHE_TTL = int(os.getenv("ACTIVE_PRICE_CACHE_TTL", "900"))
+ACTIVE_PRICE_CACHE = PriceCache("active_price", ttl=ACTIVE_PRICE_CACHE_TTL, hard_ttl=ACTIVE_PRICE_CACHE_TTL)
+
+# Concurrent misses for the same cache key share one scrape instead of each launching their own
+FAIR_VALUE_FLIGHTS = SingleFlight()
+SOLD_DATA_FLIGHTS = SingleFlight()
+ACTIVE_PRICE_FLIGHTS = SingleFlight()
+
+# Fair values precomputed by a FairValueWarmer (see app.py); read before either cache
+FAIR_VALUE_TABLE = FairValueTable()
+
+# Stale SCRAPED_PRICE_CACHE entries are refreshed on these threads while the stale price is served
+REVALIDATE_WORKERS = int(os.getenv("REVALIDATE_WORKERS", "4"))
+REVALIDATIONS = Revalidator()
+REVALIDATE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS, thread_name_prefix="revalidate")
+
+# CPU model patterns in priority order: when several match, the earliest entry wins,
+# and within one entry the leftmost match wins. Titles are lowercased before matching.
+CPU_MODEL_PATTERNS = [
+    ("intel_core", r'intel\s+(?:core\s+)?i\d[- ]*\d{3,5}[a-z0-9]*\b'),
+    ("amd_ryzen", r'(?:amd\s+)?ryzen\s+\d+\s+\d{3,5}[a-z0-9]*\b'),
+    ("amd_athlon", r'amd\s+(?:athlon\s+(?:64\s+)?)?[a-z0-9-]*\d+[a-z0-9-]*\b'),
+    ("intel_xeon_alt", r'intel\s+xeon\s+e\d{1,4}[-\s]*\d{1,4}(?:\s*v\d+)?(?:\s*\d+m\s*cache)?'),
+    ("intel_xeon_fallback", r'intel\s+xeon\s+w[-\s]?\d{3,5}[a-z0-9-]*(?:\s+\d+-core)?\b'),
+    ("intel_core2", r'intel\s+core\s+2\s+duo\s+[a-z]\d{4,5}\b'),
+    ("amd_ryzen_pro", r'(?:amd\s+)?ryzen\s+(?:pro\s+)?\d+\s+\d{3,5}[a-z0-9]*\b'),
+    ("lot", r'(?:lot\s+of\s+\d+\s+assorted\s+)?(?:intel\s+(?:pentium|celeron|core\s+2)|amd\s+(?:athlon))\b'),
+]
+CPU_MODEL_PRIORITY = {name: rank for rank, (name, _) in enumerate(CPU_MODEL_PATTERNS)}
+
+# Families whose matches can never pass the consumer-CPU checks in extract_cpu_model
+NON_CONSUMER_FAMILIES = {"amd_athlon", "intel_xeon_alt", "intel_xeon_fallback", "intel_core2", "lot"}
+
+# Every model pattern starts with one of these words and the clock speed with a
+# decimal number, so only positions where this matches can start a match.
+RE_CPU_TOKEN = re.compile(r'intel|amd|ryzen|lot|\d+\.\d')
 
-# Global cache for sold data (Terapeak/Seller Hub scrape) results
-SOLD_DATA_CACHE = {}
+# All model patterns plus the clock speed as one alternation with named groups.
+# Alternatives are tried in order, so at a given position the highest-priority
+# pattern that matches there is the one reported.
+RE_CPU_TITLE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in CPU_MODEL_PATTERNS)
+    + r'|(?P<ghz>(?P<ghz_value>\d+\.\d+)\s*ghz)'
+)
+RE_CONSUMER_CPU = re.compile(r'^(?:intel\s+core\s+i[3579]|amd\s+ryzen\s+[3579])')
+TRADEMARK_TABLE = str.maketrans("", "", "®™")
 
-# Precompiled regex patterns for CPU model extraction
-RE_INTEL_CORE = re.compile(r'(intel\s+(?:core\s+)?i\d[- ]*\d{3,5}[a-z0-9]*)\b', re.IGNORECASE)
-RE_AMD_RYZEN = re.compile(r'((?:amd\s+)?ryzen\s+\d+\s+\d{3,5}[a-z0-9]*)\b', re.IGNORECASE)
-RE_AMD_ATHLON = re.compile(r'(amd\s+(?:athlon\s+(?:64\s+)?)?[a-z0-9-]*\d+[a-z0-9-]*)\b', re.IGNORECASE)
-RE_INTEL_XEON_ALT = re.compile(r'(intel\s+xeon\s+e\d{1,4}[-\s]*\d{1,4}(?:\s*v\d+)?(?:\s*\d+M\s*cache)?)', re.IGNORECASE)
-RE_INTEL_XEON_FALLBACK = re.compile(r'(intel\s+xeon\s+w[-\s]?\d{3,5}[a-z0-9-]*(?:\s+\d+-core)?)\b', re.IGNORECASE)
-RE_INTEL_CORE2 = re.compile(r'(intel\s+core\s+2\s+duo\s+[a-z]\d{4,5})\b', re.IGNORECASE)
-RE_AMD_RYZEN_PRO = re.compile(r'((?:amd\s+)?ryzen\s+(?:pro\s+)?\d+\s+\d{3,5}[a-z0-9]*)\b', re.IGNORECASE)
-RE_LOT = re.compile(r'(?:lot\s+of\s+\d+\s+assorted\s+)?(?:intel\s+(?:pentium|celeron|core\s+2)|amd\s+(?:athlon))\b', re.IGNORECASE)
-RE_REFRESH_RATE = re.compile(r'(\d+\.\d+)\s*ghz', re.IGNORECASE)
+# Titles remembered by extract_cpu_model; relists and bulk backfills repeat titles a lot
+EXTRACT_CACHE_SIZE = 65536
 
 # ---------------------------
 # Helper Functions
 # ---------------------------
 
-def request_with_retry(method, url, headers=None, params=None, data=None, max_attempts=3, delay=3):
+def limiter_for_url(url):
+    if url.startswith(OAUTH_TOKEN_URL):
+        return get_limiter("oauth")
+    if url.startswith(SELLER_HUB_RESEARCH_URL):
+        return get_limiter("seller_hub")
+    return get_limiter("browse")
+
+def request_with_retry(method, url, headers=None, params=None, data=None, max_attempts=3, delay=3, timeout=None):
+    """
+    Sends a request through the endpoint's rate limiter, retrying 429/503 and
+    connection errors. A throttled response pauses the shared limiter for its
+    Retry-After (or the doubling delay), so every caller backs off together.
+    Returns the last response, or None if nothing arrived or the endpoint's
+    circuit is open.
+    """
     attempt = 0
     current_delay = delay
+    response = None
+    session = get_session()
+    timeout = timeout or default_timeout()
+    limiter = limiter_for_url(url)
     while attempt < max_attempts:
         try:
-            response = requests.request(method, url, headers=headers, params=params, data=data)
-            if response.status_code == 503:
-                if DEBUG:
-                    print(f"Attempt {attempt+1}: Received 503 for {url}. Retrying in {current_delay} seconds...")
+            limiter.acquire()
+        except CircuitOpenError as e:
+            log.warning("%s; not requesting %s", e, url)
+            return None
+        try:
+            response = session.request(method, url, headers=headers, params=params, data=data, timeout=timeout)
+        except Exception as e:
+            limiter.record(error=True)
+            UPSTREAM_RETRIES.inc(reason="error")
+            attempt += 1
+            if attempt < max_attempts:
+                log.info("Attempt %d: %s for %s, retrying in %s seconds", attempt, e, url, current_delay)
                 time.sleep(current_delay)
-                attempt += 1
                 current_delay *= 2
-                continue
-            return response
-        except Exception as e:
-            if DEBUG:
-                print(f"Attempt {attempt+1}: Exception {e} for {url}. Retrying in {current_delay} seconds...")
-            time.sleep(current_delay)
+            continue
+        if response.status_code in THROTTLE_STATUSES:
+            if response.status_code == 503:
+                UPSTREAM_503.inc()
+            UPSTREAM_RETRIES.inc(reason=str(response.status_code))
+            retry_after = parse_retry_after(response.headers.get("Retry-After")) or current_delay
+            limiter.record(response.status_code, retry_after=retry_after)
+            log.info("Attempt %d: received %s for %s, retrying in %s seconds", attempt + 1, response.status_code, url, retry_after)
             attempt += 1
             current_delay *= 2
-    if DEBUG:
-        print(f"Max retries reached for {url}, returning last response with status {response.status_code}")
+            continue
+        limiter.record(response.status_code)
+        return response
+    log.warning("Max retries reached for %s, returning last response with status %s", url, response.status_code if response is not None else None)
     return response
 
-def get_seller_hub_metric_value(query="Intel Core I5-7500T 2.7GHz", headless=False, day_range=30, category_id=164, limit=50, tz="America/New_York"):
-    """
-    Uses Playwright with a persistent profile to load the Seller Hub research page
-    and scrape the average sold price from an element with class 'metric-value'.
-    Results for each query are cached in SOLD_DATA_CACHE.
-    """
-    # Check if the result for this query is already cached.
-    if query in SOLD_DATA_CACHE:
-        if DEBUG:
-            print(f"Using cached sold data for query: {query}")
-        return SOLD_DATA_CACHE[query]
-    
-    base_url = "https://www.ebay.com/sh/research"
-    url = (
-        f"{base_url}?marketplace=EBAY-US"
+def build_seller_hub_url(query, day_range=30, category_id=164, limit=50, tz="America/New_York"):
+    return (
+        f"{SELLER_HUB_RESEARCH_URL}?marketplace=EBAY-US"
         f"&keywords={query.replace(' ', '+')}"
         f"&dayRange={day_range}"
         f"&categoryId={category_id}"
@@ -94,129 +181,167 @@ def get_seller_hub_metric_value(query="Intel Core I5-7500T 2.7GHz", headless=Fal
         f"&tabName=SOLD"
         f"&tz={urllib.parse.quote(tz)}"
     )
-    
+
+def parse_metric_text(text_val):
+    text_val = re.sub(r"[^\d.]+", "", text_val.strip())
+    if not text_val:
+        return None
+    try:
+        return float(text_val)
+    except ValueError:
+        return None
+
+def get_seller_hub_metric_value(query="Intel Core I5-7500T 2.7GHz", headless=False, day_range=30, category_id=164, limit=50, tz="America/New_York", refresh=False):
+    """
+    Uses a warm page from the shared browser pool to load the Seller Hub research
+    page and scrape the average sold price from an element with class 'metric-value'.
+    Results for each query are cached in SOLD_DATA_CACHE; refresh=True skips the
+    cached value and scrapes again.
+    """
+    # Check if the result for this query is already cached.
+    cache_key = SOLD_DATA_CACHE.make_key(query, day_range=day_range)
+    if not refresh:
+        cached_value = SOLD_DATA_CACHE.get(cache_key)
+        if cached_value is not None:
+            item_log.debug("Using cached sold data for query: %s", query)
+            return cached_value
+    if SCRAPE_FAILURE_CACHE.backing_off(cache_key):
+        item_log.debug("Skipping Seller Hub scrape for '%s' after recent failures", query)
+        return None
+    return SOLD_DATA_FLIGHTS.do(cache_key, _scrape_seller_hub_metric_value, query, headless, day_range, category_id, limit, tz, cache_key, refresh)
+
+def _scrape_seller_hub_metric_value(query, headless, day_range, category_id, limit, tz, cache_key, refresh=False):
+    # Another flight for this key may have filled the cache while we were waiting to start.
+    cached_value = None if refresh else SOLD_DATA_CACHE.get(cache_key)
+    if cached_value is not None:
+        return cached_value
+
+    url = build_seller_hub_url(query, day_range=day_range, category_id=category_id, limit=limit, tz=tz)
+
+    def scrape(page):
+        with STAGE_SECONDS.time(stage="scrape"):
+            response = page.goto(url)
+            status = response.status if response is not None else 200
+            if status in THROTTLE_STATUSES:
+                return status, parse_retry_after(response.headers.get("retry-after")), None
+            page.wait_for_selector("div.metric-value", timeout=40000)
+            return status, None, page.inner_text("div.metric-value")
+
+    limiter = get_limiter("seller_hub")
     max_attempts = 3
     for attempt in range(max_attempts):
         try:
-            with sync_playwright() as p:
-                context = p.chromium.launch_persistent_context(USER_DATA_DIR, headless=headless)
-                page = context.new_page()
-                page.goto(url)
-                page.wait_for_selector("div.metric-value", timeout=40000)
-                text_val = page.inner_text("div.metric-value").strip()
-                text_val = re.sub(r"[^\d.]+", "", text_val)
-                if text_val:
-                    metric_value = float(text_val)
-                    if DEBUG:
-                        print(f"Scraped metric value from Seller Hub: {metric_value}")
-                    # Cache the result before returning it.
-                    SOLD_DATA_CACHE[query] = metric_value
-                    return metric_value
-                else:
-                    print("No numeric value found in metric-value element.")
-                    metric_value = None
-                try:
-                    context.close()
-                except Exception as close_error:
-                    if DEBUG:
-                        print(f"Error closing context (ignored): {close_error}")
-                return metric_value
+            limiter.acquire()
+        except CircuitOpenError as e:
+            # Fail fast so the caller falls back to active-listing pricing.
+            SCRAPE_FAILURES.inc(reason="circuit_open")
+            log.info("%s; skipping Seller Hub scrape for '%s'", e, query)
+            return None
+        try:
+            status, retry_after, text_val = get_browser_pool(USER_DATA_DIR, headless=headless).run(scrape)
         except Exception as e:
+            limiter.record(error=True)
             if "Target page, context or browser has been closed" in str(e):
-                print(f"Attempt {attempt+1} failed due to context closed error: {e}")
+                SCRAPE_FAILURES.inc(reason="context_closed")
+                log.warning("Scrape attempt %d failed because the browser context closed: %s", attempt + 1, e)
                 time.sleep(2)
                 continue
             else:
-                print(f"Error in Playwright scraping: {e}")
+                SCRAPE_FAILURES.inc(reason="error")
+                log.error("Error in Playwright scraping for '%s': %s", query, e)
+                SCRAPE_FAILURE_CACHE.record_failure(cache_key)
                 return None
+        limiter.record(status, retry_after=retry_after)
+        if text_val is None:
+            SCRAPE_FAILURES.inc(reason="throttled")
+            log.warning("Seller Hub returned %s for '%s' (attempt %d)", status, query, attempt + 1)
+            continue
+        metric_value = parse_metric_text(text_val)
+        if metric_value is not None:
+            log.debug("Scraped metric value from Seller Hub for '%s': %s", query, metric_value)
+            # Cache the result before returning it.
+            SOLD_DATA_CACHE.set(cache_key, metric_value)
+            SCRAPE_FAILURE_CACHE.record_success(cache_key)
+            return metric_value
+        SCRAPE_FAILURES.inc(reason="no_value")
+        log.warning("No numeric value found in metric-value element for '%s'", query)
+        SCRAPE_FAILURE_CACHE.record_failure(cache_key)
+        return None
     return None
 
 def is_consumer_cpu(model_str):
-    pattern = r'^(?:intel\s+core\s+i[3579]|amd\s+ryzen\s+[3579])'
-    return bool(re.search(pattern, model_str.lower()))
+    return bool(RE_CONSUMER_CPU.search(model_str.lower()))
 
-def extract_cpu_model(title):
-    title_clean = re.sub(r'[®™]', '', title)
-    title_lower = re.sub(r'\s+', ' ', title_clean.lower()).strip()
+def match_cpu_title(title_lower):
+    """
+    Scans a normalized title once and returns (family, model_text, clock_speed_text);
+    any of them may be None. Candidate positions are visited left to right
+    and the best-ranked pattern's first hit wins, which is the same match as
+    searching for each pattern in turn.
+    """
+    best_rank = len(CPU_MODEL_PATTERNS)
+    family = None
     extracted = None
+    ghz_value = None
+    token = RE_CPU_TOKEN.search(title_lower)
+    while token:
+        start = token.start()
+        match = RE_CPU_TITLE.match(title_lower, start)
+        if match:
+            name = match.lastgroup
+            if name == "ghz":
+                if ghz_value is None:
+                    ghz_value = match.group("ghz_value")
+            else:
+                rank = CPU_MODEL_PRIORITY[name]
+                if rank < best_rank:
+                    best_rank = rank
+                    family = name
+                    extracted = match.group(name).strip()
+            if best_rank == 0 and ghz_value is not None:
+                break
+        token = RE_CPU_TOKEN.search(title_lower, start + 1)
+    return family, extracted, ghz_value
+
+def extract_cpu_model(title):
+    return _extract_cpu_model(title)
+
+@functools.lru_cache(maxsize=EXTRACT_CACHE_SIZE)
+def _extract_cpu_model(title):
+    title_lower = " ".join(title.translate(TRADEMARK_TABLE).lower().split())
+    family, extracted, rr = match_cpu_title(title_lower)
 
-    intel_match = RE_INTEL_CORE.search(title_lower)
-    if intel_match:
-        extracted = intel_match.group(0).strip()
-    if not extracted:
-        amd_ryzen_match = RE_AMD_RYZEN.search(title_lower)
-        if amd_ryzen_match:
-            extracted = amd_ryzen_match.group(0).strip()
-    if not extracted:
-        amd_athlon_match = RE_AMD_ATHLON.search(title_lower)
-        if amd_athlon_match:
-            extracted = amd_athlon_match.group(0).strip()
-    if not extracted:
-        intel_xeon_alt_match = RE_INTEL_XEON_ALT.search(title_lower)
-        if intel_xeon_alt_match:
-            extracted = intel_xeon_alt_match.group(1).strip()
-    if not extracted:
-        intel_xeon_match = RE_INTEL_XEON_FALLBACK.search(title_lower)
-        if intel_xeon_match:
-            extracted = intel_xeon_match.group(1).strip()
-    if not extracted:
-        intel_core2_match = RE_INTEL_CORE2.search(title_lower)
-        if intel_core2_match:
-            extracted = intel_core2_match.group(1).strip()
-    if not extracted:
-        amd_ryzen_pro_match = RE_AMD_RYZEN_PRO.search(title_lower)
-        if amd_ryzen_pro_match:
-            extracted = amd_ryzen_pro_match.group(0).strip()
-    if not extracted:
-        lot_match = RE_LOT.search(title_lower)
-        if lot_match:
-            extracted = lot_match.group(0).strip()
-    
+    if family in NON_CONSUMER_FAMILIES:
+        item_log.debug("Skipping non-consumer CPU model: '%s'", extracted)
+        return None
     if extracted:
-        refresh_rate_match = RE_REFRESH_RATE.search(title_lower)
-        if refresh_rate_match:
-            rr = refresh_rate_match.group(1).strip()
+        if rr:
             rr_clean = str(float(rr))
             if rr_clean.lower() not in extracted.lower():
                 extracted += " " + rr_clean + "GHz"
-        if DEBUG:
-            print(f"Original title: '{title}'")
-            print(f"Extracted model: '{extracted}'")
+        item_log.debug("Extracted model '%s' from title '%s'", extracted, title)
         extracted_title = extracted.title().replace("Ghz", "GHz")
+        extracted_lower = extracted_title.lower()
         non_consumer_keywords = ["epyc", "core duo", "power mac"]
-        if any(keyword in extracted_title.lower() for keyword in non_consumer_keywords):
-            if DEBUG:
-                print(f"Skipping non-consumer CPU model: '{extracted_title}'")
-                print("-------")
+        if any(keyword in extracted_lower for keyword in non_consumer_keywords):
+            item_log.debug("Skipping non-consumer CPU model: '%s'", extracted_title)
             return None
-        if "xeon" in extracted_title.lower():
-            if DEBUG:
-                print(f"Skipping Xeon processor: '{extracted_title}'")
-                print("-------")
+        if "xeon" in extracted_lower:
+            item_log.debug("Skipping Xeon processor: '%s'", extracted_title)
             return None
         if not is_consumer_cpu(extracted_title):
-            if DEBUG:
-                print(f"Skipping non-consumer CPU model: '{extracted_title}'")
-                print("-------")
+            item_log.debug("Skipping non-consumer CPU model: '%s'", extracted_title)
             return None
         return extracted_title
     else:
-        if DEBUG:
-            print(f"No CPU model extracted from '{title}'")
-            print("-------")
+        item_log.debug("No CPU model extracted from '%s'", title)
         return None
 
-def get_ebay_oauth_token():
-    now = datetime.now(timezone.utc)
-    if TOKEN_CACHE["token"] and TOKEN_CACHE["expires_at"] and now < TOKEN_CACHE["expires_at"]:
-        if DEBUG:
-            print("Using cached OAuth token")
-        return TOKEN_CACHE["token"]
+def oauth_request_args():
     client_id = os.getenv("EBAY_CLIENT_ID")
     client_secret = os.getenv("EBAY_CLIENT_SECRET")
     if not client_id or not client_secret:
         raise Exception("Please set EBAY_CLIENT_ID and EBAY_CLIENT_SECRET environment variables.")
-    url = "https://api.ebay.com/identity/v1/oauth2/token"
     credentials = f"{client_id}:{client_secret}"
     encoded_credentials = base64.b64encode(credentials.encode()).decode()
     headers = {
@@ -224,47 +349,35 @@ def get_ebay_oauth_token():
         "Content-Type": "application/x-www-form-urlencoded"
     }
     data = {"grant_type": "client_credentials", "scope": "https://api.ebay.com/oauth/api_scope"}
-    response = request_with_retry("POST", url, headers=headers, data=data)
+    return headers, data
+
+def fetch_oauth_token():
+    """
+    Requests a new application token. Returns (token, expires_in seconds).
+    """
+    headers, data = oauth_request_args()
+    with STAGE_SECONDS.time(stage="token"):
+        response = request_with_retry("POST", OAUTH_TOKEN_URL, headers=headers, data=data)
+    if response is None:
+        raise Exception("Error retrieving token: no response from the OAuth endpoint")
     if response.status_code == 200:
-        token = response.json()["access_token"]
-        expires_in = int(response.json().get("expires_in", 7200))
-        TOKEN_CACHE["token"] = token
-        TOKEN_CACHE["expires_at"] = now + timedelta(seconds=expires_in)
-        if DEBUG:
-            print("Successfully retrieved OAuth token")
-        return token
+        payload = response.json()
+        log.info("Successfully retrieved OAuth token")
+        return payload["access_token"], int(payload.get("expires_in", 7200))
     else:
-        if DEBUG:
-            print(f"Error retrieving token: {response.status_code} {response.text}")
+        log.error("Error retrieving token: %s %s", response.status_code, response.text)
         raise Exception(f"Error retrieving token: {response.status_code} {response.text}")
 
-def format_time_ago(post_date_str):
-    try:
-        post_date = datetime.fromisoformat(post_date_str.replace("Z", "+00:00"))
-        now = datetime.now(timezone.utc)
-        diff = now - post_date
-        seconds = diff.total_seconds()
-        if seconds < 60:
-            return f"{int(seconds)} second(s) ago"
-        elif seconds < 3600:
-            minutes = int(seconds // 60)
-            return f"{minutes} minute(s) ago"
-        elif seconds < 86400:
-            hours = int(seconds // 3600)
-            return f"{hours} hour(s) ago"
-        else:
-            days = int(seconds // 86400)
-            return f"{days} day(s) ago"
-    except Exception as e:
-        if DEBUG:
-            print(f"Error formatting time ago: {e}")
-        return "N/A"
+# Token shared by the sync and async paths, refreshed ahead of expiry (see oauth_token.py)
+TOKEN_MANAGER = TokenManager(fetch_oauth_token)
+
+def get_ebay_oauth_token():
+    return TOKEN_MANAGER.get()
 
 def scrape_terapeak_recent_median(query, num_sales=5):
     encoded_query = requests.utils.quote(query)
     url = (
-        "https://www.ebay.com/sh/research"
-        f"?marketplace=EBAY-US&keywords={encoded_query}&dayRange=30"
+        f"{SELLER_HUB_RESEARCH_URL}?marketplace=EBAY-US&keywords={encoded_query}&dayRange=30"
         "&categoryId=164&limit=50&tabName=SOLD&tz=America%2FNew_York"
     )
     headers = {
@@ -274,62 +387,66 @@ def scrape_terapeak_recent_median(query, num_sales=5):
             "Chrome/90.0.4430.93 Safari/537.36"
         )
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        if DEBUG:
-            print(f"Scrape failed: HTTP {response.status_code}")
+    response = request_with_retry("GET", url, headers=headers, max_attempts=1)
+    if response is None or response.status_code != 200:
+        log.warning("Terapeak scrape for '%s' failed: HTTP %s", query, response.status_code if response is not None else None)
+        return None
+    return terapeak_recent_median(response.text, query, num_sales)
+
+def terapeak_recent_median(html, query, num_sales=5):
+    """
+    Median price of the num_sales most recent sold rows on a research page,
+    falling back to the page's aggregated metric-value.
+    """
+    page = parse_research_page(html)
+    median_price = recent_sales_median(page, query, num_sales)
+    if median_price is None:
+        return fallback_metric_value(page.metric_text)
+    return median_price
+
+def recent_sales_median(page, query, num_sales=5):
+    """
+    Median of the num_sales most recent rows of a parsed research page, or
+    None when the table has fewer than two usable rows.
+    """
+    if page.missing == "table":
+        log.debug("Could not locate the Terapeak table. Falling back to aggregated metric.")
+        return None
+    if page.missing == "tbody":
+        log.debug("No <tbody> found in Terapeak table. Falling back to aggregated metric.")
+        return None
+    if page.missing == "rows":
+        log.debug("No matching <tr> rows found. Falling back to aggregated metric.")
         return None
-    soup = BeautifulSoup(response.text, "html.parser")
-    table = soup.find("table", class_="terapeak-table content static-table table-content-default")
-    if not table:
-        if DEBUG:
-            print("Could not locate the Terapeak table. Falling back to aggregated metric.")
-        return fallback_metric_value(soup)
-    tbody = table.find("tbody")
-    if not tbody:
-        if DEBUG:
-            print("No <tbody> found in Terapeak table. Falling back to aggregated metric.")
-        return fallback_metric_value(soup)
-    rows = tbody.find_all("tr", class_="research-table-row_item research-table-row_item-subtitle")
-    if not rows:
-        if DEBUG:
-            print("No matching <tr> rows found. Falling back to aggregated metric.")
-        return fallback_metric_value(soup)
     listings = []
-    for row in rows:
-        cells = row.find_all("td")
+    for cells in page.rows:
         if len(cells) < 5:
             continue
-        price_str = cells[0].get_text(strip=True)
+        price_str = cells[0]
         price_str = price_str.split("/")[0].strip()
         price_str = price_str.replace("$", "").replace(",", "")
         try:
             price_val = float(price_str)
         except ValueError:
-            if DEBUG:
-                print(f"Skipping row with invalid price: {price_str}")
+            log.debug("Skipping row with invalid price: %s", price_str)
             continue
-        date_str = cells[4].get_text(strip=True)
+        date_str = cells[4]
         date_obj = parse_terapeak_date(date_str)
         if not date_obj:
-            if DEBUG:
-                print(f"Skipping row with unparseable date: {date_str}")
+            log.debug("Skipping row with unparseable date: %s", date_str)
             continue
         listings.append((date_obj, price_val))
     if not listings:
-        if DEBUG:
-            print("No valid listings after parsing. Falling back to aggregated metric.")
-        return fallback_metric_value(soup)
+        log.debug("No valid listings after parsing. Falling back to aggregated metric.")
+        return None
     listings.sort(key=lambda x: x[0], reverse=True)
     top_n = listings[:num_sales]
     prices = [p for (_, p) in top_n]
     if len(prices) < 2:
-        if DEBUG:
-            print("Not enough recent listings for a median. Falling back to aggregated metric.")
-        return fallback_metric_value(soup)
+        log.debug("Not enough recent listings for a median. Falling back to aggregated metric.")
+        return None
     median_price = statistics.median(prices)
-    if DEBUG:
-        print(f"Median of the {len(top_n)} most recent sales for '{query}': {median_price}")
+    log.debug("Median of the %d most recent sales for '%s': %s", len(top_n), query, median_price)
     return median_price
 
 def parse_terapeak_date(date_str):
@@ -339,53 +456,84 @@ def parse_terapeak_date(date_str):
     except ValueError:
         return None
 
-def fallback_metric_value(soup):
-    metric_div = soup.find("div", class_="metric-value")
-    if metric_div:
-        raw = metric_div.get_text(strip=True).replace("$", "").replace(",", "")
+def fallback_metric_value(metric_text):
+    if metric_text is not None:
+        raw = metric_text.replace("$", "").replace(",", "")
         try:
             val = float(raw)
-            if DEBUG:
-                print(f"Using fallback aggregated metric: {val}")
+            log.debug("Using fallback aggregated metric: %s", val)
             return val
         except ValueError:
-            if DEBUG:
-                print(f"Error parsing fallback metric-value: {raw}")
+            log.warning("Error parsing fallback metric-value: %s", raw)
             return None
     else:
-        if DEBUG:
-            print("No aggregated metric-value found.")
+        log.debug("No aggregated metric-value found.")
         return None
 
 def get_fair_market_value(cpu_model, condition="Used"):
-    query_for_scrape = re.sub(r'\s*\d+\.\d+\s*GHz', '', cpu_model, flags=re.IGNORECASE).strip()
-    if cpu_model in SCRAPED_PRICE_CACHE:
-        cached_value, cached_flag, cached_source = SCRAPED_PRICE_CACHE[cpu_model]
-        if DEBUG:
-            print(f"Using cached scraped price for {cpu_model}: {cached_value}")
+    fair_value = FAIR_VALUE_TABLE.lookup(cpu_model, condition)
+    if fair_value is not None:
+        return fair_value.pricing(stale=FAIR_VALUE_TABLE.is_stale(fair_value))
+    cache_key = SCRAPED_PRICE_CACHE.make_key(cpu_model, condition)
+    cached, stale = SCRAPED_PRICE_CACHE.lookup(cache_key)
+    if cached is not None:
+        cached_value, cached_flag, cached_source = cached
+        item_log.debug("Using cached scraped price for %s: %s%s", cpu_model, cached_value, " (stale)" if stale else "")
+        if stale:
+            # Serve the stale price now and refresh it off the request path.
+            revalidate_fair_market_value(cpu_model, condition, cache_key)
+            return cached_value, cached_flag, mark_stale(cached_source)
         return cached_value, cached_flag, cached_source
-    seller_hub_value = get_seller_hub_metric_value(query=query_for_scrape, headless=False)
-    if seller_hub_value is not None:
-        SCRAPED_PRICE_CACHE[cpu_model] = (seller_hub_value, False, "(Sold Listings)")
-        if DEBUG:
-            print(f"Using Playwright scraped value for {cpu_model}: {seller_hub_value}")
-        return seller_hub_value, False, "(Sold Listings)"
-    token = get_ebay_oauth_token()
-    url = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    return FAIR_VALUE_FLIGHTS.do(cache_key, _lookup_fair_market_value, cpu_model, condition, cache_key)
+
+def revalidate_fair_market_value(cpu_model, condition, cache_key):
+    """
+    Starts a background refresh of a stale SCRAPED_PRICE_CACHE entry unless
+    one is already running or recently failed. If the scrape fails the stale
+    entry is left in place and served until its hard TTL (stale-if-error).
+    """
+    if not REVALIDATIONS.claim(cache_key):
+        return False
+
+    def refresh():
+        refreshed = False
+        try:
+            FAIR_VALUE_FLIGHTS.do(cache_key, _lookup_fair_market_value, cpu_model, condition, cache_key)
+            refreshed = SCRAPED_PRICE_CACHE.get(cache_key) is not None
+        except Exception as e:
+            log.warning("Error refreshing stale price for %s: %s", cpu_model, e)
+        finally:
+            REVALIDATIONS.release(cache_key, refreshed)
+        if not refreshed:
+            log.info("Refresh of stale price for %s failed; serving the stale price", cpu_model)
+
+    REVALIDATE_EXECUTOR.submit(refresh)
+    return True
+
+def scrape_query_for_model(cpu_model):
+    # Seller Hub searches work best without the clock speed suffix.
+    return re.sub(r'\s*\d+\.\d+\s*GHz', '', cpu_model, flags=re.IGNORECASE).strip()
+
+# Browse API condition ids for listing conditions; anything else searches Used
+ACTIVE_CONDITION_IDS = {
+    "New": "1000",
+    "Open box": "1500",
+    "Used": "3000",
+    "For parts or not working": "7000"
+}
+
+def active_listing_query(cpu_model, condition):
+    """
+    Builds the Browse API search used when sold data is unavailable: the five
+    cheapest active listings for the short model name in the given condition.
+    """
     short_model = re.sub(
         r'^(amd\s+ryzen\s+|intel\s+core\s+|amd\s+|intel\s+pentium\s+|intel\s+celeron\s+)',
         '',
         cpu_model,
         flags=re.IGNORECASE
     ).strip()
-    condition_map = {
-        "New": "1000",
-        "Open box": "1500",
-        "Used": "3000",
-        "For parts or not working": "7000"
-    }
-    condition_id = condition_map.get(condition, "3000")
+    condition_id = ACTIVE_CONDITION_IDS.get(condition, "3000")
     params = {
         "q": short_model,
         "category_ids": "164",
@@ -393,223 +541,379 @@ def get_fair_market_value(cpu_model, condition="Used"):
         "limit": "5",
         "sort": "price"
     }
+    return short_model, params
+
+def active_listing_prices(data):
+    items = data.get("itemSummaries", [])
+    return [float(it["price"]["value"]) for it in items if "price" in it and float(it["price"]["value"]) > 0]
+
+def summarize_active_prices(cpu_model, condition, data):
+    prices = active_listing_prices(data)
+    log.debug("Active listing prices for '%s' (condition: %s): %s", cpu_model, condition, prices)
+    if prices:
+        fair_value = statistics.median(prices)
+        low_sales_flag = len(prices) < LOW_SALES_SAMPLES
+        log.debug("Median fair market value for '%s' (condition: %s): $%.2f%s", cpu_model, condition, fair_value, " (low sales data)" if low_sales_flag else "")
+        return fair_value, low_sales_flag, "(Active Listings)"
+    else:
+        log.debug("No active listing data for '%s' (condition: %s)", cpu_model, condition)
+        return None, False, None
+
+def _lookup_fair_market_value(cpu_model, condition, cache_key):
+    # Another flight for this key may have filled the cache while we were waiting to start.
+    cached = SCRAPED_PRICE_CACHE.get(cache_key)
+    if cached is not None:
+        return tuple(cached)
+    query_for_scrape = scrape_query_for_model(cpu_model)
+    seller_hub_value = get_seller_hub_metric_value(query=query_for_scrape, headless=False)
+    if seller_hub_value is not None:
+        SCRAPED_PRICE_CACHE.set(cache_key, (seller_hub_value, False, "(Sold Listings)"))
+        log.debug("Using Playwright scraped value for %s: %s", cpu_model, seller_hub_value)
+        return seller_hub_value, False, "(Sold Listings)"
+    return get_active_listing_value(cpu_model, condition)
+
+def active_price_key(cpu_model, condition):
+    short_model, _ = active_listing_query(cpu_model, condition)
+    return ACTIVE_PRICE_CACHE.make_key(short_model, ACTIVE_CONDITION_IDS.get(condition, "3000"))
+
+def get_active_listing_value(cpu_model, condition):
+    """
+    Median of the cheapest active listings, cached in ACTIVE_PRICE_CACHE for
+    ACTIVE_PRICE_CACHE_TTL so repeated fallbacks for a model share one search.
+    Failed searches are not cached.
+    """
+    cache_key = active_price_key(cpu_model, condition)
+    cached = ACTIVE_PRICE_CACHE.get(cache_key)
+    if cached is not None:
+        return tuple(cached)
+    return ACTIVE_PRICE_FLIGHTS.do(cache_key, _fetch_active_listing_value, cpu_model, condition, cache_key)
+
+def _fetch_active_listing_value(cpu_model, condition, cache_key):
     try:
-        response = request_with_retry("GET", url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            items = data.get("itemSummaries", [])
-            prices = [float(it["price"]["value"]) for it in items if "price" in it and float(it["price"]["value"]) > 0]
-            if DEBUG:
-                print(f"Active listing prices for '{cpu_model}' (condition: {condition}): {prices}")
-            if prices:
-                fair_value = statistics.median(prices)
-                low_sales_flag = len(prices) < 5
-                if DEBUG:
-                    print(f"Median fair market value for '{cpu_model}' (condition: {condition}): ${fair_value:.2f}{' (low sales data)' if low_sales_flag else ''}")
-                    print("-------")
-                return fair_value, low_sales_flag, "(Active Listings)"
-            else:
-                if DEBUG:
-                    print(f"No active listing data for '{cpu_model}' (condition: {condition})")
-                return None, False, None
-        else:
-            if DEBUG:
-                print(f"Error fetching listings for '{short_model}': {response.status_code} {response.text}")
-            return None, False, None
+        data = fetch_active_listings(cpu_model, condition)
     except Exception as e:
-        if DEBUG:
-            print(f"Exception fetching prices for '{short_model}': {e}")
+        log.warning("Exception fetching prices for '%s': %s", cpu_model, e)
+        return None, False, None
+    if data is None:
         return None, False, None
+    result = summarize_active_prices(cpu_model, condition, data)
+    ACTIVE_PRICE_CACHE.set(cache_key, result)
+    return result
 
-def process_listing(item, cache_expiry, now):
-    creation_date_str = item.get("itemCreationDate", "")
-    if creation_date_str:
-        try:
-            creation_date = datetime.fromisoformat(creation_date_str.replace("Z", "+00:00"))
-            if (now - creation_date).total_seconds() > cache_expiry:
-                return None
-            post_date = format_time_ago(creation_date_str)
-        except Exception:
-            post_date = "N/A"
-    else:
-        post_date = "N/A"
-    price_info = item.get("price", {})
-    try:
-        price = float(price_info.get("value", 0))
-    except (ValueError, TypeError):
-        price = 0.0
-    listing_data = {
-        "title": item.get("title", ""),
-        "price": price,
-        "shipping_cost": 0.00,
-        "tax_estimate": 0.00,
-        "net_profit": None,
-        "condition": item.get("condition", "Not Specified"),
-        "category": item.get("categoryPath", "Misc"),
-        "listing_url": item.get("itemWebUrl", ""),
-        "post_date": post_date,
-        "cpu_model": None,
-        "estimated_sale_price": None,
-        "estimated_sale_source": None,
-        "itemCreationDate": creation_date_str
-    }
-    if "cpu" in listing_data["category"].lower() or "processor" in listing_data["title"].lower():
-        lot_match = re.search(r'(?i)^lot\s+of\s+(\d+)', listing_data["title"])
+def fetch_active_listings(cpu_model, condition):
+    """
+    Runs the active_listing_query search and returns the Browse payload, or
+    None on an error response.
+    """
+    token = get_ebay_oauth_token()
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    short_model, params = active_listing_query(cpu_model, condition)
+    with STAGE_SECONDS.time(stage="browse_fallback"):
+        response = request_with_retry("GET", BROWSE_SEARCH_URL, headers=headers, params=params)
+    if response is None or response.status_code != 200:
+        log.warning("Error fetching listings for '%s': %s %s", short_model, response.status_code if response is not None else None, response.text if response is not None else "")
+        return None
+    return response.json()
+
+def compute_fair_value(cpu_model, condition="Used"):
+    """
+    Prices a model from a fresh Seller Hub scrape and a fresh active-listing
+    search, for the fair-value warmer. Also refreshes the lazy path's caches
+    so it agrees with the table: a sold value goes to SCRAPED_PRICE_CACHE,
+    the active median only to ACTIVE_PRICE_CACHE with its shorter TTL.
+    """
+    sold_value = get_seller_hub_metric_value(query=scrape_query_for_model(cpu_model), headless=False, refresh=True)
+    data = fetch_active_listings(cpu_model, condition)
+    prices = active_listing_prices(data) if data is not None else []
+    if data is not None:
+        ACTIVE_PRICE_CACHE.set(active_price_key(cpu_model, condition), summarize_active_prices(cpu_model, condition, data))
+    fair_value = FairValue(sold_value, statistics.median(prices) if prices else None, len(prices), time.time())
+    if sold_value is not None:
+        SCRAPED_PRICE_CACHE.set(SCRAPED_PRICE_CACHE.make_key(cpu_model, condition), fair_value.pricing())
+    return fair_value
+
+def prepare_listing(item, cache_expiry, now):
+    """
+    Builds the Listing for a Browse item and extracts its CPU model.
+    Returns (listing, lot_multiplier), or None when the item is too old
+    or is not a recognizable consumer CPU.
+    """
+    listing = Listing.from_item(item)
+    if listing.created_at and now.timestamp() - listing.created_at > cache_expiry:
+        return None
+    if "cpu" in listing.category.lower() or "processor" in listing.title.lower():
+        lot_match = re.search(r'(?i)^lot\s+of\s+(\d+)', listing.title)
         multiplier = int(lot_match.group(1)) if lot_match else 1
-        extracted_model = extract_cpu_model(listing_data["title"])
+        with STAGE_SECONDS.time(stage="extract"):
+            extracted_model = extract_cpu_model(listing.title)
         if extracted_model:
-            listing_data["cpu_model"] = extracted_model
-            cpu_value, low_sales_flag, pricing_source = get_fair_market_value(extracted_model, condition=listing_data["condition"])
-            if cpu_value is not None:
-                final_value = cpu_value * multiplier
-                price_str = f"{final_value:.2f}"
-                if low_sales_flag:
-                    price_str += " (low sales data)"
-                listing_data["estimated_sale_price"] = price_str
-                listing_data["estimated_sale_source"] = pricing_source
-                listing_data["net_profit"] = round(final_value - (listing_data["price"] + listing_data["shipping_cost"]), 2)
-                if listing_data["net_profit"] < 10:
-                    listing_data["deal_type"] = "fair"
-                elif listing_data["net_profit"] < 30:
-                    listing_data["deal_type"] = "good"
-                else:
-                    listing_data["deal_type"] = "great"
-                return listing_data
+            listing.cpu_model = extracted_model
+            return listing, multiplier
     return None
 
-def get_ebay_listings(keyword="computer parts", limit=20, cache_expiry=14400):
-    start_time = time.perf_counter()
-    now = datetime.now(timezone.utc)
+def classify_listing(listing, multiplier, cpu_value, low_sales_flag, pricing_source):
+    """
+    Fills in the estimated sale price, net profit and deal type for a prepared
+    listing. Returns None when no fair value could be found.
+    """
+    if cpu_value is None:
+        return None
+    final_value = cpu_value * multiplier
+    listing.estimated_sale_price = final_value
+    listing.low_sales_data = bool(low_sales_flag)
+    listing.estimated_sale_source = pricing_source
+    listing.net_profit = round(final_value - (listing.price + listing.shipping_cost), 2)
+    listing.deal_type = DealType.for_profit(listing.net_profit)
+    return listing
+
+def process_listing(item, cache_expiry, now):
+    prepared = prepare_listing(item, cache_expiry, now)
+    if prepared is None:
+        return None
+    return price_prepared_listing(*prepared)
+
+def price_prepared_listing(listing, multiplier):
+    cpu_value, low_sales_flag, pricing_source = get_fair_market_value(listing.cpu_model, condition=listing.condition)
+    with STAGE_SECONDS.time(stage="classify"):
+        return classify_listing(listing, multiplier, cpu_value, low_sales_flag, pricing_source)
+
+def cached_fair_market_value(cpu_model, condition="Used"):
+    """
+    The fresh price get_fair_market_value would return from the shared price
+    caches alone, or None when pricing the model needs a scrape or a search.
+    Never does network I/O.
+    """
+    cached = SCRAPED_PRICE_CACHE.get(SCRAPED_PRICE_CACHE.make_key(cpu_model, condition))
+    if cached is not None:
+        return tuple(cached)
+    if SCRAPE_FAILURE_CACHE.backing_off(SOLD_DATA_CACHE.make_key(scrape_query_for_model(cpu_model))):
+        cached = ACTIVE_PRICE_CACHE.get(active_price_key(cpu_model, condition))
+        if cached is not None:
+            return tuple(cached)
+    return None
+
+def browse_search_params(keyword="", page_size=50, offset=0, since=None):
+    params = {"category_ids": "164", "limit": page_size, "sort": "newlyListed"}
+    if keyword:
+        params["q"] = keyword
+    if since:
+        # Only listings that started at or after `since` (an ISO 8601 UTC timestamp)
+        params["filter"] = f"itemStartDate:[{since}..]"
+    if offset:
+        params["offset"] = offset
+    return params
+
+def plan_browse_pages(limit):
+    """
+    Splits a listing budget into (page_size, max_pages) for the Browse API,
+    which returns at most BROWSE_PAGE_SIZE items per page.
+    """
+    page_size = max(1, min(limit, BROWSE_PAGE_SIZE))
+    max_pages = min(BROWSE_MAX_PAGES, math.ceil(limit / page_size))
+    return page_size, max_pages
+
+def is_cancelled(cancel):
+    return cancel is not None and cancel.is_set()
+
+def iter_browse_pages(keyword="", limit=50, concurrency=BROWSE_PAGE_CONCURRENCY, since=None, raw=False, cancel=None):
+    """
+    Generator over Browse API search result pages, newest listings first.
+    The first page tells us the total, so the remaining offsets (up to the
+    configured depth) are fetched concurrently and yielded as each arrives.
+    When the total is missing we follow the page's `next` link instead.
+    With raw=True pages are yielded as undecoded response bytes. Once the
+    `cancel` event is set no further pages are requested.
+    """
+    page_size, max_pages = plan_browse_pages(limit)
     token = get_ebay_oauth_token()
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    params = {"category_ids": "164", "limit": limit, "sort": "newlyListed"}
-    url = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-    response = request_with_retry("GET", url, headers=headers, params=params)
-    listings = []
-    if response.status_code == 200:
-        data = response.json()
-        items = data.get("itemSummaries", [])
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            results = list(executor.map(lambda item: process_listing(item, cache_expiry, now), items))
-        listings = [r for r in results if r is not None]
-    else:
-        if DEBUG:
-            print(f"Error from Browse API: {response.status_code} {response.text}")
+
+    def fetch(url, params=None):
+        if is_cancelled(cancel):
+            return None
+        with STAGE_SECONDS.time(stage="browse_search"):
+            response = request_with_retry("GET", url, headers=headers, params=params)
+        if response is None or response.status_code != 200:
+            if response is not None:
+                log.error("Error from Browse API: %s %s", response.status_code, response.text)
+            else:
+                log.error("No response from Browse API for %s", url)
+            return None
+        return response.content if raw else response.json()
+
+    first_page = fetch(BROWSE_SEARCH_URL, browse_search_params(keyword, page_size, since=since))
+    if first_page is None:
+        return
+    yield first_page
+    if raw:
+        first_page = json.loads(first_page)
+    total = first_page.get("total")
+    if total is not None:
+        last_offset = min(int(total), page_size * max_pages)
+        offsets = list(range(page_size, last_offset, page_size))
+        if not offsets:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(offsets)))) as executor:
+            futures = [executor.submit(fetch, BROWSE_SEARCH_URL, browse_search_params(keyword, page_size, offset, since)) for offset in offsets]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    if is_cancelled(cancel):
+                        return
+                    page = future.result()
+                    if page is not None:
+                        yield page
+            finally:
+                # The consumer may stop early; don't fetch pages nobody will read.
+                for future in futures:
+                    future.cancel()
+        return
+    next_url = first_page.get("next")
+    pages_fetched = 1
+    while next_url and pages_fetched < max_pages and not is_cancelled(cancel):
+        page = fetch(next_url)
+        if page is None:
+            return
+        yield page
+        pages_fetched += 1
+        next_url = (json.loads(page) if raw else page).get("next")
+
+def page_items(page, limit):
+    # Pages arrive out of order, so trim by each item's absolute position rather
+    # than by how many were already seen; otherwise a page that arrives late
+    # loses its (newer) listings to an older page.
+    offset = int(page.get("offset") or 0)
+    return page.get("itemSummaries", [])[:max(0, limit - offset)]
+
+def iter_browse_items(keyword="", limit=50, concurrency=BROWSE_PAGE_CONCURRENCY, since=None, cancel=None):
+    count = 0
+    for page in iter_browse_pages(keyword=keyword, limit=limit, concurrency=concurrency, since=since, cancel=cancel):
+        for item in page_items(page, limit):
+            if count >= limit:
+                return
+            yield item
+            count += 1
+
+def get_ebay_listings(keyword="", limit=20, cache_expiry=14400):
+    start_time = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    items = list(iter_browse_items(keyword=keyword, limit=limit))
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        results = list(executor.map(lambda item: process_listing(item, cache_expiry, now), items))
+    listings = [r for r in results if r is not None]
     elapsed = time.perf_counter() - start_time
-    if DEBUG:
-        print(f"get_ebay_listings completed in {elapsed:.2f} seconds")
-    sort_order = {"great": 0, "good": 1, "fair": 2}
-    return sorted(listings, key=lambda l: sort_order.get(l.get("deal_type", "fair"), 2))
+    PIPELINE_SECONDS.observe(elapsed, entry_point="sync")
+    log.info("get_ebay_listings completed in %.2f seconds", elapsed)
+    return sorted(listings, key=lambda listing: listing.deal_type)
 
-def get_ebay_listings_stream(keyword="computer parts", limit=50, cache_expiry=14400):
+def get_ebay_listings_stream(keyword="", limit=50, cache_expiry=14400, cancel=None):
     """
-    Generator that fetches listings from the eBay Browse API and processes each one concurrently.
-    It uses a ThreadPoolExecutor with increased max_workers to speed up processing and yields
-    each processed deal as soon as it's ready.
+    Generator that pages through the eBay Browse API and processes each listing concurrently.
+    Items are handed to a ThreadPoolExecutor as soon as their page arrives, and each processed
+    deal is yielded as soon as it's ready. Setting the `cancel` event stops the scan once the
+    listings already being priced finish, even if none of them turns out to be a deal.
     """
     start_time = time.perf_counter()
     now = datetime.now(timezone.utc)
-    token = get_ebay_oauth_token()
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    params = {"category_ids": "164", "limit": limit, "sort": "newlyListed"}
-    url = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-    
-    response = request_with_retry("GET", url, headers=headers, params=params)
-    if response and response.status_code == 200:
-        data = response.json()
-        items = data.get("itemSummaries", [])
-        # Increase max_workers to speed up processing.
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            future_to_item = {
-                executor.submit(process_listing, item, cache_expiry, now): item 
-                for item in items
-            }
-            for future in concurrent.futures.as_completed(future_to_item):
+    # Increase max_workers to speed up processing.
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=20)
+
+    def price(item):
+        # Queued listings are skipped once the scan is cancelled.
+        if is_cancelled(cancel):
+            return None
+        return process_listing(item, cache_expiry, now)
+
+    try:
+        pending = set()
+        for item in iter_browse_items(keyword=keyword, limit=limit, cancel=cancel):
+            if is_cancelled(cancel):
+                return
+            pending.add(executor.submit(price, item))
+            done = {future for future in pending if future.done()}
+            pending -= done
+            for future in done:
                 result = future.result()
                 if result is not None:
                     yield result
-    else:
-        print(f"Error from Browse API: {response.status_code} {response.text}" if response else "No response")
-    
+        for future in concurrent.futures.as_completed(pending):
+            if is_cancelled(cancel):
+                return
+            result = future.result()
+            if result is not None:
+                yield result
+    finally:
+        # If the caller stops early (the generator is closed), drop the queued
+        # listings instead of waiting for them to be priced.
+        executor.shutdown(wait=False, cancel_futures=True)
+
     elapsed = time.perf_counter() - start_time
-    print(f"get_ebay_listings_stream completed in {elapsed:.2f} seconds")
+    PIPELINE_SECONDS.observe(elapsed, entry_point="stream")
+    log.info("get_ebay_listings_stream completed in %.2f seconds", elapsed)
 
 async def async_request_with_retry(method, url, headers=None, params=None, data=None, max_attempts=3, delay=3):
     """
-    Async version of request_with_retry using aiohttp.
+    Async version of request_with_retry using the running loop's pooled aiohttp
+    session and the same per-endpoint limiters. Returns (None, None) when no
+    usable response arrived or the endpoint's circuit is open.
     """
     attempt = 0
+    current_delay = delay
+    session = get_async_session()
+    limiter = limiter_for_url(url)
     while attempt < max_attempts:
         try:
-            async with aiohttp.ClientSession() as session:
-                if method.upper() == "GET":
-                    async with session.get(url, headers=headers, params=params) as response:
-                        if response.status == 503:
-                            await asyncio.sleep(delay * (2 ** attempt))
-                            attempt += 1
-                            continue
-                        result = await response.json()
-                        return result, response.status
-                else:
-                    async with session.request(method, url, headers=headers, params=params, data=data) as response:
-                        if response.status == 503:
-                            await asyncio.sleep(delay * (2 ** attempt))
-                            attempt += 1
-                            continue
-                        result = await response.json()
-                        return result, response.status
+            await limiter.acquire_async()
+        except CircuitOpenError as e:
+            log.warning("%s; not requesting %s", e, url)
+            return None, None
+        try:
+            async with session.request(method, url, headers=headers, params=params, data=data) as response:
+                if response.status in THROTTLE_STATUSES:
+                    if response.status == 503:
+                        UPSTREAM_503.inc()
+                    UPSTREAM_RETRIES.inc(reason=str(response.status))
+                    retry_after = parse_retry_after(response.headers.get("Retry-After")) or current_delay
+                    limiter.record(response.status, retry_after=retry_after)
+                    attempt += 1
+                    current_delay *= 2
+                    continue
+                result = await response.json()
+                limiter.record(response.status)
+                return result, response.status
         except Exception as e:
-            if DEBUG:
-                print(f"Async request attempt {attempt+1} error: {e}")
-            await asyncio.sleep(delay * (2 ** attempt))
+            limiter.record(error=True)
+            UPSTREAM_RETRIES.inc(reason="error")
+            log.info("Async request attempt %d for %s failed: %s", attempt + 1, url, e)
             attempt += 1
+            if attempt < max_attempts:
+                await asyncio.sleep(current_delay)
+                current_delay *= 2
     return None, None
 
-async def async_get_ebay_listings(keyword="computer parts", limit=20, cache_expiry=14400):
-    """
-    Asynchronously fetch listings from the eBay Browse API and process them concurrently,
-    limiting to three tasks at a time.
-    """
-    token = get_ebay_oauth_token()  # Use your existing synchronous OAuth token (cached)
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    params = {"category_ids": "164", "limit": limit, "sort": "newlyListed"}
-    url = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-    
-    json_response, status = await async_request_with_retry("GET", url, headers=headers, params=params)
-    listings = []
-    if status == 200 and json_response:
-        items = json_response.get("itemSummaries", [])
-        semaphore = asyncio.Semaphore(3)
-        loop = asyncio.get_running_loop()
-        async def process_item(item):
-            async with semaphore:
-                # run process_listing (a synchronous function) in the default executor
-                result = await loop.run_in_executor(None, process_listing, item, cache_expiry, datetime.now(timezone.utc))
-                return result
-        tasks = [asyncio.create_task(process_item(item)) for item in items]
-        results = await asyncio.gather(*tasks)
-        listings = [r for r in results if r is not None]
-    else:
-        if DEBUG:
-            print(f"Error fetching listings: status {status}")
-    return listings
-
-if __name__ == '__main__':
+def main():
+    queries_to_scrape = [
+        "Intel Core i5-7500T 2.7GHz",
+        "AMD Ryzen 5 3600",
+        "Intel Core i7-8700K"
+    ]
+    from async_pricing import scrape_sold_data_batch, shutdown_pricing_loop
     try:
-        queries_to_scrape = [
-            "Intel Core i5-7500T 2.7GHz",
-            "AMD Ryzen 5 3600",
-            "Intel Core i7-8700K"
-        ]
-        from concurrent.futures import ThreadPoolExecutor
-        with ThreadPoolExecutor() as executor:
-            metrics = {query: executor.submit(get_seller_hub_metric_value, query, False).result() for query in queries_to_scrape}
-        print("Scraped Seller Hub metric values:")
-        for query, value in metrics.items():
-            print(f"  {query} => {value}")
-        listings = get_ebay_listings(keyword="computer parts", limit=20)
+        # One browser context, one tab per model (up to BATCH_SCRAPE_CONCURRENCY at once).
+        sold_data = scrape_sold_data_batch(queries_to_scrape, headless=False)
+        print("Scraped Seller Hub sold data:")
+        for query, data in sold_data.items():
+            print(f"  {query} => median of recent sales {data['median']}, average sold price {data['metric']}")
+        listings = get_ebay_listings(limit=20)
         for listing in listings:
             print(listing)
-    except Exception as e:
-        if DEBUG:
-            print(f"Error: {e}")
+    except Exception:
+        log.exception("Error")
+    finally:
+        shutdown_pricing_loop()
+
+if __name__ == '__main__':
+    from log_config import configure_logging
+    configure_logging()
+    # Run through the importable module so async_pricing shares its caches with us.
+    import ebay_api
+    ebay_api.main()
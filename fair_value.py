@@ -0,0 +1,297 @@
+"""
+Precomputed fair values for every CPU model seen recently.
+
+get_fair_market_value first looks the model up in a FairValueTable, which is a
+dict read with no I/O. A FairValueWarmer thread keeps the table filled: it
+re-prices models in popularity order before their entries expire, so listings
+for known models never wait on a Seller Hub scrape. Sightings and entries are
+written to the price cache's SQLite file, so a restarted worker knows which
+models to warm first.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+import concurrent.futures
+from collections import namedtuple
+
+from price_cache import CACHE_DB_PATH, PRICE_CACHE_TTL, normalize_model, mark_stale
+from metrics import CACHE_LOOKUPS, FAIR_VALUE_REFRESHES
+
+log = logging.getLogger(__name__)
+
+# Models not seen for this many days are dropped from the table
+FAIR_VALUE_WINDOW_DAYS = float(os.getenv("FAIR_VALUE_WINDOW_DAYS", "7"))
+
+# Seconds an entry is fresh, and how long before that the warmer re-prices it
+FAIR_VALUE_TTL = int(os.getenv("FAIR_VALUE_TTL", str(PRICE_CACHE_TTL)))
+FAIR_VALUE_REFRESH_AHEAD = int(os.getenv("FAIR_VALUE_REFRESH_AHEAD", "1800"))
+
+# Seconds before a model that could not be priced is tried again
+FAIR_VALUE_RETRY_SECONDS = 300
+
+# Seconds between warmer passes when no new model has been seen, and models priced at once
+FAIR_VALUE_WARM_INTERVAL = float(os.getenv("FAIR_VALUE_WARM_INTERVAL", "60"))
+FAIR_VALUE_WARM_WORKERS = int(os.getenv("FAIR_VALUE_WARM_WORKERS", "4"))
+
+# Fewer active listings than this marks an active-listing price as low sales data
+LOW_SALES_SAMPLES = 5
+
+
+class FairValue(namedtuple("FairValue", ["sold_value", "active_median", "sample_count", "refreshed_at"])):
+    """
+    One model's prices: the Seller Hub sold value, the median of the cheapest
+    active listings and how many there were, and when they were fetched.
+    """
+    __slots__ = ()
+
+    def pricing(self, stale=False):
+        # (value, low_sales_flag, source), as returned by get_fair_market_value
+        if self.sold_value is not None:
+            value, low_sales_flag, source = self.sold_value, False, "(Sold Listings)"
+        elif self.active_median is not None:
+            value, low_sales_flag, source = self.active_median, self.sample_count < LOW_SALES_SAMPLES, "(Active Listings)"
+        else:
+            return None, False, None
+        return value, low_sales_flag, mark_stale(source) if stale else source
+
+
+class FairValueTable:
+    """
+    (normalized model, condition) -> FairValue, plus how often and how
+    recently each model was looked up. Lookups never block on I/O.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, ttl=FAIR_VALUE_TTL, refresh_ahead=FAIR_VALUE_REFRESH_AHEAD, window_days=FAIR_VALUE_WINDOW_DAYS):
+        self.path = path
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl)
+        # Entries older than this are not served at all (the warmer has fallen behind)
+        self.max_age = 2 * ttl
+        self.window = window_days * 86400
+        self.new_models = threading.Event()  # set when a model is looked up for the first time
+        self._entries = {}  # key -> FairValue
+        self._seen = {}  # key -> [lookup count, last lookup time]
+        self._dirty = set()  # keys whose sightings are not yet written to SQLite
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fair_values ("
+            " model TEXT NOT NULL,"
+            " condition TEXT NOT NULL,"
+            " sold_value REAL,"
+            " active_median REAL,"
+            " sample_count INTEGER,"
+            " refreshed_at REAL,"
+            " seen_count INTEGER NOT NULL,"
+            " last_seen REAL NOT NULL,"
+            " PRIMARY KEY (model, condition))"
+        )
+        self._conn.commit()
+        self.load()
+
+    @staticmethod
+    def make_key(model, condition="Any"):
+        return (normalize_model(model), condition or "Any")
+
+    def load(self):
+        """
+        Reads the models seen within the window back from SQLite.
+        """
+        cutoff = time.time() - self.window
+        with self._lock:
+            self._conn.execute("DELETE FROM fair_values WHERE last_seen < ?", (cutoff,))
+            rows = self._conn.execute(
+                "SELECT model, condition, sold_value, active_median, sample_count, refreshed_at, seen_count, last_seen FROM fair_values"
+            ).fetchall()
+            self._conn.commit()
+            self._entries.clear()
+            self._seen.clear()
+            for model, condition, sold_value, active_median, sample_count, refreshed_at, seen_count, last_seen in rows:
+                key = (model, condition)
+                self._seen[key] = [seen_count, last_seen]
+                if refreshed_at is not None:
+                    self._entries[key] = FairValue(sold_value, active_median, sample_count or 0, refreshed_at)
+        log.info("Loaded %d recently seen models (%d priced) from %s", len(self._seen), len(self._entries), self.path)
+
+    def lookup(self, model, condition="Any"):
+        """
+        Records a sighting of the model and returns its FairValue, or None if
+        it has not been priced yet, the warmer could not price it, or its
+        entry is too old to serve. Callers fall back to the price caches then.
+        """
+        key = self.make_key(model, condition)
+        now = time.time()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is None:
+                self._seen[key] = [1, now]
+                self.new_models.set()
+            else:
+                seen[0] += 1
+                seen[1] = now
+            self._dirty.add(key)
+            entry = self._entries.get(key)
+        if entry is None or entry.pricing()[0] is None:
+            CACHE_LOOKUPS.inc(cache="fair_value", result="miss")
+            return None
+        if now - entry.refreshed_at > self.max_age:
+            CACHE_LOOKUPS.inc(cache="fair_value", result="expired")
+            return None
+        CACHE_LOOKUPS.inc(cache="fair_value", result="hit")
+        return entry
+
+    def is_stale(self, entry, now=None):
+        # Past its TTL but still served: the warmer is behind on this model.
+        return (time.time() if now is None else now) - entry.refreshed_at >= self.ttl
+
+    def store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            seen_count, last_seen = self._seen.setdefault(key, [0, entry.refreshed_at])
+            self._dirty.discard(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fair_values VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (entry.sold_value, entry.active_median, entry.sample_count, entry.refreshed_at, seen_count, last_seen)
+            )
+            self._conn.commit()
+
+    def due(self, now=None):
+        """
+        Keys to re-price now, most looked-up first: models never priced, ones
+        within refresh_ahead of expiry, and unpriced ones due for a retry.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due = []
+            for key, (seen_count, last_seen) in self._seen.items():
+                if now - last_seen > self.window:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None:
+                    age = now - entry.refreshed_at
+                    if entry.pricing()[0] is None:
+                        if age < FAIR_VALUE_RETRY_SECONDS:
+                            continue
+                    elif age < self.ttl - self.refresh_ahead:
+                        continue
+                due.append((seen_count, key))
+        due.sort(key=lambda pair: pair[0], reverse=True)
+        return [key for _, key in due]
+
+    def prune(self, now=None):
+        """
+        Forgets models not seen within the window. Returns how many were dropped.
+        """
+        cutoff = (time.time() if now is None else now) - self.window
+        with self._lock:
+            stale = [key for key, (_, last_seen) in self._seen.items() if last_seen < cutoff]
+            for key in stale:
+                self._seen.pop(key, None)
+                self._entries.pop(key, None)
+                self._dirty.discard(key)
+            self._conn.execute("DELETE FROM fair_values WHERE last_seen < ?", (cutoff,))
+            self._conn.commit()
+        return len(stale)
+
+    def flush(self):
+        # Lookups only update memory; write the sighting counts back in one batch.
+        with self._lock:
+            rows = [key + tuple(self._seen[key]) for key in self._dirty if key in self._seen]
+            self._dirty.clear()
+            self._conn.executemany(
+                "INSERT INTO fair_values (model, condition, seen_count, last_seen) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (model, condition) DO UPDATE SET seen_count = excluded.seen_count, last_seen = excluded.last_seen",
+                rows
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self._dirty.clear()
+            self._conn.execute("DELETE FROM fair_values")
+            self._conn.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FairValueWarmer:
+    """
+    Background thread that re-prices the table's due models with
+    compute(model, condition) -> FairValue. A pass runs every `interval`
+    seconds, or as soon as a lookup sees a model for the first time.
+    """
+
+    def __init__(self, table, compute, interval=FAIR_VALUE_WARM_INTERVAL, max_workers=FAIR_VALUE_WARM_WORKERS):
+        self.table = table
+        self.compute = compute
+        self.interval = interval
+        self.max_workers = max_workers
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self, key):
+        model, condition = key
+        try:
+            entry = self.compute(model, condition)
+        except Exception as e:
+            FAIR_VALUE_REFRESHES.inc(result="error")
+            log.warning("Error refreshing fair value for '%s' (%s): %s", model, condition, e)
+            return False
+        self.table.store(key, entry)
+        FAIR_VALUE_REFRESHES.inc(result="priced" if entry.pricing()[0] is not None else "unpriced")
+        return True
+
+    def warm_once(self):
+        """
+        Re-prices every due model, most popular first. Returns how many were refreshed.
+        """
+        self.table.prune()
+        keys = self.table.due()
+        refreshed = 0
+        if keys:
+            # Workers pick keys up in submission order, so popular models are priced first.
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fair-value") as executor:
+                refreshed = sum(executor.map(self.refresh, keys))
+            log.info("Refreshed %d of %d due fair values", refreshed, len(keys))
+        self.table.flush()
+        return refreshed
+
+    def run(self):
+        while not self._stop.is_set():
+            self.table.new_models.clear()
+            try:
+                self.warm_once()
+            except Exception as e:
+                log.exception("Error warming fair values: %s", e)
+            self.table.new_models.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="fair-value-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self.table.new_models.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
@@ -0,0 +1,102 @@
+import os
+import asyncio
+import logging
+import threading
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+# Distinct hosts the sync pool keeps connections for
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+
+# Maximum open connections per host, shared by all worker threads
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+
+# Timeouts in seconds; requests used to wait forever on a stalled socket
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+
+# Seconds an idle keep-alive connection is held open by the async pool
+HTTP_KEEPALIVE_TIMEOUT = 30
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# aiohttp sessions are bound to the event loop that created them
+_ASYNC_SESSIONS = {}
+
+
+def get_session():
+    """
+    Returns the shared requests.Session. Connections to api.ebay.com are kept
+    alive between calls so small Browse/OAuth requests skip the TCP+TLS handshake.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+                pool_block=True,
+                max_retries=0
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSION = session
+        return _SESSION
+
+
+def default_timeout():
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+def get_async_session():
+    """
+    Returns the aiohttp session for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    session = _ASYNC_SESSIONS.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_CONNECTIONS * HTTP_POOL_MAXSIZE,
+            limit_per_host=HTTP_POOL_MAXSIZE,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+        )
+        timeout = aiohttp.ClientTimeout(connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+        session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _ASYNC_SESSIONS[loop] = session
+    return session
+
+
+async def close_async_session():
+    """
+    Closes the running loop's session. Call this before a short-lived loop
+    (such as the one Flask creates for an async view) is torn down.
+    """
+    session = _ASYNC_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def close_sessions():
+    global _SESSION
+    with _SESSION_LOCK:
+        session = _SESSION
+        _SESSION = None
+    if session is not None:
+        session.close()
+    # Sessions left behind by loops that are already gone cannot be awaited
+    # any more; dropping them releases their sockets with the loop.
+    for loop, async_session in list(_ASYNC_SESSIONS.items()):
+        if loop.is_closed():
+            _ASYNC_SESSIONS.pop(loop, None)
+        elif not async_session.closed and not loop.is_running():
+            try:
+                loop.run_until_complete(async_session.close())
+            except Exception as e:
+                log.debug("Error closing async HTTP session (ignored): %s", e)
+            _ASYNC_SESSIONS.pop(loop, None)
@@ -0,0 +1,136 @@
+"""
+Listing record passed through the pricing pipeline and kept in DealStore.
+
+Fields are numeric where the UI sorts on them: the estimated sale price is a
+float with a separate low_sales_data flag, the deal type is an IntEnum whose
+value is its sort rank, and the creation time is epoch seconds. to_dict()
+renders the JSON shape the endpoints have always returned, and is only
+called at the HTTP edge.
+"""
+import sys
+import time
+import enum
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+# Net profit tiers: < 10 is fair, < 30 is good, otherwise great
+FAIR_DEAL_MAX = 10
+GOOD_DEAL_MAX = 30
+
+LOW_SALES_SUFFIX = " (low sales data)"
+
+
+class DealType(enum.IntEnum):
+    # Values are the "deal_type" sort order: best deals first.
+    GREAT = 0
+    GOOD = 1
+    FAIR = 2
+
+    @property
+    def label(self):
+        return self.name.lower()
+
+    @classmethod
+    def for_profit(cls, net_profit):
+        if net_profit < FAIR_DEAL_MAX:
+            return cls.FAIR
+        if net_profit < GOOD_DEAL_MAX:
+            return cls.GOOD
+        return cls.GREAT
+
+
+def parse_timestamp(value):
+    """
+    Epoch seconds for an eBay ISO 8601 timestamp, or 0 when it is missing or
+    unparsable.
+    """
+    if not value:
+        return 0
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except (ValueError, TypeError):
+        return 0
+
+
+def format_timestamp(created_at):
+    if not created_at:
+        return ""
+    return datetime.fromtimestamp(created_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def time_ago(created_at, now=None):
+    if not created_at:
+        return "N/A"
+    seconds = (time.time() if now is None else now) - created_at
+    if seconds < 60:
+        return f"{int(seconds)} second(s) ago"
+    elif seconds < 3600:
+        return f"{int(seconds // 60)} minute(s) ago"
+    elif seconds < 86400:
+        return f"{int(seconds // 3600)} hour(s) ago"
+    return f"{int(seconds // 86400)} day(s) ago"
+
+
+@dataclass(slots=True)
+class Listing:
+    title: str
+    price: float
+    condition: str
+    category: str
+    listing_url: str
+    item_id: str
+    created_at: int = 0  # epoch seconds, 0 when eBay gave no creation date
+    cpu_model: str | None = None
+    shipping_cost: float = 0.0
+    tax_estimate: float = 0.0
+    # Filled in by classify_listing once the listing is priced
+    estimated_sale_price: float | None = None
+    low_sales_data: bool = False
+    estimated_sale_source: str | None = None
+    net_profit: float | None = None
+    deal_type: DealType | None = None
+
+    @classmethod
+    def from_item(cls, item):
+        price_info = item.get("price", {})
+        try:
+            price = float(price_info.get("value", 0))
+        except (ValueError, TypeError):
+            price = 0.0
+        return cls(
+            title=item.get("title", ""),
+            price=price,
+            # Thousands of listings share a handful of conditions and categories.
+            condition=sys.intern(item.get("condition", "Not Specified")),
+            category=sys.intern(item.get("categoryPath", "Misc")),
+            listing_url=item.get("itemWebUrl", ""),
+            item_id=item.get("itemId", ""),
+            created_at=parse_timestamp(item.get("itemCreationDate", "")),
+        )
+
+    def to_dict(self, now=None):
+        # The JSON shape served before listings were records; post_date is relative to now.
+        estimated_sale_price = None
+        if self.estimated_sale_price is not None:
+            estimated_sale_price = f"{self.estimated_sale_price:.2f}"
+            if self.low_sales_data:
+                estimated_sale_price += LOW_SALES_SUFFIX
+        deal = {
+            "title": self.title,
+            "price": self.price,
+            "shipping_cost": self.shipping_cost,
+            "tax_estimate": self.tax_estimate,
+            "net_profit": self.net_profit,
+            "condition": self.condition,
+            "category": self.category,
+            "listing_url": self.listing_url,
+            "post_date": time_ago(self.created_at, now),
+            "cpu_model": self.cpu_model,
+            "estimated_sale_price": estimated_sale_price,
+            "estimated_sale_source": self.estimated_sale_source,
+            "itemCreationDate": format_timestamp(self.created_at),
+            "itemId": self.item_id,
+        }
+        if self.deal_type is not None:
+            deal["deal_type"] = self.deal_type.label
+        return deal
@@ -0,0 +1,135 @@
+"""
+Logging setup for the app and the pricing pipeline.
+
+Modules log through `logging.getLogger(__name__)` with %-style arguments, so a
+disabled message costs a level check and nothing is formatted. Records are
+handed to a QueueHandler and written by a single listener thread, so the
+pricing workers never block on stdout.
+
+    LOG_LEVEL=INFO                              root level
+    LOG_LEVELS=ebay_api=DEBUG,price_cache=WARNING   per-module overrides
+    LOG_SAMPLE_EVERY=100                        keep 1 in N per-item messages
+"""
+import os
+import sys
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import logging.handlers
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = "%(asctime)s %(levelname)s %(threadName)s %(name)s: %(message)s"
+
+# Per-item messages (one per listing) are sampled, keeping 1 in LOG_SAMPLE_EVERY
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+# Records buffered for the writer thread before new ones are dropped
+LOG_QUEUE_SIZE = 10000
+
+_LISTENER = None
+_LOCK = threading.Lock()
+
+
+class SampleFilter(logging.Filter):
+    """
+    Passes every `every`-th record. Warnings and errors always pass.
+    """
+
+    def __init__(self, every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The queue never leaves this process, so the record is passed as-is and
+        # %-formatting happens on the writer thread instead of the caller's.
+        return record
+
+    # A full queue drops the record rather than stalling a pricing thread.
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def get_item_logger(name):
+    """
+    Logger for messages emitted once per listing, e.g. "<module>.items".
+    Only a sample of its records is kept; see LOG_SAMPLE_EVERY.
+    """
+    logger = logging.getLogger(f"{name}.items")
+    if not any(isinstance(f, SampleFilter) for f in logger.filters):
+        logger.addFilter(SampleFilter())
+    return logger
+
+
+def parse_levels(spec):
+    levels = {}
+    for entry in spec.split(","):
+        name, sep, level = entry.strip().partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def set_log_level(name, level):
+    """
+    Changes a logger's level at runtime. `name` is a module name such as
+    "ebay_api" (or "" for the root logger); `level` is a name or a number.
+    """
+    if isinstance(level, str):
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+    logging.getLogger(name or None).setLevel(level)
+
+
+def get_log_levels():
+    levels = {"": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.Logger.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(logger.level)
+    return levels
+
+
+def configure_logging(level=LOG_LEVEL, levels=LOG_LEVELS, stream=None):
+    """
+    Routes the root logger through a bounded queue to one writer thread.
+    Safe to call more than once; later calls only update the levels.
+    """
+    global _LISTENER
+    with _LOCK:
+        root = logging.getLogger()
+        if _LISTENER is None:
+            handler = logging.StreamHandler(stream or sys.stdout)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            log_queue = queue.Queue(LOG_QUEUE_SIZE)
+            for existing in list(root.handlers):
+                root.removeHandler(existing)
+            root.addHandler(DroppingQueueHandler(log_queue))
+            _LISTENER = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+            _LISTENER.start()
+            atexit.register(stop_logging)
+        set_log_level("", level)
+        for name, module_level in parse_levels(levels).items():
+            set_log_level(name, module_level)
+
+
+def stop_logging():
+    # Drains the queue so records logged just before exit are written.
+    global _LISTENER
+    with _LOCK:
+        listener, _LISTENER = _LISTENER, None
+    if listener is not None:
+        listener.stop()
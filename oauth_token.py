@@ -0,0 +1,126 @@
+"""
+eBay application token shared by every thread and coroutine, and optionally
+by later processes through a file.
+
+TokenManager hands out the cached token without taking a lock. Once the token
+is within TOKEN_REFRESH_AHEAD seconds of expiry, the first caller to notice
+starts one background refresh and keeps using the current token. Callers only
+wait when there is no valid token at all, and then they all wait on the same
+request.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+
+from singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
+
+# Seconds before expiry at which the token is refreshed in the background
+TOKEN_REFRESH_AHEAD = int(os.getenv("TOKEN_REFRESH_AHEAD", "300"))
+
+# Optional file the token is saved to, so a new process skips the OAuth round trip
+TOKEN_CACHE_PATH = os.getenv("TOKEN_CACHE_PATH", "")
+
+
+class TokenManager:
+    """
+    Caches the token returned by fetch() -> (token, expires_in seconds).
+    get() is for threads and get_async() for coroutines; both share one
+    refresh in flight.
+    """
+
+    def __init__(self, fetch, refresh_ahead=TOKEN_REFRESH_AHEAD, path=TOKEN_CACHE_PATH):
+        self.fetch = fetch
+        self.refresh_ahead = refresh_ahead
+        self.path = path
+        self._token = (None, 0.0)  # (token, expires_at in epoch seconds), always replaced whole
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            token, expires_at = saved["token"], float(saved["expires_at"])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Ignoring unreadable token file %s: %s", self.path, e)
+            return
+        if token and time.time() < expires_at:
+            self._token = (token, expires_at)
+            log.info("Loaded OAuth token from %s, valid for %.0fs", self.path, expires_at - time.time())
+
+    def save(self):
+        token, expires_at = self._token
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            # Owner-only, and renamed into place so readers never see half a file.
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"token": token, "expires_at": expires_at}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning("Could not save OAuth token to %s: %s", self.path, e)
+
+    def _cached(self):
+        # The valid token, or None. Starts a background refresh when it is about to expire.
+        token, expires_at = self._token
+        now = time.time()
+        if not token or now >= expires_at:
+            return None
+        if now >= expires_at - self.refresh_ahead:
+            self._refresh_in_background()
+        return token
+
+    def get(self):
+        token = self._cached()
+        if token is not None:
+            return token
+        return self._flights.do("token", self._refresh_if_expired)
+
+    async def get_async(self):
+        token = self._cached()
+        if token is not None:
+            return token
+        # Join (or lead) the same flight as the threads, without blocking the loop.
+        return await asyncio.to_thread(self.get)
+
+    def refresh(self):
+        token, expires_in = self.fetch()
+        self._token = (token, time.time() + expires_in)
+        if self.path:
+            self.save()
+        return token
+
+    def _refresh_if_expired(self):
+        # The flight we waited behind may have just stored a new token.
+        token = self._cached()
+        return token if token is not None else self.refresh()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="oauth-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._flights.do("token", self.refresh)
+        except Exception as e:
+            # The current token is still valid; the next caller past the threshold retries.
+            log.warning("Background OAuth token refresh failed: %s", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def clear(self):
+        self._token = (None, 0.0)
@@ -0,0 +1,328 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from metrics import STAGE_SECONDS, CACHE_LOOKUPS
+
+log = logging.getLogger(__name__)
+
+# SQLite file shared by every PriceCache namespace
+CACHE_DB_PATH = os.getenv(
+    "PRICE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "price_cache.sqlite3")
+)
+
+# Seconds a scraped price is fresh (soft TTL), and how old it may get before it
+# is dropped (hard TTL). In between it is served marked "(stale)" while it is
+# refreshed in the background, and kept if that refresh fails.
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", str(6 * 3600)))
+PRICE_CACHE_HARD_TTL = int(os.getenv("PRICE_CACHE_HARD_TTL", str(24 * 3600)))
+
+# Seconds before a stale entry whose background refresh failed is refreshed again
+PRICE_REVALIDATE_RETRY = int(os.getenv("PRICE_REVALIDATE_RETRY", "300"))
+
+STALE_MARKER = "(stale)"
+
+# Seconds a query is skipped after its first scrape failure; doubles per further failure up to the max
+SCRAPE_FAILURE_BACKOFF = int(os.getenv("SCRAPE_FAILURE_BACKOFF", "300"))
+SCRAPE_FAILURE_BACKOFF_MAX = int(os.getenv("SCRAPE_FAILURE_BACKOFF_MAX", str(6 * 3600)))
+
+# Entries kept per namespace before the least recently used one is evicted
+PRICE_CACHE_MAX_ENTRIES = int(os.getenv("PRICE_CACHE_MAX_ENTRIES", "5000"))
+
+_CACHES = []
+
+
+def normalize_model(model):
+    return re.sub(r"\s+", " ", model).strip().lower()
+
+
+def mark_stale(source):
+    # Appended to estimated_sale_source so the UI can flag prices past their soft TTL.
+    return f"{source} {STALE_MARKER}" if source else source
+
+
+class PriceCache:
+    """
+    LRU price cache with per-entry soft and hard TTLs, written through to SQLite
+    so a restarted worker starts warm, and read through from it on a miss so
+    processes sharing the file see each other's prices. Keys are (normalized model, condition,
+    day_range); values are anything JSON-serializable (tuples come back as lists).
+    get() only returns fresh values; lookup() also returns stale ones.
+    """
+
+    def __init__(self, namespace, path=CACHE_DB_PATH, ttl=PRICE_CACHE_TTL, hard_ttl=PRICE_CACHE_HARD_TTL, max_entries=PRICE_CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.path = path
+        self.ttl = ttl
+        self.hard_ttl = max(ttl, hard_ttl)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, fresh_until, expires_at)
+        self._touched = {}  # key -> last access time not yet written to SQLite
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prices ("
+            " namespace TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " condition TEXT NOT NULL,"
+            " day_range INTEGER NOT NULL,"
+            " value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " fresh_until REAL,"
+            " PRIMARY KEY (namespace, model, condition, day_range))"
+        )
+        # Files written before per-entry TTLs were persisted lack fresh_until.
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(prices)")}
+        if "fresh_until" not in columns:
+            self._conn.execute("ALTER TABLE prices ADD COLUMN fresh_until REAL")
+        self._conn.commit()
+        self.warm()
+        _CACHES.append(self)
+
+    @staticmethod
+    def make_key(model, condition="Any", day_range=30):
+        return (normalize_model(model), condition or "Any", int(day_range))
+
+    def warm(self):
+        """
+        Loads the most recently used unexpired rows into memory and drops
+        expired ones from disk.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM prices WHERE namespace = ? AND expires_at <= ?", (self.namespace, now))
+            rows = self._conn.execute(
+                "SELECT model, condition, day_range, value, stored_at, expires_at, fresh_until FROM prices"
+                " WHERE namespace = ? ORDER BY last_access DESC LIMIT ?",
+                (self.namespace, self.max_entries)
+            ).fetchall()
+            self._conn.commit()
+            self._entries.clear()
+            for model, condition, day_range, value, stored_at, expires_at, fresh_until in reversed(rows):
+                self._entries[(model, condition, day_range)] = self._entry(value, stored_at, expires_at, fresh_until)
+        log.info("Loaded %d cached prices for '%s' from %s", len(rows), self.namespace, self.path)
+
+    def _entry(self, value, stored_at, expires_at, fresh_until):
+        # Rows from before fresh_until was stored were fresh for the cache's default ttl.
+        if fresh_until is None:
+            fresh_until = min(stored_at + self.ttl, expires_at)
+        return (json.loads(value), fresh_until, expires_at)
+
+    def get(self, key):
+        """
+        Returns the fresh value for key, or None. A stale entry is kept, not
+        returned; see lookup().
+        """
+        value, stale = self.lookup(key, allow_stale=False)
+        return value
+
+    def lookup(self, key, allow_stale=True):
+        """
+        Returns (value, stale): stale is True past the soft TTL, until the hard
+        TTL drops the entry. (None, False) when there is nothing to serve.
+        """
+        start = time.perf_counter()
+        value, result = self._get(key, allow_stale)
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="cache_lookup")
+        CACHE_LOOKUPS.inc(cache=self.namespace, result=result)
+        if result == "stale" and not allow_stale:
+            return None, False
+        return value, result == "stale"
+
+    def _get(self, key, allow_stale):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry[1]:
+                # Another process sharing the SQLite file may have stored a newer price.
+                entry = self._load_locked(key) or entry
+            if entry is None:
+                return None, "miss"
+            value, fresh_until, expires_at = entry
+            if now >= expires_at:
+                self._delete_locked(key)
+                return None, "expired"
+            if now >= fresh_until and not allow_stale:
+                return None, "stale"
+            self._entries.move_to_end(key)
+            self._touched[key] = now
+            return value, "stale" if now >= fresh_until else "hit"
+
+    def _load_locked(self, key):
+        row = self._conn.execute(
+            "SELECT value, stored_at, expires_at, fresh_until FROM prices"
+            " WHERE namespace = ? AND model = ? AND condition = ? AND day_range = ?",
+            (self.namespace,) + key
+        ).fetchone()
+        if row is None:
+            return None
+        entry = self._entry(*row)
+        current = self._entries.get(key)
+        if current is not None and current[1] >= entry[1]:
+            return current
+        self._entries[key] = entry
+        if self._evict_locked():
+            self._conn.commit()
+        return entry
+
+    def _evict_locked(self):
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            oldest_key, _ = self._entries.popitem(last=False)
+            self._touched.pop(oldest_key, None)
+            self._conn.execute(
+                "DELETE FROM prices WHERE namespace = ? AND model = ? AND condition = ? AND day_range = ?",
+                (self.namespace,) + oldest_key
+            )
+            evicted += 1
+        return evicted
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores value, fresh for ttl seconds (default self.ttl) and kept as
+        stale for the rest of the cache's hard TTL window.
+        """
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        fresh_until = now + ttl
+        expires_at = now + max(ttl, self.hard_ttl - self.ttl + ttl)
+        with self._lock:
+            self._entries[key] = (value, fresh_until, expires_at)
+            self._entries.move_to_end(key)
+            self._touched.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prices"
+                " (namespace, model, condition, day_range, value, stored_at, expires_at, last_access, fresh_until)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, key[0], key[1], key[2], json.dumps(value), now, expires_at, now, fresh_until)
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._delete_locked(key)
+
+    def _delete_locked(self, key):
+        self._entries.pop(key, None)
+        self._touched.pop(key, None)
+        self._conn.execute(
+            "DELETE FROM prices WHERE namespace = ? AND model = ? AND condition = ? AND day_range = ?",
+            (self.namespace,) + key
+        )
+        self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._touched.clear()
+            self._conn.execute("DELETE FROM prices WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+
+    def flush(self):
+        # Hits only update memory; write their access times back in one batch so
+        # the next warm() keeps the entries that were actually in use.
+        with self._lock:
+            touched = list(self._touched.items())
+            self._touched.clear()
+            self._conn.executemany(
+                "UPDATE prices SET last_access = ? WHERE namespace = ? AND model = ? AND condition = ? AND day_range = ?",
+                [(accessed, self.namespace) + key for key, accessed in touched]
+            )
+            self._conn.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FailureCache:
+    """
+    Negative cache for lookups that failed. After the n-th consecutive failure
+    a key is skipped for min(base * 2**(n-1), cap) seconds; the failure count
+    is remembered for `memory` seconds, and a success clears it.
+    """
+
+    def __init__(self, namespace, base=SCRAPE_FAILURE_BACKOFF, cap=SCRAPE_FAILURE_BACKOFF_MAX, memory=PRICE_CACHE_HARD_TTL, path=CACHE_DB_PATH):
+        self.base = base
+        self.cap = cap
+        # Fresh while backing off, then kept as stale so the next failure backs off longer.
+        self._failures = PriceCache(namespace, path=path, ttl=base, hard_ttl=max(memory, cap))
+
+    def backing_off(self, key):
+        return self._failures.get(key) is not None
+
+    def record_failure(self, key):
+        """
+        Counts a failure and returns the seconds the key is now skipped for.
+        """
+        failures, _ = self._failures.lookup(key)
+        failures = (failures or 0) + 1
+        backoff = min(self.cap, self.base * 2 ** (failures - 1))
+        self._failures.set(key, failures, ttl=backoff)
+        log.info("Lookup for %s failed %d time(s); skipping it for %ds", key[0], failures, backoff)
+        return backoff
+
+    def record_success(self, key):
+        self._failures.delete(key)
+
+    def clear(self):
+        self._failures.clear()
+
+
+class Revalidator:
+    """
+    Bookkeeping for refreshing stale entries off the request path. claim(key)
+    admits one refresh per key at a time, and none for retry_after seconds
+    after a refresh that failed, so a stale value is served in the meantime
+    instead of every lookup retrying the scrape.
+    """
+
+    def __init__(self, retry_after=PRICE_REVALIDATE_RETRY):
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._claims = {}  # key -> (started_at, running)
+
+    def claim(self, key):
+        now = time.time()
+        with self._lock:
+            claim = self._claims.get(key)
+            if claim is not None:
+                started_at, running = claim
+                if running or now - started_at < self.retry_after:
+                    return False
+            self._claims[key] = (now, True)
+            return True
+
+    def release(self, key, refreshed):
+        with self._lock:
+            if refreshed:
+                self._claims.pop(key, None)
+            else:
+                started_at, _ = self._claims.get(key, (time.time(), False))
+                self._claims[key] = (started_at, False)
+
+
+def close_price_caches():
+    while _CACHES:
+        cache = _CACHES.pop()
+        try:
+            cache.close()
+        except Exception as e:
+            log.debug("Error closing price cache '%s' (ignored): %s", cache.namespace, e)
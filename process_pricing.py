@@ -0,0 +1,160 @@
+"""
+Multi-process pricing for /api/deals/stream, enabled with PRICING_PROCESSES=N.
+
+The parent fetches Browse pages, so the OAuth token and the rate limiters stay
+in one process, and hands each undecoded page to a worker process. The worker
+decodes it, extracts CPU models and classifies every listing whose price is
+already in the SQLite price cache that all processes share. Listings that
+still need a scrape or search come back to the parent, which prices them on
+threads with its browser pool, so only one process drives the Seller Hub
+profile and concurrent misses for a model still share one scrape.
+
+Spawned workers re-import the parent's main script as __mp_main__. Start the
+server with python server.py so they import nothing but this module and
+ebay_api; app.py keeps its own side effects behind start_background_services.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+from datetime import datetime, timezone
+
+from ebay_api import (
+    is_cancelled,
+    iter_browse_pages,
+    page_items,
+    prepare_listing,
+    classify_listing,
+    cached_fair_market_value,
+    price_prepared_listing,
+)
+from log_config import configure_logging
+from metrics import PIPELINE_SECONDS
+
+log = logging.getLogger(__name__)
+
+# Worker processes for decoding, extraction and classification; 0 keeps the threaded stream
+PRICING_PROCESSES = int(os.getenv("PRICING_PROCESSES", "0"))
+
+# Threads in the parent pricing the listings the workers could not price from cache
+PRICING_THREADS = int(os.getenv("PRICING_THREADS", "20"))
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _init_worker():
+    configure_logging()
+
+
+def process_pool_size(workers=None):
+    return workers or PRICING_PROCESSES or os.cpu_count() or 1
+
+
+def get_process_pool(workers=None):
+    """
+    Returns the shared process pool, starting it on first use. Workers are
+    spawned rather than forked so they don't inherit the parent's SQLite
+    connections, Playwright threads or event loop.
+    """
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            workers = process_pool_size(workers)
+            _EXECUTOR = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            log.info("Started %d pricing worker processes", workers)
+        return _EXECUTOR
+
+
+def shutdown_process_pool():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+
+
+def prepare_page(raw_page, limit, cache_expiry, now):
+    """
+    Runs in a worker process. Returns (deals priced from the shared cache,
+    [(listing, multiplier)] that still need pricing).
+    """
+    deals = []
+    unpriced = []
+    for item in page_items(json.loads(raw_page), limit):
+        prepared = prepare_listing(item, cache_expiry, now)
+        if prepared is None:
+            continue
+        listing, multiplier = prepared
+        pricing = cached_fair_market_value(listing.cpu_model, condition=listing.condition)
+        if pricing is None:
+            unpriced.append(prepared)
+            continue
+        deal = classify_listing(listing, multiplier, *pricing)
+        if deal is not None:
+            deals.append(deal)
+    return deals, unpriced
+
+
+def get_ebay_listings_multiprocess(keyword="", limit=50, cache_expiry=14400, workers=None, cancel=None):
+    """
+    Same deals as get_ebay_listings_stream, yielded in completion order, with
+    the CPU-bound work sharded across worker processes one Browse page at a time.
+    Setting the `cancel` event stops it as get_ebay_listings_stream does.
+    """
+    start_time = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    pool = get_process_pool(workers)
+    threads = concurrent.futures.ThreadPoolExecutor(max_workers=PRICING_THREADS)
+    page_futures = set()
+    price_futures = set()
+
+    def price(listing, multiplier):
+        # Queued listings are skipped once the scan is cancelled.
+        if is_cancelled(cancel):
+            return None
+        return price_prepared_listing(listing, multiplier)
+
+    def collect(done):
+        # Finished pages yield their cached deals and queue the rest for pricing.
+        for future in done:
+            if future in page_futures:
+                page_futures.discard(future)
+                deals, unpriced = future.result()
+                if is_cancelled(cancel):
+                    continue
+                for prepared in unpriced:
+                    price_futures.add(threads.submit(price, *prepared))
+                yield from deals
+            else:
+                price_futures.discard(future)
+                deal = future.result()
+                if deal is not None:
+                    yield deal
+
+    try:
+        for raw_page in iter_browse_pages(keyword=keyword, limit=limit, raw=True, cancel=cancel):
+            if is_cancelled(cancel):
+                return
+            page_futures.add(pool.submit(prepare_page, raw_page, limit, cache_expiry, now))
+            yield from collect({future for future in page_futures | price_futures if future.done()})
+        while (page_futures or price_futures) and not is_cancelled(cancel):
+            done, _ = concurrent.futures.wait(page_futures | price_futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            yield from collect(done)
+    finally:
+        # If the caller stops early (the generator is closed), drop the pages
+        # and listings still queued instead of waiting for them.
+        for future in page_futures:
+            future.cancel()
+        threads.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start_time
+    PIPELINE_SECONDS.observe(elapsed, entry_point="process")
+    log.info("get_ebay_listings_multiprocess completed in %.2f seconds", elapsed)
@@ -0,0 +1,203 @@
+"""
+Per-endpoint request throttling shared by the sync and async clients.
+
+Each upstream source (OAuth, Browse, Seller Hub) gets one EndpointLimiter:
+a token bucket whose refill rate adapts AIMD-style (additive increase on
+success, multiplicative decrease on 429/503), plus a circuit breaker that
+rejects calls outright after repeated failures so callers can fall back to a
+cached or secondary price instead of queueing behind a source that is down.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+import email.utils
+
+from metrics import counter
+
+log = logging.getLogger(__name__)
+
+# name: (requests per second, burst); override with RATE_LIMIT_<NAME>=rate[:burst]
+DEFAULT_RATE_LIMITS = {
+    "oauth": (1.0, 2),
+    "browse": (5.0, 10),
+    "seller_hub": (1.0, 8),
+}
+
+# The adapted rate never drops below this fraction of the configured rate
+MIN_RATE_FRACTION = 0.05
+
+# Each success adds this fraction of the configured rate back; each 429/503 halves it
+RATE_INCREASE_FRACTION = 0.05
+RATE_DECREASE_FACTOR = 0.5
+
+# Consecutive failures that open a circuit, and seconds it stays open before a probe
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+
+THROTTLE_STATUSES = (429, 503)
+
+CIRCUIT_REJECTIONS = counter("ebay_circuit_rejections_total", "Requests rejected without a call because the endpoint's circuit is open.", ["endpoint"])
+THROTTLED_RESPONSES = counter("ebay_throttled_responses_total", "429/503 responses that lowered an endpoint's request rate.", ["endpoint", "status"])
+CIRCUIT_OPENS = counter("ebay_circuit_opens_total", "Times an endpoint's circuit opened.", ["endpoint"])
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"Circuit for '{endpoint}' is open; retry in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class ThrottledError(Exception):
+    def __init__(self, endpoint, status):
+        super().__init__(f"'{endpoint}' returned {status}")
+        self.endpoint = endpoint
+        self.status = status
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class EndpointLimiter:
+    """
+    Token bucket with an adaptive rate and a circuit breaker. Thread-safe;
+    sync callers block in acquire(), async callers await acquire_async(), and
+    both must report the outcome of every call with record().
+    """
+
+    def __init__(self, name, rate, burst, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, open_seconds=CIRCUIT_OPEN_SECONDS):
+        self.name = name
+        self.max_rate = float(rate)
+        self.min_rate = self.max_rate * MIN_RATE_FRACTION
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.tokens = float(self.burst)
+        self.paused_until = 0.0
+        self.failures = 0
+        self.state = "closed"  # closed, open or half_open
+        self.opened_at = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # No tokens accrue while paused by a Retry-After.
+        start = max(self._last, self.paused_until)
+        if now > start:
+            self.tokens = min(self.burst, self.tokens + (now - start) * self.rate)
+        self._last = max(self._last, now)
+
+    def _check_circuit(self, now):
+        if self.state == "closed":
+            return
+        retry_in = self.opened_at + self.open_seconds - now
+        if retry_in > 0:
+            CIRCUIT_REJECTIONS.inc(endpoint=self.name)
+            raise CircuitOpenError(self.name, retry_in)
+        # Open long enough (or the last probe never reported back): let exactly one
+        # probe through. Its outcome closes or re-opens the circuit.
+        self.state = "half_open"
+        self.opened_at = now
+        log.info("Circuit for '%s' is half-open, sending a probe", self.name)
+
+    def reserve(self):
+        """
+        Takes a token and returns the seconds the caller must wait before using
+        it. Raises CircuitOpenError instead of queueing while the circuit is open.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._check_circuit(now)
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.paused_until - now)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, status=None, error=False, retry_after=None):
+        """
+        Reports one call's outcome: an HTTP status, or error=True for a
+        timeout/connection failure. 429/503 slow the bucket down (pausing it
+        for retry_after seconds when given); successes speed it back up.
+        """
+        now = time.monotonic()
+        throttled = status in THROTTLE_STATUSES
+        failed = error or throttled or (status is not None and status >= 500)
+        with self._lock:
+            if throttled:
+                THROTTLED_RESPONSES.inc(endpoint=self.name, status=status)
+                self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+                    self.tokens = min(self.tokens, 0.0)
+            elif not failed:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE_FRACTION)
+            if not failed:
+                self.failures = 0
+                if self.state != "closed":
+                    log.info("Circuit for '%s' closed", self.name)
+                self.state = "closed"
+                return
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = now
+                CIRCUIT_OPENS.inc(endpoint=self.name)
+                log.warning("Circuit for '%s' opened after %d failures; failing fast for %.0fs", self.name, self.failures, self.open_seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {"rate": self.rate, "tokens": self.tokens, "state": self.state, "failures": self.failures}
+
+
+def limit_from_env(name):
+    rate, burst = DEFAULT_RATE_LIMITS[name]
+    spec = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if spec:
+        rate_text, _, burst_text = spec.partition(":")
+        rate = float(rate_text)
+        burst = int(burst_text) if burst_text else max(burst, int(rate))
+    return rate, burst
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(name):
+    """
+    Returns the process-wide limiter for an endpoint name in DEFAULT_RATE_LIMITS.
+    """
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(name)
+        if limiter is None:
+            rate, burst = limit_from_env(name)
+            limiter = _LIMITERS[name] = EndpointLimiter(name, rate, burst)
+        return limiter
@@ -0,0 +1,11 @@
+"""
+Starts the development server: python server.py
+
+Same as python app.py, but with PRICING_PROCESSES set the spawned pricing
+workers re-import this script rather than app.py, so they don't load the
+Flask app at all.
+"""
+
+if __name__ == '__main__':
+    from app import main
+    main()
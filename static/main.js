@@ -72,6 +72,27 @@ document.addEventListener("DOMContentLoaded", async function() {
     return card;
   }
 
+  // Once the user sorts or filters, cards come from /api/deals pages instead of
+  // the stream; deals streamed after that re-run the query so they show up in place.
+  const PAGE_SIZE = 50;
+  const MAX_PAGE_SIZE = 500; // DEAL_QUERY_MAX_LIMIT in app.py
+  const REFRESH_DELAY_MS = 500;
+  let queryActive = false;
+  let nextCursor = null;
+  let queryId = 0;
+  let refreshTimer = null;
+
+  const loadMoreButton = document.createElement('button');
+  loadMoreButton.id = 'load_more';
+  loadMoreButton.textContent = 'Load more';
+  loadMoreButton.style.display = 'none';
+  dealsContainer.insertAdjacentElement('afterend', loadMoreButton);
+
+  function showDeals() {
+    loadingScreen.style.display = 'none';
+    dealsContainer.style.display = 'grid';
+  }
+
   // Stream deals using fetch and process the response as a stream.
   async function streamDeals() {
     const response = await fetch('/api/deals/stream');
@@ -85,15 +106,17 @@ document.addEventListener("DOMContentLoaded", async function() {
       let lines = buffer.split("\n");
       buffer = lines.pop(); // last element might be incomplete
       for (let line of lines) {
-        if (line.trim()) {
+        if (line.trim() && queryActive) {
+          // The server has stored this deal; pick it up with the current sort and filters.
+          scheduleRefresh();
+        } else if (line.trim()) {
           try {
             const deal = JSON.parse(line);
             const card = createDealCard(deal);
             dealsContainer.appendChild(card);
             // Hide the loading screen once the first card is added.
             if (dealsContainer.childElementCount === 1) {
-              loadingScreen.style.display = 'none';
-              dealsContainer.style.display = 'grid';
+              showDeals();
             }
           } catch (err) {
             console.error("Error parsing deal:", line, err);
@@ -108,65 +131,70 @@ document.addEventListener("DOMContentLoaded", async function() {
     loadingScreen.innerHTML = '<p>Error loading deals.</p>';
   });
 
-  // Sorting and Filtering Setup (same as before)
+  // Sorting, filtering and paging run server-side against the indexed deal store.
   const sortSelect = document.getElementById('sort_by');
-  sortSelect.addEventListener('change', function() {
-    const criteria = this.value;
-    const cards = Array.from(dealsContainer.querySelectorAll('.card'));
-    let sortedCards;
-    if (criteria === 'newest') {
-      sortedCards = cards.sort((a, b) => {
-        let dateA = new Date(a.dataset.created);
-        let dateB = new Date(b.dataset.created);
-        return dateB - dateA;
-      });
-    } else if (criteria === 'deal_type') {
-      const order = { 'great': 0, 'good': 1, 'fair': 2, 'low': 3 };
-      sortedCards = cards.sort((a, b) => order[a.dataset.dealType] - order[b.dataset.dealType]);
-    } else if (criteria === 'cpu') {
-      sortedCards = cards.sort((a, b) => {
-        const cpuA = a.dataset.cpu.toLowerCase();
-        const cpuB = b.dataset.cpu.toLowerCase();
-        return cpuA.localeCompare(cpuB);
-      });
-    } else if (criteria === 'net_profit') {
-      sortedCards = cards.sort((a, b) => parseFloat(b.dataset.netProfit) - parseFloat(a.dataset.netProfit));
-    } else if (criteria === 'price_asc') {
-      sortedCards = cards.sort((a, b) => parseFloat(a.dataset.price) - parseFloat(b.dataset.price));
-    } else if (criteria === 'price_desc') {
-      sortedCards = cards.sort((a, b) => parseFloat(b.dataset.price) - parseFloat(a.dataset.price));
-    } else {
-      return;
-    }
-    dealsContainer.innerHTML = "";
-    sortedCards.forEach(card => dealsContainer.appendChild(card));
-  });
-
   const filterForm = document.getElementById('filter_form');
   const categoryCheckboxes = document.querySelectorAll('input[name="category"]');
   const dealTypeCheckboxes = document.querySelectorAll('input[name="deal_type"]');
-  
+
+  function checkedValues(checkboxes) {
+    return Array.from(checkboxes).filter(cb => cb.checked).map(cb => cb.value.toLowerCase());
+  }
+
+  function dealsQuery(cursor, limit) {
+    const params = new URLSearchParams({ sort: sortSelect.value, limit: limit });
+    const categories = checkedValues(categoryCheckboxes);
+    const dealTypes = checkedValues(dealTypeCheckboxes);
+    if (categories.length) params.append('filter', 'category:' + categories.join(','));
+    if (dealTypes.length) params.append('filter', 'deal_type:' + dealTypes.join(','));
+    if (cursor) params.set('cursor', cursor);
+    return '/api/deals?' + params.toString();
+  }
+
+  // Replaces the cards with the first `limit` deals for the current sort and
+  // filters, or appends the next page when `more` is set.
+  async function loadDeals(more, limit = PAGE_SIZE) {
+    queryActive = true;
+    const id = ++queryId;
+    const response = await fetch(dealsQuery(more ? nextCursor : null, limit));
+    const page = await response.json();
+    if (id !== queryId) return; // a newer query replaced this one
+    if (!response.ok) {
+      console.error('Error querying deals:', page.error);
+      return;
+    }
+    if (!more) dealsContainer.innerHTML = "";
+    page.deals.forEach(deal => dealsContainer.appendChild(createDealCard(deal)));
+    nextCursor = page.next_cursor;
+    loadMoreButton.style.display = nextCursor ? '' : 'none';
+    showDeals();
+  }
+
+  function reloadDeals() {
+    clearTimeout(refreshTimer);
+    refreshTimer = null;
+    loadDeals(false).catch(error => console.error('Error querying deals:', error));
+  }
+
+  // Batches deals streamed within REFRESH_DELAY_MS into one re-query that keeps
+  // as many cards as are currently shown (pages loaded with "Load more" included).
+  function scheduleRefresh() {
+    if (refreshTimer !== null) return;
+    refreshTimer = setTimeout(function() {
+      refreshTimer = null;
+      const shown = Math.min(Math.max(PAGE_SIZE, dealsContainer.childElementCount), MAX_PAGE_SIZE);
+      loadDeals(false, shown).catch(error => console.error('Error querying deals:', error));
+    }, REFRESH_DELAY_MS);
+  }
+
+  sortSelect.addEventListener('change', reloadDeals);
   filterForm.addEventListener('submit', function(e) {
     e.preventDefault();
-    applyFilters();
+    reloadDeals();
+  });
+  categoryCheckboxes.forEach(checkbox => checkbox.addEventListener('change', reloadDeals));
+  dealTypeCheckboxes.forEach(checkbox => checkbox.addEventListener('change', reloadDeals));
+  loadMoreButton.addEventListener('click', function() {
+    loadDeals(true).catch(error => console.error('Error querying deals:', error));
   });
-  categoryCheckboxes.forEach(checkbox => checkbox.addEventListener('change', applyFilters));
-  dealTypeCheckboxes.forEach(checkbox => checkbox.addEventListener('change', applyFilters));
-  
-  function applyFilters() {
-    const selectedCategories = Array.from(categoryCheckboxes)
-      .filter(cb => cb.checked)
-      .map(cb => cb.value.toLowerCase());
-    const selectedDealTypes = Array.from(dealTypeCheckboxes)
-      .filter(cb => cb.checked)
-      .map(cb => cb.value.toLowerCase());
-    const cards = Array.from(dealsContainer.querySelectorAll('.card'));
-    cards.forEach(card => {
-      const cardCategory = card.getAttribute('data-category').toLowerCase();
-      const cardDealType = card.getAttribute('data-deal-type').toLowerCase();
-      const categoryMatch = selectedCategories.length === 0 || selectedCategories.includes(cardCategory);
-      const dealTypeMatch = selectedDealTypes.length === 0 || selectedDealTypes.includes(cardDealType);
-      card.style.display = (categoryMatch && dealTypeMatch) ? "" : "none";
-    });
-  }
 });
@@ -0,0 +1,176 @@
+"""
+Shares one upstream scan between every /api/deals/stream client asking for
+the same keyword.
+
+The first subscriber for a key starts the scan on a background thread. Later
+subscribers replay the deals it has produced so far and then follow the live
+ones. When the last subscriber leaves, the hub forgets the scan and a scan
+that is still running is cancelled, so a later request starts a fresh one.
+"""
+import logging
+import threading
+
+from metrics import STREAM_SUBSCRIPTIONS
+
+log = logging.getLogger(__name__)
+
+
+class Broadcast:
+    """
+    One scan over start_scan(cancel) -> iterator of deals, read by any number
+    of followers. Every deal produced is kept for replay until the hub drops
+    it. stop() sets `cancel`, which the scan checks between pages and
+    listings, so it ends even while it is producing no deals.
+    """
+
+    def __init__(self, key, start_scan):
+        self.key = key
+        self.subscribers = 0
+        self._deals = []
+        self._done = False
+        self._error = None
+        self._stopping = threading.Event()
+        self.source = start_scan(self._stopping)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="deal-scan", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for deal in self.source:
+                if self._stopping.is_set():
+                    break
+                with self._cond:
+                    self._deals.append(deal)
+                    self._cond.notify_all()
+        except Exception as e:
+            log.error("Scan for %r failed: %s", self.key, e)
+            self._error = e
+        finally:
+            if self._stopping.is_set():
+                log.info("Stopped scan for %r: no subscribers left", self.key)
+            # Closing the pipeline generator cancels the listings it still has queued.
+            close = getattr(self.source, "close", None)
+            if close is not None:
+                close()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def follow(self, cancelled):
+        """
+        Yields every deal from the start of the scan, then the live ones,
+        until the scan ends or cancelled() is true. Re-raises the scan's
+        error, if any.
+        """
+        seen = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._deals) > seen or self._done or cancelled())
+                if cancelled():
+                    return
+                deals = self._deals[seen:]
+                done = self._done
+            seen += len(deals)
+            yield from deals
+            if done and seen == len(self._deals):
+                break
+        if self._error is not None:
+            raise self._error
+
+    def wake(self):
+        # Lets followers re-check whether they were cancelled.
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self):
+        # Listings already being priced finish; nothing further is fetched or priced.
+        self._stopping.set()
+
+    @property
+    def done(self):
+        return self._done
+
+
+class Subscription:
+    """
+    One client's place in the scan for `key`. Iterating it joins the scan
+    (starting it if needed) and yields its deals. cancel() may be called
+    from any thread and ends the iteration right away.
+    """
+
+    def __init__(self, hub, key, start_scan):
+        self.hub = hub
+        self.key = key
+        self.start_scan = start_scan
+        self.scan = None
+        self.cancelled = False
+
+    def __iter__(self):
+        scan = self.hub._join(self)
+        if scan is None:
+            return
+        try:
+            yield from scan.follow(lambda: self.cancelled)
+        finally:
+            self.hub._leave(self)
+
+    def cancel(self):
+        self.hub._leave(self, cancel=True)
+
+
+class StreamHub:
+    """
+    key -> the Broadcast currently serving it.
+    """
+
+    def __init__(self):
+        self._scans = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key, start_scan):
+        """
+        Returns a Subscription to the scan for `key`. Iterating it joins the
+        running scan, or starts start_scan(cancel) -> iterator of deals if
+        there is none (or the last one has finished). `cancel` is a
+        threading.Event set once the scan has no subscribers left.
+        """
+        return Subscription(self, key, start_scan)
+
+    def _join(self, subscription):
+        key = subscription.key
+        with self._lock:
+            if subscription.cancelled:
+                return None
+            scan = self._scans.get(key)
+            if scan is None or scan.done:
+                scan = Broadcast(key, subscription.start_scan).start()
+                self._scans[key] = scan
+                STREAM_SUBSCRIPTIONS.inc(scan="started")
+            else:
+                STREAM_SUBSCRIPTIONS.inc(scan="attached")
+            scan.subscribers += 1
+            subscription.scan = scan
+            return scan
+
+    def _leave(self, subscription, cancel=False):
+        with self._lock:
+            if cancel:
+                subscription.cancelled = True
+            scan, subscription.scan = subscription.scan, None
+            if scan is None:
+                return
+            scan.subscribers -= 1
+            if scan.subscribers == 0:
+                scan.stop()
+                if self._scans.get(subscription.key) is scan:
+                    del self._scans[subscription.key]
+        if cancel:
+            scan.wake()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._scans)
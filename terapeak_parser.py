@@ -0,0 +1,155 @@
+"""
+Extracts the Terapeak sold table and the aggregated metric from a Seller Hub
+research page without building a full BeautifulSoup tree.
+
+Backends, fastest first: selectolax (if installed), lxml, BeautifulSoup
+restricted by a SoupStrainer to the two elements we read, and the original
+full html.parser soup. TERAPEAK_PARSER picks one explicitly; "auto" uses the
+fastest available and falls back to html.parser if it raises.
+"""
+import os
+import logging
+from collections import namedtuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+log = logging.getLogger(__name__)
+
+TERAPEAK_PARSER = os.getenv("TERAPEAK_PARSER", "auto")
+
+TABLE_CLASS = "terapeak-table content static-table table-content-default"
+ROW_CLASS = "research-table-row_item research-table-row_item-subtitle"
+METRIC_CLASS = "metric-value"
+
+# rows: the sold rows as lists of stripped <td> texts, or None when `missing`
+# ("table", "tbody" or "rows") says which part of the table was not found.
+# metric_text: text of the first div.metric-value, or None.
+ResearchPage = namedtuple("ResearchPage", ["rows", "metric_text", "missing"])
+
+
+def _class_is(value, expected):
+    return value is not None and " ".join(value.split()) == expected
+
+
+def _has_class(value, name):
+    return value is not None and name in value.split()
+
+
+def parse_with_soup(soup):
+    """
+    The original lookups, on an already-built soup.
+    """
+    metric_div = soup.find("div", class_=METRIC_CLASS)
+    metric_text = metric_div.get_text(strip=True) if metric_div else None
+    table = soup.find("table", class_=TABLE_CLASS)
+    if not table:
+        return ResearchPage(None, metric_text, "table")
+    tbody = table.find("tbody")
+    if not tbody:
+        return ResearchPage(None, metric_text, "tbody")
+    rows = tbody.find_all("tr", class_=ROW_CLASS)
+    if not rows:
+        return ResearchPage(None, metric_text, "rows")
+    return ResearchPage([[cell.get_text(strip=True) for cell in row.find_all("td")] for row in rows], metric_text, None)
+
+
+def parse_html_parser(html):
+    return parse_with_soup(BeautifulSoup(html, "html.parser"))
+
+
+RESEARCH_STRAINER = SoupStrainer(
+    attrs={"class": lambda value: _class_is(value, TABLE_CLASS) or _has_class(value, METRIC_CLASS)}
+)
+
+
+def parse_strained(html):
+    # Only the sold table and metric divs become Tag objects; the rest of the
+    # page is tokenized and dropped.
+    return parse_with_soup(BeautifulSoup(html, "lxml" if lxml is not None else "html.parser", parse_only=RESEARCH_STRAINER))
+
+
+def _lxml_text(element):
+    return "".join(text.strip() for text in element.itertext())
+
+
+def parse_lxml(html):
+    root = lxml.html.document_fromstring(html)
+    metric = root.xpath(f'(//div[contains(concat(" ", normalize-space(@class), " "), " {METRIC_CLASS} ")])[1]')
+    metric_text = _lxml_text(metric[0]) if metric else None
+    table = root.xpath(f'(//table[normalize-space(@class)="{TABLE_CLASS}"])[1]')
+    if not table:
+        return ResearchPage(None, metric_text, "table")
+    tbody = table[0].xpath("(.//tbody)[1]")
+    if not tbody:
+        return ResearchPage(None, metric_text, "tbody")
+    rows = tbody[0].xpath(f'.//tr[normalize-space(@class)="{ROW_CLASS}"]')
+    if not rows:
+        return ResearchPage(None, metric_text, "rows")
+    return ResearchPage([[_lxml_text(cell) for cell in row.iter("td")] for row in rows], metric_text, None)
+
+
+def _selectolax_text(node):
+    return node.text(deep=True, separator="", strip=True)
+
+
+def parse_selectolax(html):
+    tree = HTMLParser(html)
+    metric = tree.css_first(f"div.{METRIC_CLASS}")
+    metric_text = _selectolax_text(metric) if metric else None
+    table = next((node for node in tree.css("table.terapeak-table") if _class_is(node.attributes.get("class"), TABLE_CLASS)), None)
+    if table is None:
+        return ResearchPage(None, metric_text, "table")
+    tbody = table.css_first("tbody")
+    if tbody is None:
+        return ResearchPage(None, metric_text, "tbody")
+    rows = [row for row in tbody.css("tr") if _class_is(row.attributes.get("class"), ROW_CLASS)]
+    if not rows:
+        return ResearchPage(None, metric_text, "rows")
+    return ResearchPage([[_selectolax_text(cell) for cell in row.css("td")] for row in rows], metric_text, None)
+
+
+BACKENDS = {
+    "selectolax": parse_selectolax,
+    "lxml": parse_lxml,
+    "strained": parse_strained,
+    "html.parser": parse_html_parser,
+}
+
+
+def available_backends():
+    names = []
+    if HTMLParser is not None:
+        names.append("selectolax")
+    if lxml is not None:
+        names.append("lxml")
+    names.extend(["strained", "html.parser"])
+    return names
+
+
+def parse_research_page(html, backend=None):
+    """
+    Returns a ResearchPage for a Seller Hub research page. A fast backend that
+    fails is retried with the original html.parser soup.
+    """
+    backend = backend or TERAPEAK_PARSER
+    if backend == "auto":
+        backend = available_backends()[0]
+    if backend not in available_backends():
+        raise ValueError(f"Terapeak parser backend '{backend}' is not available; choose from {available_backends()}")
+    try:
+        return BACKENDS[backend](html)
+    except Exception as e:
+        if backend == "html.parser":
+            raise
+        log.warning("Terapeak parser '%s' failed (%s), falling back to html.parser", backend, e)
+        return parse_html_parser(html)
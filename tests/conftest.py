@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+import pytest
+
+# ebay_api opens its SQLite price caches at import; keep them out of the repo's cache/ directory.
+os.environ.setdefault("PRICE_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="price-cache-"), "price_cache.sqlite3"))
+
+
+class FakeClock:
+    """
+    Stands in for a module's `time`: time(), monotonic() and perf_counter()
+    all read one clock that only moves on advance() or sleep().
+    """
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    monotonic = perf_counter = time
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import async_pricing
+from price_cache import PriceCache
+
+
+class ThreadRecordingCache(PriceCache):
+    # Notes the thread every SQLite-backed call runs on.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def lookup(self, key, allow_stale=True):
+        self.threads.append(threading.get_ident())
+        return super().lookup(key, allow_stale)
+
+    def set(self, key, value, ttl=None):
+        self.threads.append(threading.get_ident())
+        return super().set(key, value, ttl)
+
+
+def test_price_cache_io_stays_off_the_pricing_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "prices.sqlite3")
+    scraped = ThreadRecordingCache("scraped_price", path=path)
+    sold = ThreadRecordingCache("sold_data", path=path)
+    monkeypatch.setattr(async_pricing, "SCRAPED_PRICE_CACHE", scraped)
+    monkeypatch.setattr(async_pricing, "SOLD_DATA_CACHE", sold)
+    monkeypatch.setattr(async_pricing.FAIR_VALUE_TABLE, "lookup", lambda cpu_model, condition: None)
+    query = async_pricing.scrape_query_for_model("Intel Core I5-7500 3.4GHz")
+    sold.set(sold.make_key(query), 250.0)
+    sold.threads.clear()
+
+    async def price():
+        return threading.get_ident(), await async_pricing.async_get_fair_market_value("Intel Core I5-7500 3.4GHz", "Used")
+
+    loop_thread, pricing = asyncio.run(price())
+    assert pricing == (250.0, False, "(Sold Listings)")
+    assert scraped.threads and sold.threads
+    assert loop_thread not in scraped.threads + sold.threads
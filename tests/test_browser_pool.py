@@ -0,0 +1,44 @@
+import os
+
+from browser_pool import BrowserPool, clone_profile, async_profile_dir, PROFILE_CLONE_MARKER
+
+
+def make_profile(path, cookies="signed-in"):
+    os.makedirs(os.path.join(path, "Default"))
+    with open(os.path.join(path, "Default", "Cookies"), "w") as f:
+        f.write(cookies)
+    with open(os.path.join(path, "SingletonLock"), "w") as f:
+        f.write("locked")
+
+
+def read_cookies(path):
+    with open(os.path.join(path, "Default", "Cookies")) as f:
+        return f.read()
+
+
+def test_clone_moves_a_directory_that_was_never_cloned_aside(tmp_path):
+    source, target = str(tmp_path / "profile"), str(tmp_path / "profile-1")
+    make_profile(source)
+    make_profile(target, cookies="someone else's profile")
+
+    assert clone_profile(source, target) is True
+    assert read_cookies(target) == "signed-in"
+    assert os.path.exists(os.path.join(target, PROFILE_CLONE_MARKER))
+    assert not os.path.exists(os.path.join(target, "SingletonLock"))
+    assert read_cookies(target + ".not-cloned") == "someone else's profile"
+
+    # An existing clone is kept as it is.
+    with open(os.path.join(source, "Default", "Cookies"), "w") as f:
+        f.write("signed-in again")
+    assert clone_profile(source, target) is False
+    assert read_cookies(target) == "signed-in"
+
+
+def test_pool_clones_the_slot_and_async_profiles_together(tmp_path):
+    source = str(tmp_path / "profile")
+    make_profile(source)
+    pool = BrowserPool(source, size=3)
+    pool.clone_profiles()
+    for target in (pool.profile_dir(1), pool.profile_dir(2), async_profile_dir(source)):
+        assert read_cookies(target) == "signed-in"
+    assert not os.path.exists(pool.profile_dir(3))
@@ -0,0 +1,59 @@
+from deal_store import DealStore, parse_filters
+from listing import Listing, DealType
+
+
+def make_deal(n, category="Computers|CPUs/Processors", condition="Used", net_profit=20.0):
+    deal = Listing(
+        title=f"Intel Core i7-{8000 + n}",
+        price=100.0 + n,
+        condition=condition,
+        category=category,
+        listing_url=f"https://www.ebay.com/itm/{n}",
+        item_id=f"v1|{n}|0",
+        created_at=1_700_000_000 + n,
+        cpu_model=f"Intel Core I7-{8000 + n}",
+    )
+    deal.estimated_sale_price = deal.price + net_profit
+    deal.net_profit = net_profit
+    deal.deal_type = DealType.for_profit(net_profit)
+    return deal
+
+
+def item_ids(deals):
+    return [deal.item_id for deal in deals]
+
+
+def test_filters_see_deals_added_after_eviction():
+    store = DealStore(max_deals=3)
+    for n in range(5):
+        store.add(make_deal(n))
+    deals, next_cursor, total = store.query("newest", parse_filters(["category:cpu"]), limit=10)
+    assert item_ids(deals) == ["v1|4|0", "v1|3|0", "v1|2|0"]
+    assert total == 3
+    assert next_cursor is None
+
+
+def test_evicted_deal_leaves_no_filter_bits():
+    store = DealStore(max_deals=2)
+    store.add(make_deal(0, condition="New"))
+    store.add(make_deal(1))
+    store.add(make_deal(2))
+    deals, _, total = store.query("newest", parse_filters(["condition:new"]), limit=10)
+    assert deals == [] and total == 0
+
+
+def test_cursor_pages_through_filtered_deals_after_eviction():
+    store = DealStore(max_deals=6)
+    for n in range(10):
+        store.add(make_deal(n, category="Computers|CPUs/Processors" if n % 2 else "Computers|Memory", net_profit=float(n)))
+    filters = parse_filters(["category:cpu"])
+    pages = []
+    cursor = None
+    while True:
+        deals, cursor, total = store.query("net_profit", filters, cursor, limit=2)
+        pages.append(item_ids(deals))
+        if cursor is None:
+            break
+    assert total == 3
+    assert [item for page in pages for item in page] == ["v1|9|0", "v1|7|0", "v1|5|0"]
+    assert len(store) == 6
@@ -0,0 +1,114 @@
+import gzip
+import json
+import time
+import zlib
+import threading
+
+import pytest
+
+import deal_stream
+from deal_stream import NDJSON, MSGPACK, micro_batches, encode_stream
+
+DEALS = [{"itemId": f"v1|{n}|0", "title": f"Intel Core i5-{7000 + n}", "net_profit": n * 1.5} for n in range(40)]
+NDJSON_BODY = b"".join(json.dumps(deal, separators=(",", ":")).encode() + b"\n" for deal in DEALS)
+
+
+def fixed_size(item):
+    return item.encode().ljust(30)
+
+
+def test_batches_flush_by_size():
+    items = [str(n) for n in range(10)]
+    batches = list(micro_batches(items, fixed_size, max_bytes=100, max_delay=10))
+    # The first item alone, then whole batches of at least max_bytes, then the rest.
+    assert [len(batch) // 30 for batch in batches] == [1, 4, 4, 1]
+    assert b"".join(batches) == b"".join(fixed_size(item) for item in items)
+
+
+def test_batches_flush_by_time_while_the_source_is_blocked():
+    release = threading.Event()
+
+    def source():
+        yield "a"
+        yield "b"
+        release.wait(5)
+        yield "c"
+
+    batches = micro_batches(source(), fixed_size, max_bytes=1 << 20, max_delay=0.05)
+    assert next(batches) == fixed_size("a")
+    start = time.monotonic()
+    # "b" is written once it has been held max_delay, not when "c" arrives.
+    assert next(batches) == fixed_size("b")
+    assert time.monotonic() - start < 2
+    assert not release.is_set()
+    release.set()
+    assert list(batches) == [fixed_size("c")]
+
+
+def test_on_close_runs_when_the_client_goes_away():
+    cancelled = threading.Event()
+    source_closed = threading.Event()
+    closes = []
+
+    def source():
+        try:
+            yield "a"
+            # Like a hub subscription: blocks until on_close cancels it.
+            cancelled.wait(5)
+            yield "b"
+            yield "c"
+        finally:
+            source_closed.set()
+
+    def on_close():
+        closes.append(True)
+        cancelled.set()
+
+    batches = micro_batches(source(), fixed_size, max_delay=0.05, on_close=on_close)
+    assert next(batches) == fixed_size("a")
+    batches.close()
+    assert closes == [True]
+    # The pump sees the stop and closes the source instead of reading it to the end.
+    assert source_closed.wait(2)
+
+
+def test_on_close_runs_without_batching():
+    closes = []
+    batches = micro_batches(iter(["a", "b"]), fixed_size, max_delay=0, on_close=lambda: closes.append(True))
+    assert next(batches) == fixed_size("a")
+    batches.close()
+    assert closes == [True]
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_ndjson_body(backend):
+    if backend == "orjson" and deal_stream.orjson is None:
+        pytest.skip("orjson is not installed")
+    body = b"".join(encode_stream(iter(DEALS), NDJSON, backend=backend, max_bytes=256, max_delay=10))
+    assert [json.loads(line) for line in body.splitlines()] == DEALS
+
+
+def test_gzip_batches_decode_as_they_arrive():
+    chunks = list(encode_stream(iter(DEALS), NDJSON, "gzip", backend="json", max_bytes=256, max_delay=10))
+    assert gzip.decompress(b"".join(chunks)) == NDJSON_BODY
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks[:-1]:
+        # Every batch is flushed, so what has arrived so far decodes to whole lines.
+        assert decoder.decompress(chunk).endswith(b"\n")
+
+
+def test_brotli_batches_decode_as_they_arrive():
+    brotli = pytest.importorskip("brotli")
+    chunks = list(encode_stream(iter(DEALS), NDJSON, "br", backend="json", max_bytes=256, max_delay=10))
+    assert brotli.decompress(b"".join(chunks)) == NDJSON_BODY
+    decoder = brotli.Decompressor()
+    for chunk in chunks[:-1]:
+        assert decoder.process(chunk).endswith(b"\n")
+
+
+def test_msgpack_body():
+    msgpack = pytest.importorskip("msgpack")
+    unpacker = msgpack.Unpacker()
+    for chunk in encode_stream(iter(DEALS), MSGPACK, max_bytes=256, max_delay=10):
+        unpacker.feed(chunk)
+    assert list(unpacker) == DEALS
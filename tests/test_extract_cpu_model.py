@@ -0,0 +1,13 @@
+import pytest
+
+from ebay_api import extract_cpu_model, _extract_cpu_model
+from bench.bench_extract import load_corpus
+
+CORPUS = load_corpus()
+
+
+@pytest.mark.parametrize("entry", CORPUS, ids=[entry["title"] for entry in CORPUS])
+def test_extract_cpu_model_matches_golden_corpus(entry):
+    assert extract_cpu_model(entry["title"]) == entry["model"]
+    # The memo cache must not hide a drift in the uncached extractor.
+    assert _extract_cpu_model.__wrapped__(entry["title"]) == entry["model"]
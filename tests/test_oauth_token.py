@@ -0,0 +1,119 @@
+import os
+import stat
+import time
+import asyncio
+import threading
+
+import pytest
+
+import oauth_token
+from oauth_token import TokenManager
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(oauth_token, "time", clock)
+    return clock
+
+
+class StubFetch:
+    """
+    fetch() for TokenManager returning token-1, token-2, ... valid for
+    `expires_in` seconds. While `gate` is clear, calls block until it is set.
+    """
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self):
+        self.calls += 1
+        token = f"token-{self.calls}"
+        assert self.gate.wait(5)
+        return token, self.expires_in
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_token_is_refreshed_ahead_of_expiry_in_the_background(clock):
+    fetch = StubFetch()
+    tokens = TokenManager(fetch, refresh_ahead=300)
+    assert tokens.get() == "token-1"
+    clock.advance(3000)
+    assert tokens.get() == "token-1"
+    assert fetch.calls == 1
+
+    fetch.gate.clear()
+    clock.advance(400)
+    # Inside the refresh-ahead window: the current token is returned without waiting.
+    assert tokens.get() == "token-1"
+    assert tokens.get() == "token-1"
+    assert wait_until(lambda: fetch.calls == 2)
+    fetch.gate.set()
+    assert wait_until(lambda: tokens.get() == "token-2")
+    assert fetch.calls == 2
+
+
+def test_foreground_caller_joins_the_background_refresh(clock):
+    fetch = StubFetch()
+    tokens = TokenManager(fetch, refresh_ahead=300)
+    tokens.get()
+    fetch.gate.clear()
+    clock.advance(3400)
+    assert tokens.get() == "token-1"
+    assert wait_until(lambda: fetch.calls == 2)
+
+    # The token expires while the background refresh is still in flight.
+    clock.advance(300)
+    result = []
+    caller = threading.Thread(target=lambda: result.append(tokens.get()))
+    caller.start()
+    time.sleep(0.1)
+    assert caller.is_alive()
+    fetch.gate.set()
+    caller.join(5)
+    assert result == ["token-2"]
+    assert fetch.calls == 2
+
+
+def test_get_async_shares_one_fetch(clock):
+    fetch = StubFetch()
+    tokens = TokenManager(fetch)
+
+    async def main():
+        return await asyncio.gather(*(tokens.get_async() for _ in range(5)))
+
+    fetch.gate.clear()
+    threading.Timer(0.1, fetch.gate.set).start()
+    assert asyncio.run(main()) == ["token-1"] * 5
+    assert fetch.calls == 1
+    assert asyncio.run(tokens.get_async()) == "token-1"
+    assert fetch.calls == 1
+
+
+def test_token_file_round_trip(tmp_path, clock):
+    path = str(tmp_path / "token.json")
+    fetch = StubFetch(expires_in=600)
+    assert TokenManager(fetch, path=path).get() == "token-1"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+    # A new process starts with the saved token instead of fetching one.
+    reloaded = TokenManager(StubFetch(), path=path)
+    assert reloaded.get() == "token-1"
+    assert reloaded.fetch.calls == 0
+
+    # An expired file is ignored.
+    clock.advance(600)
+    expired = TokenManager(StubFetch(), path=path)
+    assert expired.get() == "token-1"
+    assert expired.fetch.calls == 1
@@ -0,0 +1,216 @@
+import sqlite3
+
+import pytest
+
+import ebay_api
+import price_cache
+from price_cache import PriceCache, FailureCache, Revalidator
+
+KEY = PriceCache.make_key("Intel Core I5-7500 3.4GHz", "Used")
+PRICING = [250.0, False, "(Sold Listings)"]
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(price_cache, "time", clock)
+    return clock
+
+
+def open_cache(tmp_path, namespace="prices", **kwargs):
+    kwargs.setdefault("ttl", 100)
+    kwargs.setdefault("hard_ttl", 1000)
+    return PriceCache(namespace, path=str(tmp_path / "prices.sqlite3"), **kwargs)
+
+
+def test_entry_goes_fresh_then_stale_then_expired(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.set(KEY, PRICING)
+
+    assert cache.lookup(KEY) == (PRICING, False)
+    assert cache.get(KEY) == PRICING
+
+    clock.advance(100)
+    assert cache.lookup(KEY) == (PRICING, True)
+    assert cache.get(KEY) is None
+    # get() must not drop the stale entry lookup() still serves.
+    assert cache.lookup(KEY) == (PRICING, True)
+
+    clock.advance(900)
+    assert cache.lookup(KEY) == (None, False)
+    assert len(cache) == 0
+
+
+def test_revalidator_admits_one_refresh_per_key(clock):
+    revalidations = Revalidator(retry_after=300)
+    assert revalidations.claim(KEY) is True
+    assert revalidations.claim(KEY) is False
+    assert revalidations.claim(("other", "Used", 30)) is True
+
+    # A failed refresh holds further attempts off for retry_after seconds.
+    revalidations.release(KEY, refreshed=False)
+    clock.advance(299)
+    assert revalidations.claim(KEY) is False
+    clock.advance(1)
+    assert revalidations.claim(KEY) is True
+
+    # A successful one frees the key at once.
+    revalidations.release(KEY, refreshed=True)
+    assert revalidations.claim(KEY) is True
+
+
+class ImmediateExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def test_stale_price_is_served_while_its_refresh_fails(tmp_path, clock, monkeypatch):
+    cache = open_cache(tmp_path, "scraped_price")
+    attempts = []
+
+    def failing_scrape(cpu_model, condition, cache_key):
+        attempts.append(cache_key)
+        raise RuntimeError("Seller Hub is down")
+
+    monkeypatch.setattr(ebay_api, "SCRAPED_PRICE_CACHE", cache)
+    monkeypatch.setattr(ebay_api, "REVALIDATIONS", Revalidator(retry_after=300))
+    monkeypatch.setattr(ebay_api, "REVALIDATE_EXECUTOR", ImmediateExecutor())
+    monkeypatch.setattr(ebay_api, "_lookup_fair_market_value", failing_scrape)
+    monkeypatch.setattr(ebay_api.FAIR_VALUE_TABLE, "lookup", lambda cpu_model, condition: None)
+    model, condition = "Intel Core I5-7500 3.4GHz", "Used"
+    cache.set(cache.make_key(model, condition), PRICING)
+
+    assert ebay_api.get_fair_market_value(model, condition) == (250.0, False, "(Sold Listings)")
+    assert attempts == []
+
+    clock.advance(150)
+    stale = (250.0, False, "(Sold Listings) (stale)")
+    assert ebay_api.get_fair_market_value(model, condition) == stale
+    assert len(attempts) == 1
+    # The failed refresh left the entry in place and isn't retried right away.
+    assert ebay_api.get_fair_market_value(model, condition) == stale
+    assert len(attempts) == 1
+
+    clock.advance(300)
+    assert ebay_api.get_fair_market_value(model, condition) == stale
+    assert len(attempts) == 2
+
+
+def test_fresh_until_survives_reopening(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.set(KEY, PRICING, ttl=10)
+    cache.close()
+
+    reopened = open_cache(tmp_path)
+    assert reopened.lookup(KEY) == (PRICING, False)
+    clock.advance(10)
+    # Stale after the entry's own ttl, not the cache's default of 100s.
+    assert reopened.lookup(KEY) == (PRICING, True)
+    reopened.close()
+
+    assert open_cache(tmp_path).lookup(KEY) == (PRICING, True)
+
+
+def test_old_schema_file_is_upgraded(tmp_path, clock):
+    path = tmp_path / "prices.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE prices (namespace TEXT NOT NULL, model TEXT NOT NULL, condition TEXT NOT NULL,"
+        " day_range INTEGER NOT NULL, value TEXT NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL,"
+        " last_access REAL NOT NULL, PRIMARY KEY (namespace, model, condition, day_range))"
+    )
+    now = clock.time()
+    conn.execute(
+        "INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ("prices", KEY[0], KEY[1], KEY[2], '[250.0, false, "(Sold Listings)"]', now - 60, now + 940, now - 60)
+    )
+    conn.commit()
+    conn.close()
+
+    cache = open_cache(tmp_path)
+    columns = {row[1] for row in sqlite3.connect(path).execute("PRAGMA table_info(prices)")}
+    assert "fresh_until" in columns
+    # An old row is fresh for the cache's default ttl from when it was stored.
+    assert cache.lookup(KEY) == (PRICING, False)
+    clock.advance(40)
+    assert cache.lookup(KEY) == (PRICING, True)
+
+    cache.set(KEY, PRICING, ttl=500)
+    cache.close()
+    clock.advance(400)
+    assert open_cache(tmp_path).lookup(KEY) == (PRICING, False)
+
+
+def open_failures(tmp_path):
+    return FailureCache("failures", base=60, cap=600, memory=3600, path=str(tmp_path / "prices.sqlite3"))
+
+
+def test_failure_backoff_doubles_up_to_the_cap(tmp_path, clock):
+    failures = open_failures(tmp_path)
+    assert failures.backing_off(KEY) is False
+    assert [failures.record_failure(KEY) for _ in range(6)] == [60, 120, 240, 480, 600, 600]
+
+    assert failures.backing_off(KEY) is True
+    clock.advance(599)
+    assert failures.backing_off(KEY) is True
+    clock.advance(1)
+    assert failures.backing_off(KEY) is False
+    assert failures.record_failure(KEY) == 600
+
+
+def test_failure_backoff_resets_on_success(tmp_path, clock):
+    failures = open_failures(tmp_path)
+    failures.record_failure(KEY)
+    failures.record_failure(KEY)
+    failures.record_success(KEY)
+    assert failures.backing_off(KEY) is False
+    assert failures.record_failure(KEY) == 60
+
+
+def test_failure_backoff_persists_across_reopening(tmp_path, clock):
+    failures = open_failures(tmp_path)
+    for _ in range(3):
+        failures.record_failure(KEY)
+
+    # A new process opening the same file.
+    reopened = open_failures(tmp_path)
+    # Still backing off for the 240s of the third failure, not the 60s base.
+    clock.advance(200)
+    assert reopened.backing_off(KEY) is True
+    clock.advance(40)
+    assert reopened.backing_off(KEY) is False
+    assert reopened.record_failure(KEY) == 480
+
+
+def model_key(name):
+    return PriceCache.make_key(name, "Used")
+
+
+def test_lru_evicts_the_least_recently_used_entry(tmp_path, clock):
+    cache = open_cache(tmp_path, max_entries=3)
+    for name in "abc":
+        cache.set(model_key(name), name)
+        clock.advance(1)
+    assert cache.get(model_key("a")) == "a"
+
+    cache.set(model_key("d"), "d")
+    assert len(cache) == 3
+    # b was used least recently; it is dropped from disk too, so no read-through brings it back.
+    assert cache.lookup(model_key("b")) == (None, False)
+    assert [cache.get(model_key(name)) for name in "acd"] == ["a", "c", "d"]
+
+
+def test_warm_loads_the_most_recently_used_entries_in_order(tmp_path, clock):
+    cache = open_cache(tmp_path, max_entries=3)
+    for name in "abc":
+        cache.set(model_key(name), name)
+        clock.advance(1)
+    cache.get(model_key("a"))
+    cache.close()
+
+    reopened = open_cache(tmp_path, max_entries=2)
+    assert len(reopened) == 2
+    # a (read last) and c are loaded, c as the older; the next set evicts c, not a.
+    reopened.set(model_key("d"), "d")
+    assert reopened.lookup(model_key("c")) == (None, False)
+    assert reopened.get(model_key("a")) == "a"
+    assert reopened.get(model_key("d")) == "d"
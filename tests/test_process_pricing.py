@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import threading
+import subprocess
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs `script` as the server's main script with app.run replaced by: start the
+# pricing pool, report what one worker process is running, and exit.
+SERVER = """
+import sys, json, runpy
+sys.path[:0] = [{repo!r}, {tests!r}]
+import flask
+from test_process_pricing import worker_state
+
+def probe(self, **kwargs):
+    from process_pricing import get_process_pool
+    app = sys.modules.get("app") or sys.modules["__main__"]
+    worker = get_process_pool(2).submit(worker_state).result(timeout=120)
+    print(json.dumps({{"parent_warmer": app.FAIR_VALUE_WARMER.running, "worker": worker}}))
+
+flask.Flask.run = probe
+runpy.run_path({script!r}, run_name="__main__")
+"""
+
+
+def worker_state():
+    # Runs in a pricing worker.
+    main = sys.modules.get("__mp_main__")
+    return {
+        "threads": [thread.name for thread in threading.enumerate()],
+        "main_file": os.path.basename(getattr(main, "__file__", "") or ""),
+        "app_imported": "app" in sys.modules or getattr(main, "__file__", "").endswith("app.py"),
+    }
+
+
+@pytest.mark.parametrize("script", ["app.py", "server.py"])
+def test_pricing_workers_never_start_the_warmer(script, tmp_path):
+    # WERKZEUG_RUN_MAIN: run as the reloader's serving child, which starts the services.
+    env = dict(os.environ, FAIR_VALUE_WARMER="1", DEAL_POLLER="0", WERKZEUG_RUN_MAIN="true", PRICE_CACHE_PATH=str(tmp_path / "cache.sqlite3"))
+    code = SERVER.format(repo=REPO_DIR, tests=TESTS_DIR, script=os.path.join(REPO_DIR, script))
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=180)
+    assert result.returncode == 0, result.stderr
+    state = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert state["parent_warmer"] is True
+    worker = state["worker"]
+    assert worker["main_file"] == script
+    assert "fair-value-warmer" not in worker["threads"]
+    assert "deal-poller" not in worker["threads"]
+    if script == "server.py":
+        assert worker["app_imported"] is False
@@ -0,0 +1,114 @@
+import pytest
+
+import ebay_api
+import rate_limit
+from rate_limit import EndpointLimiter, CircuitOpenError
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def make_limiter(rate=10.0, burst=10, failure_threshold=3, open_seconds=30):
+    return EndpointLimiter("test", rate, burst, failure_threshold=failure_threshold, open_seconds=open_seconds)
+
+
+def test_throttles_halve_the_rate_and_successes_add_it_back(clock):
+    limiter = make_limiter()
+    limiter.record(429)
+    assert limiter.rate == pytest.approx(5.0)
+    limiter.record(503)
+    assert limiter.rate == pytest.approx(2.5)
+    limiter.record(200)
+    assert limiter.rate == pytest.approx(3.0)
+
+    for _ in range(100):
+        limiter.record(200)
+    assert limiter.rate == pytest.approx(10.0)
+    for _ in range(100):
+        limiter.record(429)
+    assert limiter.rate == pytest.approx(10.0 * rate_limit.MIN_RATE_FRACTION)
+
+
+def test_bucket_waits_at_the_current_rate_and_honours_retry_after(clock):
+    limiter = make_limiter(rate=10.0, burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.1)
+    clock.advance(1)
+    assert limiter.reserve() == 0
+
+    limiter = make_limiter(rate=10.0, burst=2)
+    limiter.record(429, retry_after=5)
+    # The Retry-After empties the bucket and pauses it; then one token at the halved rate.
+    assert limiter.reserve() == pytest.approx(5 + 1 / 5.0)
+    clock.advance(2)
+    assert limiter.reserve() == pytest.approx(3 + 2 / 5.0)
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    limiter = make_limiter(failure_threshold=3)
+    limiter.record(error=True)
+    limiter.record(500)
+    limiter.record(200)
+    limiter.record(error=True)
+    limiter.record(503)
+    assert limiter.state == "closed"
+
+    limiter.record(error=True)
+    assert limiter.state == "open"
+    with pytest.raises(CircuitOpenError) as e:
+        limiter.reserve()
+    assert e.value.retry_in == pytest.approx(30)
+
+
+def test_half_open_circuit_lets_one_probe_through(clock):
+    limiter = make_limiter(failure_threshold=1, open_seconds=30)
+    limiter.record(error=True)
+    clock.advance(30)
+
+    limiter.reserve()
+    assert limiter.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        limiter.reserve()
+
+    # A failed probe re-opens the circuit for another open_seconds.
+    limiter.record(503)
+    assert limiter.state == "open"
+    clock.advance(29)
+    with pytest.raises(CircuitOpenError):
+        limiter.reserve()
+    clock.advance(1)
+    limiter.reserve()
+
+    limiter.record(200)
+    assert limiter.state == "closed"
+    limiter.reserve()
+    limiter.reserve()
+
+
+class FailingSession:
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+
+def test_request_with_retry_fails_fast_once_the_circuit_opens(clock, monkeypatch):
+    limiter = make_limiter(failure_threshold=2)
+    session = FailingSession()
+    monkeypatch.setattr(ebay_api, "time", clock)
+    monkeypatch.setattr(ebay_api, "get_session", lambda: session)
+    monkeypatch.setattr(ebay_api, "limiter_for_url", lambda url: limiter)
+
+    assert ebay_api.request_with_retry("GET", ebay_api.BROWSE_SEARCH_URL, max_attempts=3) is None
+    # The third attempt is refused by the open circuit instead of being sent.
+    assert session.calls == 2
+    assert limiter.state == "open"
+
+    assert ebay_api.request_with_retry("GET", ebay_api.BROWSE_SEARCH_URL) is None
+    assert session.calls == 2
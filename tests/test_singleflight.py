@@ -0,0 +1,78 @@
+import time
+import threading
+
+import ebay_api
+from price_cache import PriceCache
+from singleflight import SingleFlight
+
+CALLERS = 8
+
+
+def run_concurrently(call):
+    """
+    Starts CALLERS threads that pass a barrier together and then call(),
+    and returns each one's result or exception.
+    """
+    barrier = threading.Barrier(CALLERS)
+    outcomes = [None] * CALLERS
+
+    def caller(i):
+        barrier.wait()
+        try:
+            outcomes[i] = call()
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def slow(result_or_error, calls):
+    def fn():
+        calls.append(threading.get_ident())
+        # Long enough for every caller past the barrier to join the flight.
+        time.sleep(0.2)
+        if isinstance(result_or_error, Exception):
+            raise result_or_error
+        return result_or_error
+    return fn
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+    outcomes = run_concurrently(lambda: flights.do("key", slow(250.0, calls)))
+    assert len(calls) == 1
+    assert outcomes == [250.0] * CALLERS
+    assert flights.in_flight() == 0
+
+
+def test_concurrent_callers_share_one_exception():
+    flights = SingleFlight()
+    calls = []
+    error = RuntimeError("scrape failed")
+    outcomes = run_concurrently(lambda: flights.do("key", slow(error, calls)))
+    assert len(calls) == 1
+    assert all(outcome is error for outcome in outcomes)
+    # The failure isn't cached: the next call runs the function again.
+    assert flights.do("key", lambda: 1) == 1
+
+
+def test_concurrent_misses_for_one_model_scrape_once(tmp_path, monkeypatch):
+    calls = []
+
+    def scrape(cpu_model, condition, cache_key):
+        return slow((250.0, False, "(Sold Listings)"), calls)()
+
+    monkeypatch.setattr(ebay_api, "SCRAPED_PRICE_CACHE", PriceCache("scraped_price", path=str(tmp_path / "prices.sqlite3")))
+    monkeypatch.setattr(ebay_api, "FAIR_VALUE_FLIGHTS", SingleFlight())
+    monkeypatch.setattr(ebay_api, "_lookup_fair_market_value", scrape)
+    monkeypatch.setattr(ebay_api.FAIR_VALUE_TABLE, "lookup", lambda cpu_model, condition: None)
+
+    outcomes = run_concurrently(lambda: ebay_api.get_fair_market_value("Intel Core I5-7500 3.4GHz", "Used"))
+    assert len(calls) == 1
+    assert outcomes == [(250.0, False, "(Sold Listings)")] * CALLERS
@@ -0,0 +1,72 @@
+import time
+import threading
+
+import ebay_api
+from stream_hub import StreamHub
+
+TOTAL_LISTINGS = 10000
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, page):
+        self.page = page
+
+    def json(self):
+        return self.page
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_abandoned_scan_stops_while_producing_no_deals(monkeypatch):
+    requests = []
+    priced = []
+
+    def fake_request(method, url, headers=None, params=None, **kwargs):
+        offset = params.get("offset", 0)
+        requests.append(offset)
+        time.sleep(0.01)
+        items = [{"itemId": f"v1|{offset + i}|0", "title": "Intel Core i5-7500", "price": {"value": "50"}} for i in range(params["limit"])]
+        return FakeResponse({"total": TOTAL_LISTINGS, "offset": offset, "itemSummaries": items})
+
+    def fake_process_listing(item, cache_expiry, now):
+        # Every listing is priced and found not to be a deal.
+        time.sleep(0.02)
+        priced.append(item["itemId"])
+        return None
+
+    monkeypatch.setattr(ebay_api, "get_ebay_oauth_token", lambda: "token")
+    monkeypatch.setattr(ebay_api, "request_with_retry", fake_request)
+    monkeypatch.setattr(ebay_api, "process_listing", fake_process_listing)
+
+    hub = StreamHub()
+    subscription = hub.subscribe("cpu", lambda cancel: ebay_api.get_ebay_listings_stream(limit=TOTAL_LISTINGS, cancel=cancel))
+    received = []
+    consumer = threading.Thread(target=lambda: received.extend(subscription))
+    consumer.start()
+    assert wait_until(lambda: len(priced) >= 50)
+    scan = subscription.scan
+
+    subscription.cancel()
+    consumer.join(5)
+    assert not consumer.is_alive()
+    assert len(hub) == 0
+    assert wait_until(lambda: scan.done, timeout=2)
+    # Listings that were already being priced finish; nothing new starts.
+    time.sleep(0.1)
+    stopped_at = (len(requests), len(priced))
+    time.sleep(0.3)
+
+    assert received == []
+    assert (len(requests), len(priced)) == stopped_at
+    assert len(priced) < TOTAL_LISTINGS
+    assert len(requests) < TOTAL_LISTINGS // ebay_api.BROWSE_PAGE_SIZE